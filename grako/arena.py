@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2017      by Juancarlo Añez
+# Copyright (C) 2012-2016 by Juancarlo Añez and Thomas Bragg
+"""
+A columnar representation of parse trees.
+
+An ``Arena`` stores every rule and token node of a parse in parallel
+arrays of integers instead of nested ``AST`` objects, lists, and
+``ParseInfo`` tuples. Nodes are identified by their index, and
+``ArenaNode`` is a lightweight view over one index.
+
+Arenas are built from parse events::
+
+    builder = ArenaBuilder()
+    parser.parse(text, handler=builder)
+    arena = builder.arena
+
+The columns are ``array.array`` objects, so they may be handed to
+``numpy.frombuffer()`` for vectorized queries.
+
+The value of each rule, with its lists, names, and references to the
+nodes of nested rules, is encoded as integers in ``Arena.shapes``, so
+``to_ast()`` rebuilds exactly what a parse without a handler returns.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from array import array
+
+from grako.ast import AST
+from grako.events import EventHandler, RuleRef
+from grako.infos import ParseInfo
+
+__all__ = ['Arena', 'ArenaNode', 'ArenaBuilder']
+
+
+NONE = -1
+TYPECODE = str('l')
+
+# the codes of encoded rule values
+(
+    V_NONE,
+    V_TOKEN,
+    V_NODE,
+    V_LIST,
+    V_AST,
+    V_PARSEINFO,
+) = range(6)
+
+
+class Arena(object):
+    def __init__(self):
+        # symbols: rule nodes store the index of their rule name
+        # and token nodes store -2 - the index of their token text
+        self.rules = []
+        self.tokens = []
+        # named slots are (name, aslist, islist) triples
+        self.slots = []
+        # the keys of the AST values of rules
+        self.keys = []
+        # the buffer of the ParseInfo values of rules
+        self.buffer = None
+        # the encoded values of rules, see to_ast()
+        self.shapes = array(TYPECODE)
+
+        self.symbol = array(TYPECODE)
+        self.pos = array(TYPECODE)
+        self.endpos = array(TYPECODE)
+        self.parent = array(TYPECODE)
+        self.first_child = array(TYPECODE)
+        self.next_sibling = array(TYPECODE)
+        self.slot = array(TYPECODE)
+        self.shape = array(TYPECODE)
+
+    def __len__(self):
+        return len(self.symbol)
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        return ArenaNode(self, i % len(self))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield ArenaNode(self, i)
+
+    @property
+    def root(self):
+        return self[0] if self else None
+
+    def rule_id(self, rule):
+        try:
+            return self.rules.index(rule)
+        except ValueError:
+            return None
+
+    def select(self, rule, start=0, end=None):
+        """ The nodes of ``rule`` that lie within ``[start, end)``.
+        """
+        rule_id = self.rule_id(rule)
+        if rule_id is None:
+            return
+        if end is None:
+            end = float('inf')
+
+        symbol, pos, endpos = self.symbol, self.pos, self.endpos
+        for i in range(len(symbol)):
+            if symbol[i] == rule_id and pos[i] >= start and endpos[i] <= end:
+                yield ArenaNode(self, i)
+
+    def children(self, i):
+        c = self.first_child[i]
+        while c != NONE:
+            yield c
+            c = self.next_sibling[c]
+
+    def to_ast(self, i=0):
+        """ Convert the subtree at ``i`` to the structures a parse would
+            have produced without a handler.
+        """
+        symbol = self.symbol[i]
+        if symbol < NONE:
+            return self.tokens[-2 - symbol]
+        start = self.shape[i]
+        if start == NONE:
+            return None
+        return self._decode(i, start)[0]
+
+    def _decode(self, i, k):
+        # the value encoded at shapes[k] for the rule node i,
+        # and the position of the next value
+        shapes = self.shapes
+        code = shapes[k]
+        if code == V_NONE:
+            return None, k + 1
+        elif code == V_TOKEN:
+            return self.tokens[shapes[k + 1]], k + 2
+        elif code == V_NODE:
+            return self.to_ast(shapes[k + 1]), k + 2
+        elif code == V_PARSEINFO:
+            rule = self.rules[self.symbol[i]]
+            return ParseInfo(self.buffer, rule, self.pos[i], self.endpos[i]), k + 1
+        elif code == V_LIST:
+            n, k = shapes[k + 1], k + 2
+            values = []
+            for _ in range(n):
+                value, k = self._decode(i, k)
+                values.append(value)
+            return values, k
+        else:
+            n, k = shapes[k + 1], k + 2
+            items = []
+            for _ in range(n):
+                key = self.keys[shapes[k]]
+                value, k = self._decode(i, k + 1)
+                items.append((key, value))
+            return AST(items), k
+
+
+class ArenaNode(object):
+    __slots__ = ('arena', 'index')
+
+    def __init__(self, arena, index):
+        self.arena = arena
+        self.index = index
+
+    @property
+    def is_token(self):
+        return self.arena.symbol[self.index] < NONE
+
+    @property
+    def rule(self):
+        symbol = self.arena.symbol[self.index]
+        return self.arena.rules[symbol] if symbol >= 0 else None
+
+    @property
+    def token(self):
+        symbol = self.arena.symbol[self.index]
+        return self.arena.tokens[-2 - symbol] if symbol < NONE else None
+
+    @property
+    def pos(self):
+        return self.arena.pos[self.index]
+
+    @property
+    def endpos(self):
+        return self.arena.endpos[self.index]
+
+    @property
+    def name(self):
+        slot = self.arena.slot[self.index]
+        return self.arena.slots[slot][0] if slot != NONE else None
+
+    @property
+    def parent(self):
+        parent = self.arena.parent[self.index]
+        return ArenaNode(self.arena, parent) if parent != NONE else None
+
+    @property
+    def children(self):
+        return [ArenaNode(self.arena, c) for c in self.arena.children(self.index)]
+
+    def to_ast(self):
+        return self.arena.to_ast(self.index)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ArenaNode) and
+            other.arena is self.arena and
+            other.index == self.index
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.arena), self.index))
+
+    def __repr__(self):
+        return '%s(%s, %d, %d)' % (
+            type(self).__name__,
+            self.rule if self.rule is not None else repr(self.token),
+            self.pos,
+            self.endpos
+        )
+
+
+class ArenaBuilder(EventHandler):
+    """ An ``EventHandler`` that stores the parse tree in an ``Arena``.
+
+        Names are attached to nodes by matching the leaves of the named
+        value, from last to first, with the trailing children of the
+        enclosing rule that haven't been named yet. ``to_ast()`` doesn't
+        depend on them, as it uses the encoded value of each rule.
+    """
+    def __init__(self):
+        self.arena = Arena()
+        self._rule_ids = {}
+        self._token_ids = {}
+        self._slot_ids = {}
+        self._key_ids = {}
+        self._open = []  # (index, children, named_mark)
+
+    def _add_node(self, symbol, pos, endpos):
+        arena = self.arena
+        i = len(arena.symbol)
+        arena.symbol.append(symbol)
+        arena.pos.append(pos)
+        arena.endpos.append(endpos)
+        arena.first_child.append(NONE)
+        arena.next_sibling.append(NONE)
+        arena.slot.append(NONE)
+        arena.shape.append(NONE)
+
+        if self._open:
+            parent, children, _ = self._open[-1]
+            arena.parent.append(parent)
+            if children:
+                arena.next_sibling[children[-1]] = i
+            else:
+                arena.first_child[parent] = i
+            children.append(i)
+        else:
+            arena.parent.append(NONE)
+        return i
+
+    def _intern(self, table, ids, value):
+        try:
+            i = ids.get(value)
+        except TypeError:
+            # unhashable values are not shared
+            table.append(value)
+            return len(table) - 1
+        if i is None:
+            i = ids[value] = len(table)
+            table.append(value)
+        return i
+
+    def start_rule(self, name, pos):
+        rule_id = self._intern(self.arena.rules, self._rule_ids, name)
+        i = self._add_node(rule_id, pos, pos)
+        self._open.append((i, [], 0))
+
+    def end_rule(self, name, pos, endpos):
+        i, _, _ = self._open.pop()
+        self.arena.endpos[i] = endpos
+
+    def rule_value(self, name, value):
+        if not self._open:
+            return
+        i, children, _ = self._open[-1]
+        arena = self.arena
+        refs = {}
+        for c in children:
+            symbol = arena.symbol[c]
+            if symbol >= 0:
+                refs.setdefault((arena.rules[symbol], arena.pos[c], arena.endpos[c]), c)
+        arena.shape[i] = len(arena.shapes)
+        self._encode(value, refs)
+
+    def _encode(self, value, refs):
+        shapes = self.arena.shapes
+        if value is None:
+            shapes.append(V_NONE)
+        elif isinstance(value, RuleRef) and tuple(value) in refs:
+            shapes.extend((V_NODE, refs[tuple(value)]))
+        elif isinstance(value, ParseInfo):
+            if self.arena.buffer is None:
+                self.arena.buffer = value.buffer
+            shapes.append(V_PARSEINFO)
+        elif isinstance(value, AST):
+            shapes.extend((V_AST, len(value)))
+            for key, item in value.items():
+                shapes.append(self._intern(self.arena.keys, self._key_ids, key))
+                self._encode(item, refs)
+        elif isinstance(value, list):
+            shapes.extend((V_LIST, len(value)))
+            for item in value:
+                self._encode(item, refs)
+        else:
+            shapes.extend((V_TOKEN, self._intern(self.arena.tokens, self._token_ids, value)))
+
+    def token(self, token, pos, endpos):
+        token_id = self._intern(self.arena.tokens, self._token_ids, token)
+        self._add_node(-2 - token_id, pos, endpos)
+
+    def name(self, name, value, aslist=False):
+        if not self._open:
+            return
+        i, children, mark = self._open[-1]
+
+        leaves = list(self._leaves(value))
+        slot_key = (name, aslist, isinstance(value, list))
+        slot = self._intern(self.arena.slots, self._slot_ids, slot_key)
+
+        j = len(children)
+        while leaves and j > mark:
+            j -= 1
+            if self._matches(children[j], leaves[-1]):
+                self.arena.slot[children[j]] = slot
+                leaves.pop()
+        self._open[-1] = (i, children, len(children))
+
+    def _matches(self, c, leaf):
+        arena = self.arena
+        symbol = arena.symbol[c]
+        if isinstance(leaf, RuleRef):
+            return symbol >= 0 and arena.rules[symbol] == leaf.name and arena.pos[c] == leaf.pos
+        return symbol < NONE and arena.tokens[-2 - symbol] == leaf
+
+    def _leaves(self, value):
+        if isinstance(value, list):
+            for v in value:
+                for leaf in self._leaves(v):
+                    yield leaf
+        else:
+            yield value
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2017      by Juancarlo Añez
+# Copyright (C) 2012-2016 by Juancarlo Añez and Thomas Bragg
+
+# Declarations for builds with Cython. They make Buffer an extension
+# type with the attributes used while parsing stored in C fields. Other
+# attributes, and those of subclasses, go to __dict__ as before.
+
+cdef class Buffer:
+    cdef dict __dict__
+
+    cdef public object text
+    cdef public Py_ssize_t _pos
+    cdef public Py_ssize_t _len
+    cdef public tuple _next_token_cache
+    cdef public dict _re_cache
+    cdef public object whitespace_re
+    cdef public object comments_re
+    cdef public object eol_comments_re
+    cdef public object ignorecase
+    cdef public object nameguard
+    cdef public object namechars
+    cdef public set _namechar_set
@@ -12,6 +12,8 @@ from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
 import os
+from bisect import bisect_right
+from collections import namedtuple
 from itertools import takewhile, repeat
 
 from grako.util import identity, imap, ustr, strtype
@@ -77,6 +79,7 @@ class Buffer(object):
     def whitespace(self, value):
         self._whitespace = value
         self.whitespace_re = self.build_whitespace_re(value)
+        self._next_token_cache = (None, None)
 
     @staticmethod
     def build_whitespace_re(whitespace):
@@ -261,12 +264,17 @@ class Buffer(object):
         self._index_comments(comments, lambda x: x.eol)
 
     def next_token(self):
+        start = self._pos
+        if self._next_token_cache[0] == start:
+            self._pos = self._next_token_cache[1]
+            return
         p = None
         while self._pos != p:
             p = self._pos
             self.eat_eol_comments()
             self.eat_comments()
             self.eat_whitespace()
+        self._next_token_cache = (start, self._pos)
 
     def skip_to(self, c):
         p = self._pos
@@ -306,7 +314,7 @@ class Buffer(object):
         if ignorecase:
             is_match = self.text[p:p + len(token)].lower() == token.lower()
         else:
-            is_match = self.text[p:p + len(token)] == token
+            is_match = self.text.startswith(token, p)
 
         if is_match:
             self.move(len(token))
@@ -329,6 +337,12 @@ class Buffer(object):
             self.move(len(token))
             return token
 
+    def matchspan(self, pattern, ignorecase=None):
+        matched = self._scanre(pattern, ignorecase=ignorecase)
+        if matched:
+            self.goto(matched.end())
+            return TokenSpan(self.text, matched.start(), matched.end())
+
     def _scanre(self, pattern, ignorecase=None, offset=0):
         ignorecase = ignorecase if ignorecase is not None else self.ignorecase
 
@@ -396,3 +410,143 @@ class Buffer(object):
 
     def __json__(self):
         return None
+
+
+class TokenSpan(object):
+    """ A matched token that is sliced from the text only when read.
+    """
+    __slots__ = ('text', 'pos', 'endpos')
+
+    def __init__(self, text, pos, endpos):
+        self.text = text
+        self.pos = pos
+        self.endpos = endpos
+
+    def __str__(self):
+        return self.text[self.pos:self.endpos]
+
+    __unicode__ = __str__
+
+    def __len__(self):
+        return self.endpos - self.pos
+
+    def __eq__(self, other):
+        return ustr(self) == ustr(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(ustr(self))
+
+    def __repr__(self):
+        return '%s(%r, %d, %d)' % (type(self).__name__, ustr(self), self.pos, self.endpos)
+
+
+class TextStore(object):
+    """ Shared storage for the text of parsed sources, so parse results
+        that have been detached from their ``Buffer`` may still recover
+        their text and lines.
+    """
+    def __init__(self):
+        self._texts = {}
+        self._line_starts = {}
+
+    def add(self, text, source=None):
+        if source is None:
+            source = '<%d>' % len(self._texts)
+        self._texts[source] = text
+        self._line_starts.pop(source, None)
+        return source
+
+    def discard(self, source):
+        self._texts.pop(source, None)
+        self._line_starts.pop(source, None)
+
+    def __contains__(self, source):
+        return source in self._texts
+
+    def __len__(self):
+        return len(self._texts)
+
+    def text(self, source):
+        return self._texts.get(source)
+
+    def lines(self, source):
+        return self._texts[source].splitlines(True)
+
+    def line_starts(self, source):
+        starts = self._line_starts.get(source)
+        if starts is None:
+            starts = [0]
+            for line in self.lines(source):
+                starts.append(starts[-1] + len(line))
+            self._line_starts[source] = starts
+        return starts
+
+
+class SourceRef(namedtuple('_SourceRefBase', ['source', 'store'])):
+    """ Takes the place of the ``Buffer`` in a detached ``ParseInfo``.
+        Lines and text are available only when the source is in the store.
+    """
+    __slots__ = ()
+
+    @property
+    def filename(self):
+        return self.source
+
+    @property
+    def text(self):
+        if self.store is not None:
+            return self.store.text(self.source)
+
+    def _line_starts(self):
+        if self.store is not None and self.source in self.store:
+            return self.store.line_starts(self.source)
+
+    def posline(self, pos):
+        starts = self._line_starts()
+        if starts is None:
+            return None
+        text = self.text
+        if pos >= len(text):
+            # same as Buffer: the count of lines at the end of the text
+            n = len(starts) - 1
+            return n + 1 if text and text[-1] in '\r\n' else n
+        return bisect_right(starts, pos) - 1
+
+    def line_info(self, pos):
+        starts = self._line_starts()
+        if starts is None:
+            return None
+        line = self.posline(pos)
+        if line >= len(starts) - 1:
+            end = len(self.text)
+            return LineInfo(self.source, line, 0, end, end, '')
+        start, end = starts[line], starts[line + 1]
+        return LineInfo(self.source, line, pos - start, start, end, self.text[start:end])
+
+    def get_lines(self, start=None, end=None):
+        if self._line_starts() is None:
+            return []
+        lines = self.store.lines(self.source)
+        if start is None:
+            start = 0
+        if end is None:
+            end = len(lines)
+        return lines[start:end + 1]
+
+    def line_index(self, start=0, end=None):
+        starts = self._line_starts()
+        if starts is None:
+            return []
+        if end is None:
+            end = len(starts) - 1
+        n = min(end + 1, len(starts) - 1)
+        return [LineIndexInfo(self.source, i) for i in range(start, n)]
+
+    def comments(self, p, clear=False):
+        return CommentInfo([], [])
+
+    def __json__(self):
+        return None
@@ -7,9 +7,12 @@ from grako.exceptions import CodegenError
 from grako.codegen.cgbase import *  # noqa
 
 
-def codegen(model, target='python'):
+def codegen(model, target='python', **kwargs):
     if target.lower() == 'python':
         from grako.codegen import python
-        return python.codegen(model)
+        return python.codegen(model, **kwargs)
+    elif target.lower() == 'vm':
+        from grako.codegen import vm
+        return vm.codegen(model, **kwargs)
     else:
         raise CodegenError('Unknown target language: %s' % target)
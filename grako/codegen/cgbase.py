@@ -5,7 +5,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 from grako.objectmodel import Node
 from grako.codegen import CodegenError
-from grako.rendering import render, Renderer, RenderingFormatter
+from grako.rendering import render, render_into, Renderer, RenderingFormatter
 
 
 class DelegatingRenderingFormatter(RenderingFormatter):
@@ -21,6 +21,10 @@ class DelegatingRenderingFormatter(RenderingFormatter):
             result = super(DelegatingRenderingFormatter, self).render(item, join=join, **fields)
         return result
 
+    # override
+    def render_into(self, buffer, item, join='', **fields):
+        self.delegate.render_into(buffer, item, join=join, **fields)
+
     def convert_field(self, value, conversion):
         if isinstance(value, Node):
             return self.render(value)
@@ -64,12 +68,22 @@ class ModelRenderer(Renderer):
     def get_renderer(self, item):
         return self.codegen.get_renderer(item)
 
-    def render(self, template=None, **fields):
+    def fragment(self, template, **fields):
+        """ A Renderer for part of the output of this one, with the given
+            fields, and with the models in them rendered by the same
+            code generator.
+        """
+        renderer = Renderer(template)
+        renderer.formatter = self.formatter
+        vars(renderer).update(fields)
+        return renderer
+
+    def render_into(self, buffer, template=None, **fields):
         if isinstance(self.node, Node):
             fields.update({k: v for k, v in vars(self.node).items() if not k.startswith('_')})
         else:
             fields.update(value=self.node)
-        return super(ModelRenderer, self).render(template=template, **fields)
+        super(ModelRenderer, self).render_into(buffer, template=template, **fields)
 
 
 class NullModelRenderer(ModelRenderer):
@@ -143,3 +157,10 @@ class CodeGenerator(object):
         if renderer is None:
             return render(item, join=join, **fields)
         return str(renderer.render(**fields))
+
+    def render_into(self, buffer, item, join='', **fields):
+        renderer = self.get_renderer(item)
+        if renderer is None:
+            render_into(buffer, item, join=join, **fields)
+        else:
+            renderer.write(buffer, **fields)
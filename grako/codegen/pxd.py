@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2017      by Juancarlo Añez
+# Copyright (C) 2012-2016 by Juancarlo Añez and Thomas Bragg
+"""
+Generation of the Cython declarations for generated parsers.
+
+The declarations are saved as a ``.pxd`` file with the same base name as
+the module generated by ``codegen.python``. When the module is built with
+``cythonize`` against a Grako that was itself built with Cython, its
+buffer and parser classes become extension types of ``Buffer`` and
+``Parser``. The module remains valid Python, and the ``.pxd`` file is
+ignored when it's imported as such.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from grako.util import trim
+
+
+def codegen(model):
+    return trim(PXD_TEMPLATE).format(name=model.name)
+
+
+PXD_TEMPLATE = '''\
+    # CAVEAT UTILITOR
+    #
+    # This file was automatically generated by Grako.
+    #
+    #    https://pypi.python.org/pypi/grako/
+    #
+    # Any changes you make to it will be overwritten the next time
+    # the file is generated.
+
+    # Cython declarations for the {name} parser module. Building the
+    # module with them requires Grako to be built with Cython.
+
+    from grako.buffering cimport Buffer
+    from grako.parsing cimport Parser
+
+
+    cdef class {name}Buffer(Buffer):
+        pass
+
+
+    cdef class {name}Parser(Parser):
+        pass
+'''
@@ -6,15 +6,22 @@ Python code generation for models defined with grako.model
 """
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import hashlib
+from collections import OrderedDict
+
+from grako._version import __version__
 from grako.util import (
     indent,
     safe_name,
     trim,
     timestamp,
+    token_regex,
     urepr,
     ustr,
     compress_seq
 )
+from grako.util import re
+from grako import grammars
 from grako.exceptions import CodegenError
 from grako.objectmodel import Node
 from grako.objectmodel import BASE_CLASS_TOKEN
@@ -22,6 +29,33 @@ from grako.codegen.cgbase import ModelRenderer, CodeGenerator
 
 
 class PythonCodeGenerator(CodeGenerator):
+    """ With ``flat=True``, choices, options, optionals, groups, and
+        lookaheads are generated as straight-line ``try/except`` code that
+        calls the frame methods of ``ParseContext`` directly, instead of
+        entering the equivalent context managers.
+
+        With a ``cache`` mapping, the code of each rule is looked up by
+        ``rule_key()``, and only the rules not found are rendered. The
+        ``cache`` is left holding the code of the rules of the grammar.
+    """
+    def __init__(self, flat=False, cache=None, **kwargs):
+        super(PythonCodeGenerator, self).__init__(**kwargs)
+        self.flat = flat
+        self.cache = cache
+        self.rendered_rules = 0
+        # the module-level constants of the rule being rendered for the
+        # cache, as (prefix, source) in the order they were referenced
+        self.rule_constants = None
+        # the methods hoisted out of the rule being rendered
+        self.rule_name = None
+        self.hoisted = []
+        # the regexes for terminals, compiled once at module level, and
+        # the (ignorecase, nameguard, namechars) they were generated for
+        self.terminals = OrderedDict()
+        self.terminal_options = None
+        # the tables of the choices parsed predictively
+        self.predictions = OrderedDict()
+
     def _find_renderer_class(self, item):
         if not isinstance(item, Node):
             return None
@@ -32,9 +66,172 @@ class PythonCodeGenerator(CodeGenerator):
             raise CodegenError('Renderer for %s not found' % name)
         return renderer
 
+    def constant(self, prefix, source):
+        """ The name of the module-level constant for ``source``. While
+            a rule is rendered for the cache, the name is a placeholder
+            that's replaced when the rule is stitched into the module.
+        """
+        if self.rule_constants is not None:
+            index = self.rule_constants.setdefault(
+                (prefix, source),
+                len(self.rule_constants)
+            )
+            return '\0%d\0' % index
+
+        constants = self.terminals if prefix == 'RE' else self.predictions
+        name = constants.get(source)
+        if name is None:
+            name = constants[source] = '%s_%d' % (prefix, len(constants))
+        return name
+
+    def render_rules(self, rules):
+        if self.cache is None:
+            return [self.render(rule) for rule in rules]
+
+        options = (self.flat, self.terminal_options)
+        cached = {}
+        result = []
+        for rule in rules:
+            key = rule_key(rule, options)
+            entry = cached[key] = self.cache.get(key) or self._render_cached(rule)
+            names = [self.constant(prefix, source) for prefix, source in entry['constants']]
+            result.append(
+                CONSTANT_PLACEHOLDER_RE.sub(lambda m: names[int(m.group(1))], entry['code'])
+            )
 
-def codegen(model):
-    return PythonCodeGenerator().render(model)
+        self.cache.clear()
+        self.cache.update(cached)
+        return result
+
+    def _render_cached(self, rule):
+        self.rendered_rules += 1
+        self.rule_constants = OrderedDict()
+        try:
+            code = self.render(rule)
+            constants = [list(c) for c in self.rule_constants]
+        finally:
+            self.rule_constants = None
+        return dict(code=code, constants=constants)
+
+
+CONSTANT_PLACEHOLDER_RE = re.compile(r'\0(\d+)\0')
+
+
+def codegen(model, flat=False, cache=None):
+    return PythonCodeGenerator(flat=flat, cache=cache).render(model)
+
+
+def rule_key(rule, options=None):
+    """ A hash of everything the code generated for ``rule`` depends on:
+        the rule, the rules it includes, extends, or inlines, the FIRST
+        sets and guards computed for its models, and its ``defines()``.
+    """
+    parts = [__version__, repr(options), ustr(rule), repr(rule.defines())]
+    seen = set()
+    stack = [rule]
+    while stack:
+        model = stack.pop()
+        if id(model) in seen or not isinstance(model, Node):
+            continue
+        seen.add(id(model))
+        if model is not rule and isinstance(model, grammars.Rule):
+            parts.append(ustr(model))
+        inlined = getattr(model, 'inlined', None)
+        if inlined is not None:
+            parts.append(ustr(inlined))
+            stack.append(inlined)
+        table = getattr(model, 'prediction', None)
+        parts.append(repr((
+            type(model).__name__,
+            sorted(getattr(model, 'firstset', None) or ()),
+            getattr(model, 'guard', None),
+            prediction_source(table) if table is not None else None,
+            getattr(model, 'collapsed', None),
+        )))
+        stack.extend(reversed(model.children()))
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def guard_args(model):
+    guard = getattr(model, 'guard', None)
+    if guard is None:
+        return None
+    return ', '.join(urepr(g) for g in guard)
+
+
+def hoist(renderer, kind, n, exp):
+    """ Generate ``exp`` as a method of the parser, defined once, instead
+        of as a nested function that's created on every call to the rule.
+        Return the expression that refers to the method.
+    """
+    codegen = renderer.codegen
+    name = '_%s_%s%d' % (codegen.rule_name, kind, n)
+    method = trim(HOISTED_TEMPLATE).format(
+        name=name,
+        exp=indent(renderer.rend(exp))
+    )
+    codegen.hoisted.append((n, method))
+    return 'self.' + name
+
+
+HOISTED_TEMPLATE = '''
+    def {name}(self):
+    {exp}
+    '''
+
+
+def terminal(renderer, source):
+    """ The name of the module-level regex for the ``source`` literal.
+    """
+    return renderer.codegen.constant('RE', source)
+
+
+def prediction(renderer, table):
+    """ The name of the module-level table for a predictive choice.
+        See ``startchars.prediction()``.
+    """
+    return renderer.codegen.constant('PREDICT', prediction_source(table))
+
+
+def prediction_source(table):
+    chars, ws, default, pattern = table
+    return '({%s}, %s, %s, %s)' % (
+        ', '.join('%s: %d' % (urepr(c), i) for c, i in sorted(chars.items())),
+        ws,
+        default,
+        urepr(pattern)
+    )
+
+
+def pattern_call(renderer, pattern, error=None):
+    """ The call that parses ``pattern``. With ``error``, the pattern is
+        a collapsed choice that fails with that message.
+    """
+    method = '_pattern' if error is None else '_pattern_choice'
+    args = [urepr(pattern)]
+    if renderer.codegen.terminal_options is not None:
+        method += '_re'
+        args[0] = terminal(renderer, args[0])
+    if error is not None:
+        args.append(urepr(error))
+    return 'self.%s(%s)' % (method, ', '.join(args))
+
+
+def terminal_options(grammar):
+    """ The options that decide how terminals are matched, as
+        ``Buffer`` will compute them for the generated parser.
+    """
+    directives = grammar.directives
+    nameguard = grammar.nameguard
+    if nameguard is None:
+        nameguard = directives.get('nameguard')
+    namechars = directives.get('namechars') or ''
+    if namechars:
+        nameguard = True
+    elif nameguard is None:
+        whitespace = grammar.whitespace
+        nameguard = whitespace is None or bool(whitespace)
+    return (bool(directives.get('ignorecase')), bool(nameguard), namechars)
 
 
 class Base(ModelRenderer):
@@ -73,17 +270,40 @@ class _Decorator(Base):
 
 
 class Group(_Decorator):
+    def render_fields(self, fields):
+        if self.codegen.flat:
+            return self.flat_template
+
     template = '''\
                 with self._group():
                 {exp:1::}\
                 '''
 
+    flat_template = '''\
+                self._enter_group()
+                try:
+                {exp:1::}
+                except Exception:
+                    self._undo_group()
+                    raise
+                self._commit_group()\
+                '''
+
 
 class Token(Base):
     def render_fields(self, fields):
-        fields.update(token=urepr(self.node.token))
+        token = self.node.token
+        fields.update(token=urepr(token))
+        options = self.codegen.terminal_options
+        if options is None:
+            return self.plain_template
+        _, nameguard, namechars = options
+        regex = token_regex(token, nameguard, namechars)
+        fields.update(regex=terminal(self, urepr(regex)))
+
+    template = "self._token_re({token}, {regex})"
 
-    template = "self._token({token})"
+    plain_template = "self._token({token})"
 
 
 class Constant(Base):
@@ -97,163 +317,329 @@ class Pattern(Base):
     def render_fields(self, fields):
         raw_repr = 'r' + urepr(self.node.pattern).replace("\\\\", '\\')
         fields.update(pattern=raw_repr)
+        if self.codegen.terminal_options is None:
+            return self.plain_template
+        fields.update(regex=terminal(self, raw_repr))
 
-    template = 'self._pattern({pattern})'
+    template = 'self._pattern_re({regex})'
+
+    plain_template = 'self._pattern({pattern})'
 
 
 class Lookahead(_Decorator):
+    def render_fields(self, fields):
+        if self.codegen.flat:
+            return self.flat_template
+
     template = '''\
                 with self._if():
                 {exp:1::}\
                 '''
 
+    flat_template = '''\
+                self._enter_if()
+                try:
+                {exp:1::}
+                finally:
+                    self._leave_if()\
+                '''
+
 
 class NegativeLookahead(_Decorator):
+    def render_fields(self, fields):
+        flat = self.codegen.flat
+        guard = guard_args(self.node.exp)
+        if guard is not None:
+            fields.update(guard=guard)
+            return self.flat_guarded_template if flat else self.guarded_template
+        elif flat:
+            return self.flat_template
+
     template = '''\
                 with self._ifnot():
                 {exp:1::}\
                 '''
 
+    guarded_template = '''\
+                if self._guard({guard}):
+                    with self._ifnot():
+                {exp:2::}\
+                '''
 
-class Sequence(Base):
-    def render_fields(self, fields):
-        fields.update(seq='\n'.join(self.rend(s) for s in self.node.sequence))
+    flat_template = '''\
+                self._enter_if()
+                try:
+                {exp:1::}
+                except Exception as e:
+                    self._leave_ifnot(e)
+                else:
+                    self._leave_ifnot()\
+                '''
 
-    template = '{seq}'
+    flat_guarded_template = '''\
+                if self._guard({guard}):
+                    self._enter_if()
+                    try:
+                {exp:2::}
+                    except Exception as e:
+                        self._leave_ifnot(e)
+                    else:
+                        self._leave_ifnot()\
+                '''
+
+
+class Sequence(Base):
+    def render_into(self, buffer, **fields):
+        for i, s in enumerate(self.node.sequence):
+            if i:
+                buffer.write('\n')
+            self.formatter.render_into(buffer, s)
 
 
 class Choice(Base):
     def render_fields(self, fields):
-        template = trim(self.option_template)
-        options = [
-            template.format(
-                option=indent(self.rend(o))) for o in self.node.options
-        ]
-        options = '\n'.join(o for o in options)
-        firstset = ' '.join(f[0] for f in sorted(self.node.firstset) if f)
+        firstset = ' '.join(sorted(f[0] for f in self.node.firstset if f))
         if firstset:
             error = 'expecting one of: ' + firstset
         else:
             error = 'no available options'
-        fields.update(n=self.counter(),
-                      options=indent(options),
-                      error=urepr(error)
-                      )
 
-    def render(self, **fields):
-        if len(self.node.options) == 1:
-            return self.rend(self.options[0], **fields)
+        tokens = self.node.tokens
+        if tokens is not None:
+            fields.update(
+                tokens='(%s,)' % ', '.join(urepr(t) for t in tokens),
+                error=urepr(error)
+            )
+            return self.tokens_template
+        elif self.node.collapsed is not None:
+            fields.update(exp=pattern_call(self, self.node.collapsed, error))
+            return _Decorator.template
+
+        if self.node.prediction is not None:
+            return self.render_predicted_options(fields, error)
+        elif self.codegen.flat and not self.node.is_factored:
+            # factored options keep their context managers
+            return self.render_flat_options(fields, error)
+
+        options = []
+        for o in self.node.options:
+            guard = guard_args(o)
+            if guard is None:
+                options.append(self.fragment(self.option_template, option=o))
+            else:
+                options.append(self.fragment(
+                    self.guarded_option_template,
+                    guard=guard,
+                    option=o
+                ))
+        fields.update(options=options, error=urepr(error))
+
+    def render_flat_options(self, fields, error):
+        options = []
+        for o in self.node.options:
+            condition = 'self._choice_pending()'
+            guard = guard_args(o)
+            if guard is not None:
+                condition += ' and self._guard(%s)' % guard
+            options.append(self.fragment(
+                self.flat_option_template,
+                condition=condition,
+                option=o
+            ))
+        fields.update(options=options, error=urepr(error))
+        return self.flat_template
+
+    def render_predicted_options(self, fields, error):
+        # only the option selected by the next character is parsed
+        if self.codegen.flat:
+            template = self.flat_predicted_option_template
+        else:
+            template = self.predicted_option_template
+        options = [
+            self.fragment(
+                template,
+                keyword='elif' if i else 'if',
+                n=i,
+                option=o,
+                error=urepr(error)
+            )
+            for i, o in enumerate(self.node.options)
+        ]
+        fields.update(
+            prediction=prediction(self, self.node.prediction),
+            options=options,
+            error=urepr(error)
+        )
+        if self.codegen.flat:
+            return self.flat_predicted_template
+        return self.predicted_template
+
+    def render_into(self, buffer, **fields):
+        if len(self.node.options) == 1 and not self.node.is_factored:
+            self.formatter.render_into(buffer, self.options[0], **fields)
         else:
-            return super(Choice, self).render(**fields)
+            super(Choice, self).render_into(buffer, **fields)
 
     option_template = '''\
                     with self._option():
-                    {option}\
+                    {option:1::}\
+                    '''
+
+    guarded_option_template = '''\
+                    if self._guard({guard}):
+                        with self._option():
+                    {option:2::}\
+                    '''
+
+    predicted_option_template = '''\
+                    {keyword} option == {n}:
+                        with self._predicted_option({error}):
+                    {option:2::}\
                     '''
 
     template = '''\
                 with self._choice():
-                {options}
+                {options:1:\\n:}
                     self._error({error})\
                 '''
 
+    predicted_template = '''\
+                with self._choice():
+                    option = self._predict({prediction})
+                {options:1:\\n:}
+                    else:
+                        self._error({error})\
+                '''
+
+    tokens_template = 'self._token_choice({tokens}, {error})'
+
+    flat_option_template = '''\
+                    if {condition}:
+                        self._enter_option()
+                        try:
+                    {option:2::}
+                        except Exception as e:
+                            self._undo_option(e)
+                        else:
+                            self._commit_option()\
+                    '''
+
+    flat_template = '''\
+                self._enter_choice()
+                try:
+                {options:1:\\n:}
+                    self._check_choice({error})
+                except Exception:
+                    self._undo_choice()
+                    raise
+                self._commit_choice()\
+                '''
+
+    flat_predicted_option_template = '''\
+                    {keyword} option == {n}:
+                        self._enter_predicted()
+                        try:
+                    {option:2::}
+                        except Exception as e:
+                            self._undo_predicted(e, {error})
+                        else:
+                            self._commit_predicted()\
+                    '''
+
+    flat_predicted_template = '''\
+                self._enter_choice()
+                try:
+                    option = self._predict({prediction})
+                {options:1:\\n:}
+                    else:
+                        self._error({error})
+                except Exception:
+                    self._undo_choice()
+                    raise
+                self._commit_choice()\
+                '''
+
+
+class Factored(Base):
+    def render_fields(self, fields):
+        template = trim(self.option_template)
+        suffixes = [
+            template.format(option=indent(self.rend(s)))
+            for s in self.node.suffixes
+        ]
+        fields.update(
+            prefix='\n'.join(self.rend(p) for p in self.node.prefix),
+            suffixes=indent('\n'.join(suffixes))
+        )
+
+    option_template = '''\
+                    with self._factored_option():
+                    {option}\
+                    '''
+
+    template = '''\
+                {prefix}
+                with self._factored():
+                {suffixes}
+                    self._error('no available options')\
+                '''
+
 
 class Closure(_Decorator):
     def render_fields(self, fields):
-        fields.update(n=self.counter())
+        guard = guard_args(self.node.exp)
+        n = self.counter()
+        fields.update(
+            block=hoist(self, 'block', n, self.node.exp),
+            guard=', guard=(%s)' % guard if guard is not None else ''
+        )
 
-    def render(self, **fields):
+    def render_into(self, buffer, **fields):
         if {()} in self.node.exp.firstset:
             raise CodegenError('may repeat empty sequence')
-        return '\n' + super(Closure, self).render(**fields)
+        super(Closure, self).render_into(buffer, **fields)
 
-    template = '''\
-                def block{n}():
-                {exp:1::}
-                self._closure(block{n})\
-                '''
+    template = 'self._closure({block}{guard})'
 
 
 class PositiveClosure(Closure):
-    template = '''\
-                def block{n}():
-                {exp:1::}
-                self._positive_closure(block{n})\
-                '''
+    template = 'self._positive_closure({block}{guard})'
 
 
 class Join(_Decorator):
     def render_fields(self, fields):
-        fields.update(n=self.counter())
+        n = self.counter()
+        fields.update(
+            sep=hoist(self, 'sep', n, self.node.sep),
+            block=hoist(self, 'block', n, self.node.exp)
+        )
 
-    def render(self, **fields):
+    def render_into(self, buffer, **fields):
         if {()} in self.node.exp.firstset:
             raise CodegenError('may repeat empty sequence')
-        return '\n' + super(Join, self).render(**fields)
-
-    template = '''\
-                def sep{n}():
-                {sep:1::}
+        super(Join, self).render_into(buffer, **fields)
 
-                def block{n}():
-                {exp:1::}
-                self._join(block{n}, sep{n})\
-                '''
+    template = 'self._join({block}, {sep})'
 
 
 class PositiveJoin(Join):
-    template = '''\
-                def sep{n}():
-                {sep:1::}
-
-                def block{n}():
-                {exp:1::}
-                self._positive_join(block{n}, sep{n})\
-                '''
+    template = 'self._positive_join({block}, {sep})'
 
 
 class Gather(Join):
-    template = '''\
-                def sep{n}():
-                {sep:1::}
-
-                def block{n}():
-                {exp:1::}
-                self._gather(block{n}, sep{n})\
-                '''
+    template = 'self._gather({block}, {sep})'
 
 
 class PositiveGather(Join):
-    template = '''\
-                def sep{n}():
-                {sep:1::}
-
-                def block{n}():
-                {exp:1::}
-                self._positive_gather(block{n}, sep{n})\
-                '''
+    template = 'self._positive_gather({block}, {sep})'
 
 
 class LeftJoin(PositiveJoin):
-    template = '''\
-                def sep{n}():
-                {sep:1::}
-
-                def block{n}():
-                {exp:1::}
-                self._left_join(block{n}, sep{n})\
-                '''
+    template = 'self._left_join({block}, {sep})'
 
 
 class RightJoin(PositiveJoin):
-    template = '''\
-                def sep{n}():
-                {sep:1::}
-
-                def block{n}():
-                {exp:1::}
-                self._right_join(block{n}, sep{n})\
-                '''
+    template = 'self._right_join({block}, {sep})'
 
 
 class EmptyClosure(Base):
@@ -261,11 +647,51 @@ class EmptyClosure(Base):
 
 
 class Optional(_Decorator):
+    def render_fields(self, fields):
+        flat = self.codegen.flat
+        guard = guard_args(self.node.exp)
+        if guard is not None:
+            fields.update(guard=guard)
+            return self.flat_guarded_template if flat else self.guarded_template
+        elif flat:
+            return self.flat_template
+
     template = '''\
                 with self._optional():
                 {exp:1::}\
                 '''
 
+    flat_template = '''\
+                self._enter_optional()
+                try:
+                {exp:1::}
+                except Exception as e:
+                    self._undo_optional(e)
+                else:
+                    self._commit_optional()\
+                '''
+
+    flat_guarded_template = '''\
+                if self._guard({guard}):
+                    self._enter_optional()
+                    try:
+                {exp:2::}
+                    except Exception as e:
+                        self._undo_optional(e)
+                    else:
+                        self._commit_optional()
+                else:
+                    self._void()\
+                '''
+
+    guarded_template = '''\
+                if self._guard({guard}):
+                    with self._optional():
+                {exp:2::}
+                else:
+                    self._void()\
+                '''
+
 
 class Cut(Base):
     template = 'self._cut()'
@@ -306,8 +732,19 @@ class Special(Base):
 
 
 class RuleRef(Base):
+    def render_fields(self, fields):
+        rule = self.node.inlined
+        if rule is not None:
+            fields.update(
+                inline=hoist(self, 'inline', self.counter(), rule.exp),
+                rulename=urepr(self.node.name)
+            )
+            return self.inline_template
+
     template = "self._{name}_()"
 
+    inline_template = "self._inline({rulename}, {inline})"
+
 
 class RuleInclude(_Decorator):
     def render_fields(self, fields):
@@ -373,6 +810,14 @@ class Rule(_Decorator):
             check_name='\n    self._check_name()' if self.is_name else '',
         )
 
+    def render_into(self, buffer, **fields):
+        self.codegen.rule_name = self.node.name
+        self.codegen.hoisted = []
+        super(Rule, self).render_into(buffer, **fields)
+        hoisted = sorted(self.codegen.hoisted, key=lambda h: h[0])
+        for _, method in hoisted:
+            buffer.write('\n' + method)
+
     template = '''
         @graken({params})
         def _{name}_(self):
@@ -427,9 +872,26 @@ class Grammar(Base):
 
         namechars = urepr(self.node.directives.get('namechars') or '')
 
-        rules = '\n'.join([
-            self.get_renderer(rule).render() for rule in self.node.rules
-        ])
+        options = terminal_options(self.node)
+        self.codegen.terminal_options = options
+        self.codegen.terminals = OrderedDict()
+        self.codegen.predictions = OrderedDict()
+
+        rules = '\n'.join(self.codegen.render_rules(self.node.rules))
+
+        flags = 'RE_FLAGS | re.IGNORECASE' if options[0] else 'RE_FLAGS'
+        terminals = '\n'.join(
+            '%s = re.compile(%s, %s)' % (name, source, flags)
+            for source, name in self.codegen.terminals.items()
+        )
+        predictions = '\n'.join(
+            '%s = %s' % (name, source)
+            for source, name in self.codegen.predictions.items()
+        )
+        if predictions:
+            terminals = terminals + '\n\n' + predictions if terminals else predictions
+        if terminals:
+            terminals = '\n\n' + terminals
 
         version = str(tuple(int(n) for n in str(timestamp()).split('.')))
 
@@ -449,6 +911,8 @@ class Grammar(Base):
                       parseinfo=parseinfo,
                       keywords=keywords,
                       namechars=namechars,
+                      terminals=terminals,
+                      terminal_options=urepr(options),
                       )
 
     abstract_rule_template = '''
@@ -477,7 +941,7 @@ class Grammar(Base):
                 from grako.util import re, RE_FLAGS, generic_main  # noqa
 
 
-                KEYWORDS = {{{keywords}}}
+                KEYWORDS = {{{keywords}}}{terminals}
 
 
                 class {name}Buffer(Buffer):
@@ -505,6 +969,8 @@ class Grammar(Base):
 
 
                 class {name}Parser(Parser):
+                    terminal_options = {terminal_options}
+
                     def __init__(
                         self,
                         whitespace={whitespace},
@@ -0,0 +1,464 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2017      by Juancarlo Añez
+# Copyright (C) 2012-2016 by Juancarlo Añez and Thomas Bragg
+"""
+Compilation of grammar models to the bytecode run by ``grako.vm``.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from grako.util import (
+    compress_seq,
+    indent,
+    safe_name,
+    token_regex,
+    trim,
+    urepr,
+    ustr,
+)
+from grako.util import re, RE_FLAGS
+from grako.buffering import RETYPE
+from grako.exceptions import CodegenError
+from grako.objectmodel import BASE_CLASS_TOKEN
+from grako.walkers import NodeWalker
+from grako.codegen.python import terminal_options
+from grako.vm import (
+    Program,
+    CALL, RETURN, JUMP, GUARD,
+    TOKEN, TOKENS, PATTERN, PATTERNS, CONSTANT, EOF, VOID, FAIL, CUT,
+    NAME, ADD_NAME, CHECK_NAME, DEFINE,
+    CHOICE, OPTION, COMMIT, FAIL_CHOICE, END_CHOICE,
+    GROUP, END_GROUP, IF, END_IF, IFNOT, END_IFNOT,
+    OPEN_CLOSURE, TRY, END_TRY, WRAP, REPEAT, ISOLATE, END_ISOLATE, NEXT,
+    CLOSE_CLOSURE, EMPTY_CLOSURE, ASSOC,
+    ISOLATE_CUT, ISOLATE_ADD,
+)
+
+
+class Label(object):
+    """ A jump target, resolved when the program is assembled.
+    """
+    address = None
+
+
+class Assembler(NodeWalker):
+    """ Compile the rules of a grammar into a ``Program``, emitting the
+        instructions that follow, one to one, the ``ParseContext`` calls
+        of parsers generated by ``grako.codegen.python``.
+    """
+    def __init__(self, grammar):
+        super(Assembler, self).__init__()
+        self.grammar = grammar
+        self.terminal_options = terminal_options(grammar)
+        self.rule_index = {rule.name: i for i, rule in enumerate(grammar.rules)}
+        self.ops = []
+        self.args = []
+        self.constants = []
+        self.patterns = []
+        self._constant_index = {}
+        self._pattern_index = {}
+
+    def assemble(self):
+        rules = [self.assemble_rule(rule) for rule in self.grammar.rules]
+        args = [a.address if isinstance(a, Label) else a for a in self.args]
+        return Program(
+            self.grammar.name,
+            rules,
+            self.ops,
+            args,
+            constants=self.constants,
+            patterns=self.patterns,
+            options=parser_options(self.grammar),
+            terminal_options=self.terminal_options,
+        )
+
+    def assemble_rule(self, rule):
+        address = len(self.ops)
+        self.walk(getattr(rule, 'rhs', rule.exp))
+        if rule.is_name:
+            self.emit(CHECK_NAME)
+
+        defines = compress_seq(rule.defines())
+        ldefs = set(safe_name(d) for d, l in defines if l)
+        sdefs = set(safe_name(d) for d, l in defines if not l and d not in ldefs)
+        if sdefs or ldefs:
+            self.emit(DEFINE, self.constant((tuple(sorted(sdefs)), tuple(sorted(ldefs)))))
+        self.emit(RETURN)
+
+        params = tuple(self.param(p) for p in rule.params or ())
+        kwparams = {k: self.param(v) for k, v in (rule.kwparams or {}).items()}
+        return (rule.name, address, params, kwparams)
+
+    @staticmethod
+    def param(p):
+        if isinstance(p, (int, float)):
+            return p
+        return ustr(p).split(BASE_CLASS_TOKEN)[0]
+
+    def emit(self, op, arg=0):
+        self.ops.append(op)
+        self.args.append(arg)
+
+    def mark(self, label):
+        label.address = len(self.ops)
+
+    def constant(self, value):
+        key = (type(value), value)
+        index = self._constant_index.get(key)
+        if index is None:
+            index = self._constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def pattern(self, pattern):
+        index = self._pattern_index.get(pattern)
+        if index is None:
+            index = self._pattern_index[pattern] = len(self.patterns)
+            self.patterns.append(pattern)
+        return index
+
+    def guard(self, model, label):
+        """ Jump to ``label`` unless the text ahead may start ``model``.
+        """
+        guard = getattr(model, 'guard', None)
+        if guard is None:
+            return False
+        self.emit(GUARD, self.constant(tuple(guard)))
+        self.emit(JUMP, label)
+        return True
+
+    def _walk_default(self, node):
+        raise CodegenError(
+            '%s is not supported by the VM code generator' % type(node).__name__
+        )
+
+    def walk_Decorator(self, node):
+        self.walk(node.exp)
+
+    def walk_Sequence(self, node):
+        for s in node.sequence:
+            self.walk(s)
+
+    def walk_Comment(self, node):
+        pass
+
+    def walk_Special(self, node):
+        pass
+
+    def walk_Void(self, node):
+        self.emit(VOID)
+
+    def walk_Fail(self, node):
+        self.emit(FAIL)
+
+    def walk_EOF(self, node):
+        self.emit(EOF)
+
+    def walk_Cut(self, node):
+        self.emit(CUT)
+
+    def walk_Token(self, node):
+        _, nameguard, namechars = self.terminal_options
+        regex = token_regex(node.token, nameguard, namechars)
+        self.emit(TOKEN, self.constant((node.token, self.pattern(regex))))
+
+    def walk_Constant(self, node):
+        self.emit(CONSTANT, self.constant(node.literal))
+
+    def walk_Pattern(self, node):
+        self.emit(PATTERN, self.pattern(node.pattern))
+
+    def walk_RuleRef(self, node):
+        self.emit(CALL, self.rule_index[node.name])
+
+    def walk_RuleInclude(self, node):
+        self.walk(node.exp)
+
+    def walk_Named(self, node):
+        self.walk(node.exp)
+        self.emit(NAME, self.constant(safe_name(node.name)))
+
+    def walk_NamedList(self, node):
+        self.walk(node.exp)
+        self.emit(ADD_NAME, self.constant(safe_name(node.name)))
+
+    def walk_Group(self, node):
+        self.emit(GROUP)
+        self.walk(node.exp)
+        self.emit(END_GROUP)
+
+    def walk_Lookahead(self, node):
+        self.emit(IF)
+        self.walk(node.exp)
+        self.emit(END_IF)
+
+    def walk_NegativeLookahead(self, node):
+        end = Label()
+        self.guard(node.exp, end)
+        self.emit(IFNOT, end)
+        self.walk(node.exp)
+        self.emit(END_IFNOT)
+        self.mark(end)
+
+    def walk_Choice(self, node):
+        if node.is_factored:
+            raise CodegenError('factored choices are not supported by the VM code generator')
+        if node.tokens is not None:
+            self.emit(TOKENS, self.constant((node.tokens, self.choice_error(node))))
+            return
+        elif node.collapsed is not None:
+            regex = self.pattern(node.collapsed)
+            self.emit(PATTERNS, self.constant((regex, self.choice_error(node))))
+            return
+        elif len(node.options) == 1:
+            self.walk(node.options[0])
+            return
+
+        end = Label()
+        self.emit(CHOICE)
+        for o in node.options:
+            following = Label()
+            self.guard(o, following)
+            self.emit(OPTION, following)
+            self.walk(o)
+            self.emit(COMMIT, end)
+            self.mark(following)
+        self.emit(FAIL_CHOICE, self.constant(self.choice_error(node)))
+        self.mark(end)
+        self.emit(END_CHOICE)
+
+    @staticmethod
+    def choice_error(node):
+        firstset = ' '.join(f[0] for f in sorted(node.firstset) if f)
+        if firstset:
+            return 'expecting one of: ' + firstset
+        return 'no available options'
+
+    def walk_Optional(self, node):
+        skip = Label()
+        guarded = self.guard(node.exp, skip)
+
+        end = Label()
+        self.emit(CHOICE)
+        self.emit(OPTION, end)
+        self.walk(node.exp)
+        self.emit(COMMIT, end)
+        self.mark(end)
+        self.emit(END_CHOICE)
+
+        if guarded:
+            done = Label()
+            self.emit(JUMP, done)
+            self.mark(skip)
+            self.emit(VOID)
+            self.mark(done)
+
+    def repeat(self, node, positive=False, sep=None, omitsep=False, guarded=False):
+        """ The code for ``ParseContext._closure()`` and
+            ``_positive_closure()``.
+        """
+        exp = node.exp
+        if {()} in exp.firstset:
+            raise CodegenError('may repeat empty sequence')
+        guard = exp if guarded and sep is None else None
+
+        self.emit(OPEN_CLOSURE, int(positive))
+        skip = Label()
+        optional = Label()
+        if not positive:
+            if guard is not None:
+                self.guard(guard, skip)
+            self.emit(CHOICE)
+            self.emit(OPTION, optional)
+
+        self.emit(TRY)
+        self.walk(exp)
+        self.emit(END_TRY)
+        self.emit(WRAP)
+
+        loop = Label()
+        done = Label()
+        self.mark(loop)
+        if guard is not None:
+            self.guard(guard, done)
+        self.emit(REPEAT, done)
+        if sep is not None:
+            self.emit(ISOLATE)
+            self.walk(sep)
+            self.emit(END_ISOLATE, ISOLATE_CUT | (0 if omitsep else ISOLATE_ADD))
+        self.emit(ISOLATE)
+        self.walk(exp)
+        self.emit(END_ISOLATE, ISOLATE_ADD)
+        self.emit(NEXT, loop)
+        self.mark(done)
+
+        if not positive:
+            self.emit(COMMIT, optional)
+            self.mark(optional)
+            self.emit(END_CHOICE)
+            self.mark(skip)
+        self.emit(CLOSE_CLOSURE)
+
+    def walk_Closure(self, node):
+        self.repeat(node, guarded=True)
+
+    def walk_PositiveClosure(self, node):
+        self.repeat(node, positive=True, guarded=True)
+
+    def walk_EmptyClosure(self, node):
+        self.emit(EMPTY_CLOSURE)
+
+    def walk_Join(self, node):
+        self.repeat(node, sep=node.sep)
+
+    def walk_PositiveJoin(self, node):
+        self.repeat(node, positive=True, sep=node.sep)
+
+    def walk_Gather(self, node):
+        self.repeat(node, sep=node.sep, omitsep=True)
+
+    def walk_PositiveGather(self, node):
+        self.repeat(node, positive=True, sep=node.sep, omitsep=True)
+
+    def walk_LeftJoin(self, node):
+        self.repeat(node, positive=True, sep=node.sep)
+        self.emit(ASSOC, 0)
+
+    def walk_RightJoin(self, node):
+        self.repeat(node, positive=True, sep=node.sep)
+        self.emit(ASSOC, 1)
+
+
+def parser_options(grammar):
+    """ The defaults for the options of parsers for ``grammar``, as
+        generated parsers define them.
+    """
+    directives = grammar.directives
+    whitespace = grammar.whitespace
+    if whitespace is None and directives.get('whitespace') is not None:
+        whitespace = re.compile(directives.get('whitespace'), RE_FLAGS | re.DOTALL)
+    return dict(
+        whitespace=whitespace,
+        nameguard=grammar.nameguard,
+        comments_re=directives.get('comments'),
+        eol_comments_re=directives.get('eol_comments'),
+        ignorecase=directives.get('ignorecase'),
+        left_recursion=directives.get('left_recursion', False),
+        parseinfo=directives.get('parseinfo', True),
+        keywords=set(grammar.keywords),
+        namechars=directives.get('namechars') or '',
+    )
+
+
+def assemble(grammar):
+    return Assembler(grammar).assemble()
+
+
+def literal(value):
+    if isinstance(value, RETYPE):
+        return 're.compile(%s, %d)' % (urepr(value.pattern), value.flags)
+    elif isinstance(value, set):
+        return 'set(%s)' % urepr(sorted(value))
+    return urepr(value)
+
+
+def codegen(grammar):
+    """ Generate a Python module with the bytecode for ``grammar`` and a
+        ``VMParser`` that runs it.
+    """
+    program = assemble(grammar)
+    options = [
+        '%s=%s' % (k, literal(v)) for k, v in sorted(program.options.items())
+    ]
+    fields = dict(
+        name=program.name,
+        name_repr=urepr(program.name),
+        rules=items(urepr(r) for r in program.rules),
+        ops=items(rows(program.ops)),
+        args=items(rows(program.args)),
+        constants=items(urepr(c) for c in program.constants),
+        patterns=items(urepr(p) for p in program.patterns),
+        options=items(options),
+        terminal_options=urepr(program.terminal_options),
+    )
+    return trim(MODULE_TEMPLATE).format(**fields)
+
+
+def items(lines):
+    return indent(''.join('%s,\n' % line for line in lines), 2)
+
+
+def rows(numbers, width=16):
+    numbers = list(numbers)
+    return [
+        ', '.join(ustr(n) for n in numbers[i:i + width])
+        for i in range(0, len(numbers), width)
+    ]
+
+
+MODULE_TEMPLATE = '''\
+    #!/usr/bin/env python
+    # -*- coding: utf-8 -*-
+
+    # CAVEAT UTILITOR
+    #
+    # This file was automatically generated by Grako.
+    #
+    #    https://pypi.python.org/pypi/grako/
+    #
+    # Any changes you make to it will be overwritten the next time
+    # the file is generated.
+
+
+    from __future__ import print_function, division, absolute_import, unicode_literals
+
+    from grako.util import re, generic_main  # noqa
+    from grako.vm import Program, VMParser
+
+
+    PROGRAM = Program(
+        {name_repr},
+        rules=(
+    {rules}
+        ),
+        ops=(
+    {ops}
+        ),
+        args=(
+    {args}
+        ),
+        constants=(
+    {constants}
+        ),
+        patterns=(
+    {patterns}
+        ),
+        options=dict(
+    {options}
+        ),
+        terminal_options={terminal_options},
+    )
+
+
+    class {name}Parser(VMParser):
+        program = PROGRAM
+
+
+    def main(filename, startrule, **kwargs):
+        with open(filename) as f:
+            text = f.read()
+        parser = {name}Parser()
+        return parser.parse(text, startrule, filename=filename, **kwargs)
+
+
+    if __name__ == '__main__':
+        import json
+        from grako.util import asjson
+
+        ast = generic_main(main, {name}Parser, name='{name}')
+        print('AST:')
+        print(ast)
+        print()
+        print('JSON:')
+        print(json.dumps(asjson(ast), indent=2))
+        print()
+    '''
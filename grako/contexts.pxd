@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2017      by Juancarlo Añez
+# Copyright (C) 2012-2016 by Juancarlo Añez and Thomas Bragg
+
+# Declarations for builds with Cython. They make ParseContext an
+# extension type with the state used while parsing stored in C fields.
+# Other attributes, and those of subclasses, go to __dict__ as before.
+
+from grako.buffering cimport Buffer
+
+
+cdef class ParseContext:
+    cdef dict __dict__
+
+    cdef public Buffer _buffer
+    cdef public object semantics
+    cdef public object handler
+    cdef public object trace
+    cdef public object memoize_lookaheads
+    cdef public object left_recursion
+    cdef public object intern_tokens
+    cdef public object share_subtrees
+    cdef public object lazy_tokens
+    cdef public bint _terminals_ok
+
+    cdef public list _ast_stack
+    cdef public list _concrete_stack
+    cdef public list _rule_stack
+    cdef public list _cut_stack
+    cdef public list _frame_stack
+    cdef public list _choice_stack
+    cdef public dict _memoization_cache
+    cdef public dict _semantic_rules
+    cdef public dict _guard_cache
+    cdef public dict _token_choice_cache
+
+    cdef public object _last_node
+    cdef public object _state
+    cdef public Py_ssize_t _lookahead
+    cdef public object _furthest_exception
+
+    cdef public dict _recursive_results
+    cdef public list _recursive_eval
+    cdef public list _recursive_head
+
+    cdef public list _events
+    cdef public list _event_frames
+    cdef public Py_ssize_t _open_event_frames
+    cdef public Py_ssize_t _recording
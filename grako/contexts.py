@@ -14,10 +14,14 @@ from ._unicode_characters import (
     C_FAILURE,
     C_RECURSION,
 )
-from grako.util import notnone, ustr, prune_dict, is_list, info, safe_name
-from grako.util import left_assoc, right_assoc
+from grako.util import notnone, ustr, prune_dict, is_list, info, safe_name, strtype
+from grako.util import left_assoc, right_assoc, token_regex
+from grako.util import re, RE_FLAGS
 from grako.ast import AST
 from grako.infos import ParseInfo
+from grako.buffering import TokenSpan
+from grako.events import EventRecord, RuleRef, deliver
+from grako.objectmodel import detach
 from grako import buffering
 from grako import color
 from grako.exceptions import (
@@ -33,18 +37,21 @@ from grako.exceptions import (
     OptionSucceeded
 )
 
-__all__ = ['ParseContext']
+__all__ = ['ParseContext', 'SharingStats']
+
+
+SHAREABLE_TYPES = (strtype, tuple, frozenset, int, float)
 
 
 # decorator for rule implementation methods
 def graken(*params, **kwparams):
     def decorator(rule):
+        # remove the single leading and trailing underscore
+        # that the parser generator added
+        name = rule.__name__[1:-1]
+
         @functools.wraps(rule)
         def wrapper(self):
-            name = rule.__name__
-            # remove the single leading and trailing underscore
-            # that the parser generator added
-            name = name[1:-1]
             return self._call(rule, name, params, kwparams)
         return wrapper
     return decorator
@@ -54,7 +61,34 @@ class Closure(list):
     pass
 
 
+class SharingStats(object):
+    """ Counts of the objects shared through ``intern_tokens`` and
+        ``share_subtrees``, and of the memory saved by sharing them.
+    """
+    def __init__(self):
+        self.tokens = 0
+        self.token_hits = 0
+        self.token_bytes = 0
+        self.subtrees = 0
+        self.subtree_hits = 0
+        self.subtree_bytes = 0
+
+    @property
+    def saved_bytes(self):
+        return self.token_bytes + self.subtree_bytes
+
+    def __repr__(self):
+        return '%s(%s)' % (
+            type(self).__name__,
+            ', '.join('%s=%d' % kv for kv in sorted(vars(self).items()))
+        )
+
+
 class ParseContext(object):
+    # the (ignorecase, nameguard, namechars) for which the terminal
+    # regexes of a generated parser were compiled
+    terminal_options = None
+
     def __init__(self,
                  buffer_class=buffering.Buffer,
                  semantics=None,
@@ -74,12 +108,17 @@ class ParseContext(object):
                  colorize=None,
                  keywords=None,
                  namechars='',
+                 handler=None,
+                 intern_tokens=False,
+                 share_subtrees=False,
+                 lazy_tokens=False,
                  **kwargs):
         super(ParseContext, self).__init__()
 
         self._buffer = None
         self.buffer_class = buffer_class
         self.semantics = semantics
+        self.handler = handler
         self.encoding = encoding
         self.parseinfo = parseinfo
         self.trace = trace
@@ -97,7 +136,12 @@ class ParseContext(object):
         self.colorize = colorize
         self.keywords = set(keywords or [])
         self.namechars = namechars
+        self.intern_tokens = intern_tokens
+        self.share_subtrees = share_subtrees
+        self.lazy_tokens = lazy_tokens
 
+        self._guard_cache = dict()
+        self._token_choice_cache = dict()
         self._initialize_caches()
 
     def _initialize_caches(self):
@@ -105,7 +149,10 @@ class ParseContext(object):
         self._concrete_stack = [None]
         self._rule_stack = []
         self._cut_stack = [False]
+        self._frame_stack = []
+        self._choice_stack = []
         self._memoization_cache = dict()
+        self._semantic_rules = dict()
 
         self._last_node = None
         self._state = None
@@ -115,6 +162,17 @@ class ParseContext(object):
         self._recursive_eval = []
         self._recursive_head = []
 
+        self._events = []
+        self._event_frames = []
+        self._open_event_frames = 0
+        self._recording = 0
+        self._rule_defines = None
+
+        self._intern_table = dict()
+        self._shared_table = dict()
+        self.sharing_stats = SharingStats()
+        self._materialized = dict()
+
     def _reset(self,
                text=None,
                filename=None,
@@ -131,6 +189,10 @@ class ParseContext(object):
                colorize=None,
                keywords=None,
                namechars='',
+               handler=None,
+               intern_tokens=None,
+               share_subtrees=None,
+               lazy_tokens=None,
                **kwargs):
         if ignorecase is None:
             ignorecase = self.ignorecase
@@ -144,6 +206,14 @@ class ParseContext(object):
             self.trace = trace
         if semantics is not None:
             self.semantics = semantics
+        if handler is not None:
+            self.handler = handler
+        if intern_tokens is not None:
+            self.intern_tokens = intern_tokens
+        if share_subtrees is not None:
+            self.share_subtrees = share_subtrees
+        if lazy_tokens is not None:
+            self.lazy_tokens = lazy_tokens
         if colorize is not None:
             self.colorize = colorize
         if keywords is not None:
@@ -171,6 +241,11 @@ class ParseContext(object):
                 namechars=namechars,
                 **kwargs)
         self._buffer = buffer
+        self._terminals_ok = self.terminal_options == (
+            bool(buffer.ignorecase),
+            bool(buffer.nameguard),
+            buffer.namechars or ''
+        )
 
     def _set_furthest_exception(self, e):
         if not self._furthest_exception or e.pos > self._furthest_exception.pos:
@@ -187,6 +262,8 @@ class ParseContext(object):
               **kwargs):
         try:
             self.parseinfo = kwargs.pop('parseinfo', self.parseinfo)
+            detached = kwargs.pop('detach', False)
+            text_store = kwargs.pop('text_store', None)
             self._reset(
                 text=text,
                 filename=filename,
@@ -198,6 +275,12 @@ class ParseContext(object):
             )
             rule = self._find_rule(rule_name)
             result = rule()
+            if self.lazy_tokens:
+                result = self._materialize(result)
+            if self.handler is not None:
+                self._flush_events()
+            elif detached or text_store is not None:
+                result = detach(result, store=text_store)
             self.ast[rule_name] = result
             return result
         except FailedCut as e:
@@ -222,11 +305,15 @@ class ParseContext(object):
 
     @property
     def _pos(self):
-        return self._buffer.pos
+        return self._buffer._pos
 
     def _clear_cache(self):
         self._memoization_cache = dict()
         self._recursive_results = dict()
+        self._events = []
+        self._intern_table = dict()
+        self._shared_table = dict()
+        self._materialized = dict()
 
     def _goto(self, pos):
         self._buffer.goto(pos)
@@ -234,6 +321,45 @@ class ParseContext(object):
     def _next_token(self):
         self._buffer.next_token()
 
+    def _guard(self, raw=None, ws=None):
+        """ Tell if the text ahead may start an expression that can only
+            start with a character matching ``raw``, or ``ws`` after
+            whitespace and comments are skipped.
+        """
+        text = self._buffer.text
+        p = self._pos
+        if raw is not None and self._guard_re(raw).match(text, p):
+            return True
+        if ws is None:
+            return False
+        self._next_token()
+        q = self._pos
+        self._goto(p)
+        return self._guard_re(ws).match(text, q) is not None
+
+    def _predict(self, prediction):
+        """ The index of the only option of a choice that may match the
+            text ahead, or None. See ``startchars.prediction()``.
+        """
+        chars, ws, default, pattern = prediction
+        p = q = self._pos
+        if ws:
+            self._next_token()
+            q = self._pos
+            self._goto(p)
+        c = self._buffer.text[q:q + 1]
+        option = chars.get(c.lower())
+        if option is None and pattern is not None and c and self._guard_re(pattern).match(c):
+            return default
+        return option
+
+    def _guard_re(self, pattern):
+        regex = self._guard_cache.get(pattern)
+        if regex is None:
+            regex = re.compile(pattern, RE_FLAGS | re.IGNORECASE)
+            self._guard_cache[pattern] = regex
+        return regex
+
     @property
     def ast(self):
         return self._ast_stack[-1]
@@ -243,9 +369,13 @@ class ParseContext(object):
         self._ast_stack[-1] = value
 
     def name_last_node(self, name):
+        if self.handler is not None:
+            self._add_event('name', name, self.last_node, False)
         self.ast[name] = self.last_node
 
     def add_last_node_to_name(self, name):
+        if self.handler is not None:
+            self._add_event('name', name, self.last_node, True)
         self.ast.setlist(name, self.last_node)
 
     def _push_ast(self):
@@ -329,12 +459,103 @@ class ParseContext(object):
         prune_cache(self._memoization_cache)
         prune_cache(self._recursive_results)
 
+        if self.handler is not None:
+            self._commit_event_frame()
+
     def _push_cut(self):
         self._cut_stack.append(False)
+        if self.handler is not None:
+            self._push_event_frame()
 
     def _pop_cut(self):
+        if self.handler is not None:
+            self._pop_event_frame()
         return self._cut_stack.pop()
 
+    def _add_event(self, *event):
+        self._events.append(event)
+
+    def _can_flush_events(self):
+        return not (self._open_event_frames or self._recording or self._lookahead)
+
+    def _flush_events(self):
+        # events are delivered only when no open backtrack point
+        # may still discard them
+        if self._can_flush_events() and self._events:
+            events = self._events
+            self._events = []
+            deliver(self.handler, events)
+
+    def _push_event_frame(self):
+        self._event_frames.append(len(self._events))
+        self._open_event_frames += 1
+
+    def _commit_event_frame(self):
+        # the innermost backtrack point can no longer discard its events
+        if self._event_frames and self._event_frames[-1] is not None:
+            self._event_frames[-1] = None
+            self._open_event_frames -= 1
+
+    def _drop_frame_events(self):
+        mark = self._event_frames[-1]
+        if mark is not None:
+            del self._events[mark:]
+
+    def _pop_event_frame(self):
+        if self._event_frames.pop() is not None:
+            self._open_event_frames -= 1
+        self._flush_events()
+
+    def _start_rule_events(self, name, pos):
+        # A rule that starts where its events cannot be delivered
+        # right away keeps them in an EventRecord, which is memoized
+        # instead of the rule's node.
+        recorded = self.left_recursion or not self._can_flush_events()
+        if recorded:
+            self._recording += 1
+        mark = len(self._events)
+        self._add_event('start_rule', name, pos)
+        return mark, recorded
+
+    def _end_rule_events(self, name, pos, events):
+        mark, recorded = events
+        self._add_event('rule_value', name, self._rule_value(name, pos))
+        self._add_event('end_rule', name, pos, self._pos)
+        ref = RuleRef(name, pos, self._pos)
+        if not recorded:
+            return ref, None
+        self._recording -= 1
+        record = EventRecord(self._events[mark:])
+        del self._events[mark:]
+        return ref, record
+
+    def _rule_value(self, name, pos):
+        # the node the rule would have produced without a handler,
+        # before semantic actions, with the results of nested rules
+        # replaced by RuleRef
+        defines, self._rule_defines = self._rule_defines, None
+        node = self.ast
+        if not node:
+            return self.cst
+        elif '@' in node:
+            return node['@']
+        elif self.parseinfo:
+            node.set_parseinfo(self._get_parseinfo(name, pos))
+        if defines is not None:
+            node._define(*defines)
+        return node
+
+    def _fail_rule_events(self, events):
+        mark, recorded = events
+        if recorded:
+            self._recording -= 1
+            del self._events[mark:]
+
+    def _replay_events(self, record):
+        if record is not None:
+            self._events.append(record)
+        self._flush_events()
+
     def _enter_lookahead(self):
         self._lookahead += 1
 
@@ -357,6 +578,14 @@ class ParseContext(object):
         return lambda: None  # makes static checkers happy
 
     def _find_semantic_rule(self, name):
+        # semantic actions are looked up once per rule and parse
+        found = self._semantic_rules.get(name)
+        if found is None:
+            found = self._lookup_semantic_rule(name)
+            self._semantic_rules[name] = found
+        return found
+
+    def _lookup_semantic_rule(self, name):
         if self.semantics is None:
             return None, None
 
@@ -435,21 +664,14 @@ class ParseContext(object):
         self._error('fail')
 
     def _get_parseinfo(self, name, pos):
-        endpos = self._pos
-        return ParseInfo(
-            self._buffer,
-            name,
-            pos,
-            endpos,
-            self._buffer.posline(pos),
-            self._buffer.posline(endpos),
-        )
+        return ParseInfo(self._buffer, name, pos, self._pos)
 
     def _call(self, rule, name, params, kwparams):
         self._rule_stack.append(name)
         pos = self._pos
         try:
-            self._trace_entry()
+            if self.trace:
+                self._trace_entry()
 
             self._last_node = None
 
@@ -457,20 +679,68 @@ class ParseContext(object):
 
             self._goto(newpos)
             self._state = newstate
+            if self.handler is not None:
+                node, record = node
+                self._replay_events(record)
             self._add_cst_node(node)
             self._last_node = node
 
-            self._trace_success()
+            if self.trace:
+                self._trace_success()
+            return node
+        except FailedPattern:
+            self._error('Expecting <%s>' % name)
+        except FailedParse as e:
+            self._goto(pos)
+            self._set_furthest_exception(e)
+            if self.trace:
+                if isinstance(e, FailedLeftRecursion):
+                    self._trace_recursion()
+                else:
+                    self._trace_failure()
+            raise
+        finally:
+            self._rule_stack.pop()
+
+    def _inline(self, name, block):
+        """ Parse ``block``, the body of rule ``name``, in place of a call
+            to the rule. Inlined rules define no names and are not recursive,
+            so only memoization is skipped. Failures are recorded as in
+            ``_call()``.
+        """
+        if self.trace or self.handler is not None:
+            # the rule boundaries are observable
+            return self._find_rule(name)()
+
+        self._rule_stack.append(name)
+        pos = self._pos
+        try:
+            self._last_node = None
+            if name[0].islower():
+                self._next_token()
+            self._push_ast()
+            try:
+                block()
+                node = self.cst
+                node = self._invoke_semantic_rule(name, node, None, None)
+            except FailedSemantics as e:
+                self._error(ustr(e), FailedParse)
+            except FailedParse as e:
+                self._set_furthest_exception(e)
+                raise
+            finally:
+                self._pop_ast()
+
+            if self.share_subtrees:
+                node = self._share(node)
+            self._add_cst_node(node)
+            self._last_node = node
             return node
         except FailedPattern:
             self._error('Expecting <%s>' % name)
         except FailedParse as e:
             self._goto(pos)
             self._set_furthest_exception(e)
-            if isinstance(e, FailedLeftRecursion):
-                self._trace_recursion()
-            else:
-                self._trace_failure()
             raise
         finally:
             self._rule_stack.pop()
@@ -491,19 +761,27 @@ class ParseContext(object):
 
         self._set_left_recursion_guard(name, key)
         self._push_ast()
+        events = None
+        if self.handler is not None:
+            events = self._start_rule_events(name, pos)
         try:
             try:
                 rule(self)
 
-                node = self.ast
-                if not node:
-                    node = self.cst
-                elif '@' in node:
-                    node = node['@']  # override the AST
-                elif self.parseinfo:
-                    node.set_parseinfo(self._get_parseinfo(name, pos))
-
-                node = self._invoke_semantic_rule(name, node, params, kwparams)
+                if events is not None:
+                    node = self._end_rule_events(name, pos, events)
+                else:
+                    node = self.ast
+                    if not node:
+                        node = self.cst
+                    elif '@' in node:
+                        node = node['@']  # override the AST
+                    elif self.parseinfo:
+                        node.set_parseinfo(self._get_parseinfo(name, pos))
+
+                    node = self._invoke_semantic_rule(name, node, params, kwparams)
+                    if self.share_subtrees:
+                        node = self._share(node)
                 result = (node, self._pos, self._state)
 
                 result = self._left_recurse(rule, name, pos, key, result, params, kwparams)
@@ -515,6 +793,8 @@ class ParseContext(object):
                 self._error(ustr(e), FailedParse)
         except FailedParse as e:
             self._set_furthest_exception(e)
+            if events is not None:
+                self._fail_rule_events(events)
             if self._memoization():
                 cache[key] = e
             raise
@@ -591,39 +871,206 @@ class ParseContext(object):
 
     def _invoke_semantic_rule(self, name, node, params, kwparams):
         semantic_rule, postproc = self._find_semantic_rule(name)
+        if self.lazy_tokens and (semantic_rule or postproc):
+            node = self._materialize(node)
         if semantic_rule:
             node = semantic_rule(node, *(params or ()), **(kwparams or {}))
         if postproc is not None:
             postproc(self, node)
         return node
 
+    def _intern(self, token):
+        interned = self._intern_table.get(token)
+        if interned is None:
+            self._intern_table[token] = interned = token
+            self.sharing_stats.tokens += 1
+        elif interned is not token:
+            self.sharing_stats.token_hits += 1
+            self.sharing_stats.token_bytes += sys.getsizeof(token)
+        return interned
+
+    def _materialize(self, node):
+        # replace the token spans in a result with strings
+        if isinstance(node, TokenSpan):
+            token = ustr(node)
+            return self._intern(token) if self.intern_tokens else token
+        elif id(node) in self._materialized:
+            return node
+        elif isinstance(node, AST):
+            self._materialized[id(node)] = node
+            for key, value in node.items():
+                token = self._materialize(value)
+                if token is not value:
+                    dict.__setitem__(node, key, token)
+        elif isinstance(node, list):
+            self._materialized[id(node)] = node
+            for i, value in enumerate(node):
+                token = self._materialize(value)
+                if token is not value:
+                    node[i] = token
+        return node
+
+    def _share(self, node):
+        # only values that are immutable all the way down can be shared
+        if not isinstance(node, SHAREABLE_TYPES):
+            return node
+        key = (type(node), node)
+        try:
+            shared = self._shared_table.get(key)
+        except TypeError:
+            return node  # unhashable contents
+        if shared is None:
+            self._shared_table[key] = shared = node
+            self.sharing_stats.subtrees += 1
+        elif shared is not node:
+            self.sharing_stats.subtree_hits += 1
+            self.sharing_stats.subtree_bytes += sys.getsizeof(node)
+        return shared
+
     def _token(self, token):
         self._next_token()
         if self._buffer.match(token) is None:
-            self._trace_match(token, failed=True)
+            if self.trace:
+                self._trace_match(token, failed=True)
+            self._error(token, etype=FailedToken)
+        if self.trace:
+            self._trace_match(token)
+        if self.handler is not None:
+            self._add_event('token', token, self._pos - len(token), self._pos)
+        self._add_cst_node(token)
+        self._last_node = token
+        return token
+
+    def _token_re(self, token, regex):
+        """ Parse ``token`` with a regex compiled by the parser generator,
+            which includes the nameguard test when it applies.
+        """
+        if not self._terminals_ok:
+            return self._token(token)
+        self._next_token()
+        buffer = self._buffer
+        match = regex.match(buffer.text, buffer.pos)
+        if match is None:
+            if self.trace:
+                self._trace_match(token, failed=True)
             self._error(token, etype=FailedToken)
-        self._trace_match(token)
+        buffer.goto(match.end())
+        if self.trace:
+            self._trace_match(token)
+        if self.handler is not None:
+            self._add_event('token', token, match.start(), match.end())
         self._add_cst_node(token)
         self._last_node = token
         return token
 
+    def _token_choice(self, tokens, message='no available options'):
+        """ Parse the first of ``tokens`` that matches, as a choice of
+            ``_token()`` calls would, but with a single regex match.
+        """
+        self._next_token()
+        match = self._token_choice_re(tokens).match(self._buffer.text, self._pos)
+        if match is None:
+            if self.trace:
+                for token in tokens:
+                    self._trace_match(token, failed=True)
+            self._error(message)
+        token = tokens[match.lastindex - 1]
+        self._buffer.move(len(token))
+        if self.trace:
+            self._trace_match(token)
+        if self.handler is not None:
+            self._add_event('token', token, self._pos - len(token), self._pos)
+        self._add_cst_node(token)
+        self._last_node = token
+        return token
+
+    def _token_choice_re(self, tokens):
+        buffer = self._buffer
+        key = (tokens, buffer.ignorecase, buffer.nameguard, buffer.namechars)
+        regex = self._token_choice_cache.get(key)
+        if regex is not None:
+            return regex
+
+        options = [
+            '(%s)' % token_regex(token, buffer.nameguard, buffer.namechars)
+            for token in tokens
+        ]
+
+        flags = RE_FLAGS | (re.IGNORECASE if buffer.ignorecase else 0)
+        regex = re.compile('|'.join(options), flags)
+        self._token_choice_cache[key] = regex
+        return regex
+
     def _constant(self, literal):
         self._next_token()
-        self._trace_match(literal)
+        if self.trace:
+            self._trace_match(literal)
+        if self.handler is not None:
+            self._add_event('token', literal, self._pos, self._pos)
         self._add_cst_node(literal)
         self._last_node = literal
         return literal
 
     def _pattern(self, pattern):
-        token = self._buffer.matchre(pattern)
+        if self.lazy_tokens and self.handler is None:
+            token = self._buffer.matchspan(pattern)
+        else:
+            token = self._buffer.matchre(pattern)
         if token is None:
-            self._trace_match('', pattern, failed=True)
+            if self.trace:
+                self._trace_match('', pattern, failed=True)
             self._error(pattern, etype=FailedPattern)
-        self._trace_match(token, pattern)
+        if self.intern_tokens and not isinstance(token, TokenSpan):
+            token = self._intern(token)
+        if self.trace:
+            self._trace_match(token, pattern)
+        if self.handler is not None:
+            self._add_event('token', token, self._pos - len(token), self._pos)
+        self._add_cst_node(token)
+        self._last_node = token
+        return token
+
+    def _pattern_re(self, regex):
+        """ Parse a pattern compiled by the parser generator.
+        """
+        if not self._terminals_ok or self.lazy_tokens:
+            return self._pattern(regex.pattern)
+        buffer = self._buffer
+        match = regex.match(buffer.text, buffer.pos)
+        if match is None:
+            if self.trace:
+                self._trace_match('', regex.pattern, failed=True)
+            self._error(regex.pattern, etype=FailedPattern)
+        token = match.group()
+        buffer.goto(match.end())
+        if self.intern_tokens:
+            token = self._intern(token)
+        if self.trace:
+            self._trace_match(token, regex.pattern)
+        if self.handler is not None:
+            self._add_event('token', token, match.start(), match.end())
         self._add_cst_node(token)
         self._last_node = token
         return token
 
+    def _pattern_choice(self, pattern, message='no available options'):
+        """ Parse a choice of patterns collapsed into ``pattern``, failing
+            with the message of the choice.
+        """
+        try:
+            return self._pattern(pattern)
+        except FailedPattern:
+            self._error(message)
+
+    def _pattern_choice_re(self, regex, message='no available options'):
+        """ Parse a choice of patterns collapsed into a regex compiled by
+            the parser generator.
+        """
+        try:
+            return self._pattern_re(regex)
+        except FailedPattern:
+            self._error(message)
+
     def _eof(self):
         return self._buffer.atend()
 
@@ -670,6 +1117,61 @@ class ParseContext(object):
         except FailedParse as e:
             if self._is_cut_set():
                 raise FailedCut(e)
+            if self.handler is not None:
+                self._drop_frame_events()
+        finally:
+            self._pop_cut()
+
+    @contextmanager
+    def _predicted_option(self, message):
+        # the option selected by _predict() is the only one that may
+        # match, so it's parsed in the frame of the choice
+        self._enter_predicted()
+        try:
+            yield
+        except Exception as e:
+            self._undo_predicted(e, message)
+        else:
+            self._commit_predicted()
+
+    @contextmanager
+    def _factored(self):
+        # a choice that adds the CST of its options to the current frame
+        try:
+            yield
+        except OptionSucceeded:
+            pass
+
+    @contextmanager
+    def _factored_option(self):
+        p = self._pos
+        s = self._state
+        ast = self.ast
+        cst = self.cst
+        mark = len(cst) if is_list(cst) else None
+
+        self.last_node = None
+        self._push_cut()
+        try:
+            self.ast = ast.copy()
+            try:
+                yield
+            except Exception:
+                self._goto(p)
+                self._state = s
+                self.ast = ast
+                self.cst = cst
+                if mark is not None:
+                    del cst[mark:]
+                raise
+            raise OptionSucceeded()
+        except FailedCut:
+            raise
+        except FailedParse as e:
+            if self._is_cut_set():
+                raise FailedCut(e)
+            if self.handler is not None:
+                self._drop_frame_events()
         finally:
             self._pop_cut()
 
@@ -704,6 +1206,7 @@ class ParseContext(object):
     def _if(self):
         p = self._pos
         s = self._state
+        mark = len(self._events)
         self._push_ast()
         self._enter_lookahead()
         try:
@@ -713,6 +1216,7 @@ class ParseContext(object):
             self._goto(p)
             self._state = s
             self._pop_ast()  # simply discard
+            del self._events[mark:]
 
     @contextmanager
     def _ifnot(self):
@@ -724,6 +1228,156 @@ class ParseContext(object):
         else:
             self._error('', etype=FailedLookahead)
 
+    # The methods below enter and leave the same frames as the context
+    # managers above, without the generators. Parsers generated in flat
+    # mode call them from straight-line try/except code.
+
+    def _enter_frame(self):
+        self._frame_stack.append((self._pos, self._state))
+        ast_copy = self.ast.copy()
+        self._push_ast()
+        self.last_node = None
+        self.ast = ast_copy
+
+    def _commit_frame(self):
+        self._frame_stack.pop()
+        ast = self.ast
+        cst = self.cst
+        self._pop_ast()
+        self.ast = ast
+        self._extend_cst(cst)
+        self.last_node = cst
+
+    def _undo_frame(self):
+        p, s = self._frame_stack.pop()
+        self._goto(p)
+        self._state = s
+        self._pop_ast()
+
+    def _enter_choice(self):
+        self.last_node = None
+        self._enter_frame()
+        self._choice_stack.append(False)
+
+    def _choice_pending(self):
+        """ Tell if no option of the innermost choice has succeeded.
+        """
+        return not self._choice_stack[-1]
+
+    def _check_choice(self, message):
+        if not self._choice_stack[-1]:
+            self._error(message)
+
+    def _commit_choice(self):
+        self._choice_stack.pop()
+        self._commit_frame()
+
+    def _undo_choice(self):
+        self._choice_stack.pop()
+        self._undo_frame()
+
+    def _enter_option(self):
+        self.last_node = None
+        self._push_cut()
+        self._enter_frame()
+
+    def _commit_option(self):
+        self._commit_frame()
+        self._pop_cut()
+        self._choice_stack[-1] = True
+
+    def _undo_option(self, e):
+        """ Leave a failed option. Raise ``e`` again unless it's a
+            ``FailedParse`` that lets the next option be tried.
+        """
+        self._undo_frame()
+        try:
+            if not isinstance(e, FailedParse) or isinstance(e, FailedCut):
+                raise e
+            if self._is_cut_set():
+                raise FailedCut(e)
+            if self.handler is not None:
+                self._drop_frame_events()
+        finally:
+            self._pop_cut()
+
+    def _enter_predicted(self):
+        self.last_node = None
+        self._push_cut()
+        self._frame_stack.append((self._pos, self._state))
+
+    def _commit_predicted(self):
+        self._frame_stack.pop()
+        self._pop_cut()
+
+    def _undo_predicted(self, e, message):
+        """ Leave a failed predicted option. Because no other option of
+            the choice could match, raise the error of the choice unless
+            ``e`` must be raised again.
+        """
+        p, s = self._frame_stack.pop()
+        self._goto(p)
+        self._state = s
+        try:
+            if not isinstance(e, FailedParse) or isinstance(e, FailedCut):
+                raise e
+            if self._is_cut_set():
+                raise FailedCut(e)
+            if self.handler is not None:
+                self._drop_frame_events()
+        finally:
+            self._pop_cut()
+        self._error(message)
+
+    def _enter_optional(self):
+        self._enter_choice()
+        self._enter_option()
+
+    def _commit_optional(self):
+        self._commit_option()
+        self._commit_choice()
+
+    def _undo_optional(self, e):
+        try:
+            self._undo_option(e)
+        except Exception:
+            self._undo_choice()
+            raise
+        self._commit_choice()
+
+    def _enter_group(self):
+        self._push_cst()
+
+    def _commit_group(self):
+        cst = self._pop_cst()
+        self._extend_cst(cst)
+        self.last_node = cst
+
+    def _undo_group(self):
+        self._pop_cst()
+
+    def _enter_if(self):
+        self._frame_stack.append((self._pos, self._state, len(self._events)))
+        self._push_ast()
+        self._enter_lookahead()
+
+    def _leave_if(self):
+        p, s, mark = self._frame_stack.pop()
+        self._leave_lookahead()
+        self._goto(p)
+        self._state = s
+        self._pop_ast()  # simply discard
+        del self._events[mark:]
+
+    def _leave_ifnot(self, e=None):
+        """ Leave a negative lookahead, which failed if ``e`` is None.
+        """
+        self._leave_if()
+        if e is None:
+            self._error('', etype=FailedLookahead)
+        elif not isinstance(e, FailedParse):
+            raise e
+
     def _isolate(self, block):
         self._push_cst()
         try:
@@ -733,8 +1387,10 @@ class ParseContext(object):
         finally:
             self._pop_cst()
 
-    def _repeater(self, block, prefix=None, omitprefix=False):
+    def _repeater(self, block, prefix=None, omitprefix=False, guard=None):
         while True:
+            if guard is not None and not self._guard(*guard):
+                break
             self._push_cut()
             try:
                 p = self._pos
@@ -755,19 +1411,27 @@ class ParseContext(object):
             except FailedParse as e:
                 if self._is_cut_set():
                     raise FailedCut(e)
+                if self.handler is not None:
+                    self._drop_frame_events()
                 break
             finally:
                 self._pop_cut()
 
-    def _closure(self, block, sep=None, omitsep=False):
+    def _closure(self, block, sep=None, omitsep=False, guard=None):
+        if sep is not None:
+            guard = None
         self._push_cst()
         try:
             self.cst = []
-            with self._optional():
-                with self._try():
-                    block()
-                self.cst = [self.cst]
-                self._repeater(block, prefix=sep, omitprefix=omitsep)
+            if guard is None or self._guard(*guard):
+                with self._optional():
+                    with self._try():
+                        block()
+                    self.cst = [self.cst]
+                    if self.handler is not None:
+                        # the repeater never fails back into the optional
+                        self._commit_event_frame()
+                    self._repeater(block, prefix=sep, omitprefix=omitsep, guard=guard)
             cst = Closure(self.cst)
         finally:
             self._pop_cst()
@@ -775,14 +1439,16 @@ class ParseContext(object):
         self.last_node = cst
         return cst
 
-    def _positive_closure(self, block, sep=None, omitsep=False):
+    def _positive_closure(self, block, sep=None, omitsep=False, guard=None):
+        if sep is not None:
+            guard = None
         self._push_cst()
         try:
             self.cst = None
             with self._try():
                 block()
             self.cst = [self.cst]
-            self._repeater(block, prefix=sep, omitprefix=omitsep)
+            self._repeater(block, prefix=sep, omitprefix=omitsep, guard=guard)
             cst = Closure(self.cst)
         finally:
             self._pop_cst()
@@ -819,7 +1485,13 @@ class ParseContext(object):
         return self.cst
 
     def _check_name(self):
-        name = ustr(self.last_node)
+        node = self.last_node
+        if node is None:
+            return
+        if isinstance(node, RuleRef):
+            # in event mode, check the text the rule matched
+            node = self._buffer.text[node.pos:node.endpos]
+        name = ustr(node)
         if self.ignorecase or self._buffer.ignorecase:
             name = name.upper()
         if name in self.keywords:
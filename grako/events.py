@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2017      by Juancarlo Añez
+# Copyright (C) 2012-2016 by Juancarlo Añez and Thomas Bragg
+"""
+Event-driven (SAX-style) output for parsers.
+
+When a parse is given a ``handler``, the ``ParseContext`` doesn't build
+a tree of ``AST`` and ``Closure`` structures. Rule entry and exit, token
+matches, and named-element assignments are delivered to the handler in
+document order instead, and the result of each rule is a ``RuleRef``.
+
+Events produced by alternatives that are later backtracked are never
+delivered. Events are held back only while a backtrack point that could
+discard them is open, so inputs made of repeated top-level elements are
+streamed to the handler one element at a time.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from collections import namedtuple
+
+__all__ = ['EventHandler', 'EventRecord', 'RuleRef']
+
+
+class RuleRef(namedtuple('_RuleRefBase', ['name', 'pos', 'endpos'])):
+    """ Stands for the result of a rule in event mode.
+    """
+    __slots__ = ()
+
+
+class EventHandler(object):
+    """ Base class for receivers of parse events. All methods are no-ops.
+    """
+    def start_rule(self, name, pos):
+        pass
+
+    def end_rule(self, name, pos, endpos):
+        pass
+
+    def token(self, token, pos, endpos):
+        pass
+
+    def rule_value(self, name, value):
+        """ Delivered right before ``end_rule()`` with the value the rule
+            would have returned without a handler, before semantic actions,
+            and with the results of nested rules replaced by ``RuleRef``.
+        """
+        pass
+
+    def name(self, name, value, aslist=False):
+        """ The element whose events were delivered last was assigned to
+            ``name``. ``value`` is the value of the element as it would have
+            been stored in the ``AST``, with the results of nested rules
+            replaced by ``RuleRef``, because their contents were already
+            delivered as events.
+        """
+        pass
+
+
+class EventRecord(list):
+    """ The events of a rule parsed while a backtrack point was open,
+        kept so they can be replayed when the rule's memo is reused.
+    """
+    pass
+
+
+def deliver(handler, events):
+    for event in events:
+        if isinstance(event, EventRecord):
+            deliver(handler, event)
+        else:
+            getattr(handler, event[0])(*event[1:])
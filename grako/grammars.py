@@ -5,8 +5,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 import os
 import functools
-from collections import defaultdict, Mapping
-from copy import copy
+from collections import defaultdict, deque, Mapping
 
 from grako.util import indent, trim, ustr, urepr, strtype, compress_seq, chunks
 from grako.util import re, RE_FLAGS
@@ -15,18 +14,41 @@ from grako.ast import AST
 from grako.contexts import ParseContext
 from grako.objectmodel import Node
 from grako.bootstrap import EBNFBootstrapBuffer
+from grako.startchars import StartChars, NULLABLE, SKIPPING, prediction, regex_start_chars, token_start_chars
 
 
 PEP8_LLEN = 72
 
+# the largest node count of rules inlined into their callers
+INLINE_THRESHOLD = 8
+
 
 COMMENTS_RE = r'\(\*((?:.|\n)*?)\*\)'
 EOL_COMMENTS_RE = r'#([^\n]*?)$'
 PRAGMA_RE = r'^\s*#[a-z]+'
 
+# patterns that can't be embedded in a larger regex: backreferences,
+# named groups, conditionals, and global inline flags
+NONCOMPOSABLE_RE = re.compile(r'\\[1-9]|\(\?P[<=]|\(\?\(|\(\?[aiLmsux]+\)')
+
 
 def dot(x, y, k):
-    return set([(a + b)[:k] for a in x for b in y])
+    if not y:
+        return set()
+    # prefixes that are already k long are not extended
+    result = set(a for a in x if len(a) >= k)
+    result.update((a + b)[:k] for a in x if len(a) < k for b in y)
+    return result
+
+
+def walk(model):
+    """ The models in the tree rooted at ``model``.
+    """
+    stack = [model]
+    while stack:
+        model = stack.pop()
+        yield model
+        stack.extend(c for c in model.children() if isinstance(c, Model))
 
 
 def pythonize_name(name):
@@ -77,6 +99,7 @@ class ModelContext(ParseContext):
             **kwargs
         )
         self.rules = {rule.name: rule for rule in rules}
+        self.compiled_rules = CompiledRules(self)
 
     @property
     def pos(self):
@@ -87,7 +110,46 @@ class ModelContext(ParseContext):
         return self._buffer
 
     def _find_rule(self, name):
-        return functools.partial(self.rules[name].parse, self)
+        return self.compiled_rules[name]
+
+
+class ModelParser(ModelContext):
+    """ A reusable parser for a grammar model. See Grammar.prepare().
+    """
+    def __init__(self, grammar, start=None, **kwargs):
+        super(ModelParser, self).__init__(
+            grammar.rules,
+            keywords=grammar.keywords,
+            **kwargs
+        )
+        self.start = start if start is not None else grammar.rules[0].name
+
+    def parse(self, text, rule_name=None, start=None, **kwargs):
+        start = start if start is not None else rule_name
+        start = start if start is not None else self.start
+        return super(ModelParser, self).parse(text, rule_name=start, **kwargs)
+
+
+def _define_rule_value(ctx, keys, list_keys):
+    # in event mode the result of a rule is a RuleRef, so the names
+    # are defined on the rule value delivered to the handler, after
+    # its parseinfo as on the result of a rule
+    if ctx.handler is not None:
+        ctx._rule_defines = (keys, list_keys)
+
+
+class CompiledRules(dict):
+    """ The rules of a ModelContext compiled into closures bound to the
+        context. Rules are compiled the first time they are called.
+    """
+    def __init__(self, ctx):
+        super(CompiledRules, self).__init__()
+        self.ctx = ctx
+
+    def __missing__(self, name):
+        rule = self.ctx.rules[name]
+        compiled = self[name] = rule._compile(self.ctx, self)
+        return compiled
 
 
 class Model(Node):
@@ -103,11 +165,19 @@ class Model(Node):
         self._lookahead = None
         self._first_set = None
         self._follow_set = set()
+        self._guard = None
+        self._collapsed = None
 
     def parse(self, ctx):
         ctx.last_node = None
         return None
 
+    def _compile(self, ctx, rules):
+        """ Return a closure that parses this model in ``ctx``.
+            ``rules`` maps rule names to their compiled closures.
+        """
+        return functools.partial(self.parse, ctx)
+
     def defines(self):
         return []
 
@@ -136,6 +206,32 @@ class Model(Node):
     def _follow(self, k, fl, a):
         return a
 
+    def _start_chars(self, rules, skip, memo):
+        """ The StartChars of this model, or None if unknown. ``skip``
+            tells if whitespace will have been skipped before the model
+            is parsed.
+        """
+        return None
+
+    def _regex(self):
+        """ A regex that matches what this model matches, and produces
+            the same single string, or None.
+        """
+        return None
+
+    @property
+    def collapsed(self):
+        """ The single pattern that replaces this model, or None.
+        """
+        return getattr(self, '_collapsed', None)
+
+    @property
+    def guard(self):
+        """ The ``(raw, ws)`` guard patterns of this model, or None.
+            See ``ParseContext._guard()``.
+        """
+        return getattr(self, '_guard', None)
+
     def comments_str(self):
         comments, eol = self.comments
         if not comments:
@@ -166,11 +262,22 @@ class Model(Node):
 
 
 class Void(Model):
+    def _compile(self, ctx, rules):
+        def parse():
+            ctx.last_node = None
+        return parse
+
+    def _start_chars(self, rules, skip, memo):
+        return NULLABLE
+
     def _to_str(self, lean=False):
         return '()'
 
 
 class Fail(Model):
+    def _start_chars(self, rules, skip, memo):
+        return StartChars(frozenset(), frozenset(), False)
+
     def _to_str(self, lean=False):
         return '!()'
 
@@ -194,6 +301,12 @@ class EOF(Model):
         if not ctx.buf.atend():
             ctx._error('Expecting end of text.')
 
+    def _compile(self, ctx, rules):
+        return functools.partial(self.parse, ctx)
+
+    def _start_chars(self, rules, skip, memo):
+        return SKIPPING
+
     def _to_str(self, lean=False):
         return '$'
 
@@ -212,6 +325,12 @@ class Decorator(Model):
     def parse(self, ctx):
         return self.exp.parse(ctx)
 
+    def _compile(self, ctx, rules):
+        return self.exp._compile(ctx, rules)
+
+    def _start_chars(self, rules, skip, memo):
+        return self.exp._start_chars(rules, skip, memo)
+
     def defines(self):
         return self.exp.defines()
 
@@ -241,6 +360,18 @@ class Group(Decorator):
             self.exp.parse(ctx)
             return ctx.last_node
 
+    def _compile(self, ctx, rules):
+        exp = self.exp._compile(ctx, rules)
+
+        def parse():
+            with ctx._group():
+                exp()
+                return ctx.last_node
+        return parse
+
+    def _regex(self):
+        return self.exp._regex()
+
     def _to_str(self, lean=False):
         exp = self.exp._to_ustr(lean=lean)
         if len(exp.splitlines()) > 1:
@@ -257,9 +388,19 @@ class Token(Model):
     def parse(self, ctx):
         return ctx._token(self.token)
 
+    def _compile(self, ctx, rules):
+        token = self.token
+
+        def parse():
+            return ctx._token(token)
+        return parse
+
     def _first(self, k, f):
         return set([(self.token,)])
 
+    def _start_chars(self, rules, skip, memo):
+        return token_start_chars(self.token)
+
     def _to_str(self, lean=False):
         return urepr(self.token)
 
@@ -272,6 +413,16 @@ class Constant(Model):
     def parse(self, ctx):
         return self.literal
 
+    def _compile(self, ctx, rules):
+        literal = self.literal
+
+        def parse():
+            return literal
+        return parse
+
+    def _start_chars(self, rules, skip, memo):
+        return SKIPPING
+
     def _to_str(self, lean=False):
         return '`%s`' % urepr(self.literal)
 
@@ -291,9 +442,29 @@ class Pattern(Model):
     def parse(self, ctx):
         return ctx._pattern(self.pattern)
 
+    def _compile(self, ctx, rules):
+        pattern = self.pattern
+
+        def parse():
+            return ctx._pattern(pattern)
+        return parse
+
     def _first(self, k, f):
         return set([(self.pattern,)])
 
+    def _regex(self):
+        if NONCOMPOSABLE_RE.search(self.pattern):
+            return None
+        return '(?:%s)' % self.pattern
+
+    def _start_chars(self, rules, skip, memo):
+        start = regex_start_chars(self.pattern)
+        if start is None:
+            return None
+        items, nullable = start
+        result = StartChars(items, frozenset(), nullable)
+        return result.skipped() if skip else result
+
     def _to_str(self, lean=False):
         parts = []
         for pat in (ustr(p) for p in self.patterns):
@@ -310,6 +481,17 @@ class Lookahead(Decorator):
         with ctx._if():
             super(Lookahead, self).parse(ctx)
 
+    def _compile(self, ctx, rules):
+        exp = self.exp._compile(ctx, rules)
+
+        def parse():
+            with ctx._if():
+                exp()
+        return parse
+
+    def _start_chars(self, rules, skip, memo):
+        return NULLABLE
+
     def _to_str(self, lean=False):
         return '&' + self.exp._to_ustr(lean=lean)
 
@@ -322,6 +504,20 @@ class NegativeLookahead(Decorator):
         with ctx._ifnot():
             super(NegativeLookahead, self).parse(ctx)
 
+    def _compile(self, ctx, rules):
+        exp = self.exp._compile(ctx, rules)
+
+        guard = self.exp.guard
+
+        def parse():
+            if guard is None or ctx._guard(*guard):
+                with ctx._ifnot():
+                    exp()
+        return parse
+
+    def _start_chars(self, rules, skip, memo):
+        return NULLABLE
+
 
 class Sequence(Model):
     def __init__(self, ast, **kwargs):
@@ -332,6 +528,14 @@ class Sequence(Model):
         ctx.last_node = [s.parse(ctx) for s in self.sequence]
         return ctx.last_node
 
+    def _compile(self, ctx, rules):
+        sequence = [s._compile(ctx, rules) for s in self.sequence]
+
+        def parse():
+            ctx.last_node = [s() for s in sequence]
+            return ctx.last_node
+        return parse
+
     def defines(self):
         return [d for s in self.sequence for d in s.defines()]
 
@@ -344,6 +548,14 @@ class Sequence(Model):
             result = dot(result, s._first(k, f), k)
         return result
 
+    def _start_chars(self, rules, skip, memo):
+        result = NULLABLE
+        for s in self.sequence:
+            result = result.then(s._start_chars(rules, skip, memo))
+            if result is None or not result.nullable:
+                break
+        return result
+
     def _follow(self, k, fl, a):
         fs = a
         for x in reversed(self.sequence):
@@ -378,10 +590,80 @@ class Choice(Model):
                     ctx.last_node = o.parse(ctx)
                     return ctx.last_node
 
-            lookahead = ' '.join(ustr(urepr(f[0])) for f in self.lookahead if str(f))
-            if lookahead:
-                ctx._error('expecting one of {%s}' % lookahead)
-            ctx._error('no available options')
+            ctx._error(self._error_message())
+
+    def _error_message(self):
+        lookahead = ' '.join(ustr(urepr(f[0])) for f in self.lookahead if str(f))
+        if lookahead:
+            return 'expecting one of {%s}' % lookahead
+        return 'no available options'
+
+    @property
+    def tokens(self):
+        """ The tokens of the options if they are all plain tokens,
+            or None.
+        """
+        if len(self.options) < 2:
+            return None
+        if not all(isinstance(o, Token) and o.token for o in self.options):
+            return None
+        return tuple(o.token for o in self.options)
+
+    @property
+    def prediction(self):
+        """ The table that selects the only option that may match from
+            the next character, or None. See ``startchars.prediction()``.
+        """
+        return getattr(self, '_prediction', None)
+
+    def _compile(self, ctx, rules):
+        message = self._error_message()
+        tokens = self.tokens
+        if tokens is not None:
+            return functools.partial(ctx._token_choice, tokens, message)
+
+        if self.collapsed is not None:
+            return functools.partial(ctx._pattern_choice, self.collapsed, message)
+
+        options = [(o._compile(ctx, rules), o.guard) for o in self.options]
+
+        predict = self.prediction
+        if predict is not None:
+            def parse():
+                with ctx._choice():
+                    i = ctx._predict(predict)
+                    if i is None:
+                        ctx._error(message)
+                    with ctx._predicted_option(message):
+                        ctx.last_node = options[i][0]()
+                        return ctx.last_node
+            return parse
+
+        def parse():
+            with ctx._choice():
+                for o, guard in options:
+                    if guard is not None and not ctx._guard(*guard):
+                        continue
+                    with ctx._option():
+                        ctx.last_node = o()
+                        return ctx.last_node
+                ctx._error(message)
+        return parse
+
+    def _regex(self):
+        # regex alternation is ordered like a PEG choice
+        regexes = [o._regex() for o in self.options]
+        if None in regexes:
+            return None
+        return '(?:%s)' % '|'.join(regexes)
+
+    def _start_chars(self, rules, skip, memo):
+        result = StartChars(frozenset(), frozenset(), False)
+        for o in self.options:
+            result = result.union(o._start_chars(rules, skip, memo))
+            if result is None:
+                break
+        return result
 
     def defines(self):
         return [d for o in self.options for d in o.defines()]
@@ -403,8 +685,22 @@ class Choice(Model):
     def nodecount(self):
         return 1 + sum(o.nodecount() for o in self.options)
 
+    @property
+    def is_factored(self):
+        return getattr(self, '_unfactored', None) is not None
+
+    def left_factor(self):
+        """ Factor the expressions shared by consecutive options out of
+            the options. See ``Factored``.
+        """
+        options = Factored.factor(self.options)
+        if len(options) < len(self.options):
+            self._unfactored = self.options
+            self.options = options
+
     def _to_str(self, lean=False):
-        options = [ustr(o._to_str(lean=lean)) for o in self.options]
+        options = getattr(self, '_unfactored', None) or self.options
+        options = [ustr(o._to_str(lean=lean)) for o in options]
 
         multi = any(len(o.splitlines()) > 1 for o in options)
         single = ' | '.join(o for o in options)
@@ -417,10 +713,143 @@ class Choice(Model):
             return single
 
 
+class Factored(Model):
+    """ Consecutive options of a ``Choice`` that start with the same
+        expressions. The shared ``prefix`` is parsed once, and then the
+        ``suffixes`` are tried in order within the CST frame of the
+        prefix, so the results are those of the original ``options``.
+    """
+    def __init__(self, prefix, suffixes, options, **kwargs):
+        super(Factored, self).__init__(
+            ast=AST(prefix=prefix, suffixes=suffixes, options=options)
+        )
+
+    @staticmethod
+    def _elements(option):
+        if isinstance(option, Sequence):
+            return list(option.sequence)
+        return [option]
+
+    @staticmethod
+    def _key(model):
+        # after a cut the remaining options must not be tried
+        if any(isinstance(m, Cut) for m in walk(model)):
+            return None
+        return (type(model), model._to_str())
+
+    @staticmethod
+    def factor(options):
+        """ Replace the runs of options that share a prefix in ``options``
+            with ``Factored`` models.
+        """
+        result = []
+        keys = [Factored._key(Factored._elements(o)[0]) for o in options]
+        i = 0
+        while i < len(options):
+            j = i + 1
+            while keys[i] is not None and j < len(options) and keys[j] == keys[i]:
+                j += 1
+            if j - i < 2:
+                result.append(options[i])
+                i += 1
+                continue
+
+            group = [Factored._elements(o) for o in options[i:j]]
+            n = 1
+            while all(
+                    len(e) > n and Factored._key(e[n]) is not None and
+                    Factored._key(e[n]) == Factored._key(group[0][n])
+                    for e in group):
+                n += 1
+
+            suffixes = []
+            for elements in group:
+                tail = elements[n:]
+                if not tail:
+                    # an empty suffix always succeeds
+                    suffixes.append(Void())
+                    break
+                elif len(tail) == 1:
+                    suffixes.append(tail[0])
+                else:
+                    suffixes.append(Sequence(AST(sequence=tail)))
+
+            result.append(Factored(group[0][:n], Factored.factor(suffixes), options[i:j]))
+            i = j
+        return result
+
+    def parse(self, ctx):
+        for p in self.prefix:
+            p.parse(ctx)
+        with ctx._factored():
+            for s in self.suffixes:
+                with ctx._factored_option():
+                    s.parse(ctx)
+            ctx._error('no available options')
+
+    def _compile(self, ctx, rules):
+        prefix = [p._compile(ctx, rules) for p in self.prefix]
+        suffixes = [s._compile(ctx, rules) for s in self.suffixes]
+
+        def parse():
+            for p in prefix:
+                p()
+            with ctx._factored():
+                for s in suffixes:
+                    with ctx._factored_option():
+                        s()
+                ctx._error('no available options')
+        return parse
+
+    def _start_chars(self, rules, skip, memo):
+        result = StartChars(frozenset(), frozenset(), False)
+        for o in self.options:
+            result = result.union(o._start_chars(rules, skip, memo))
+            if result is None:
+                break
+        return result
+
+    def defines(self):
+        return [d for o in self.options for d in o.defines()]
+
+    def _missing_rules(self, rules):
+        return set().union(*[o._missing_rules(rules) for o in self.options])
+
+    def _first(self, k, f):
+        result = set()
+        for o in self.options:
+            result |= o._first(k, f)
+        return result
+
+    def _follow(self, k, fl, a):
+        for o in self.options:
+            o._follow(k, fl, a)
+        return a
+
+    def nodecount(self):
+        return 1 + sum(m.nodecount() for m in self.prefix + self.suffixes)
+
+    def _to_str(self, lean=False):
+        return ' | '.join(ustr(o._to_str(lean=lean)) for o in self.options)
+
+
 class Closure(Decorator):
     def parse(self, ctx):
         return ctx._closure(lambda: self.exp.parse(ctx))
 
+    def _compile(self, ctx, rules):
+        exp = self.exp._compile(ctx, rules)
+
+        guard = self.exp.guard
+
+        def parse():
+            return ctx._closure(exp, guard=guard)
+        return parse
+
+    def _start_chars(self, rules, skip, memo):
+        start = self.exp._start_chars(rules, skip, memo)
+        return start.optional() if start is not None else None
+
     def _first(self, k, f):
         efirst = self.exp._first(k, f)
         result = {()}
@@ -440,6 +869,18 @@ class PositiveClosure(Closure):
     def parse(self, ctx):
         return ctx._positive_closure(lambda: self.exp.parse(ctx))
 
+    def _compile(self, ctx, rules):
+        exp = self.exp._compile(ctx, rules)
+
+        guard = self.exp.guard
+
+        def parse():
+            return ctx._positive_closure(exp, guard=guard)
+        return parse
+
+    def _start_chars(self, rules, skip, memo):
+        return self.exp._start_chars(rules, skip, memo)
+
     def _first(self, k, f):
         efirst = self.exp._first(k, f)
         result = {()}
@@ -467,6 +908,18 @@ class Join(Decorator):
 
         return self._do_parse(ctx, exp, sep)
 
+    def _compile(self, ctx, rules):
+        exp = self.exp._compile(ctx, rules)
+        sep = self.sep._compile(ctx, rules)
+
+        def parse():
+            return self._do_parse(ctx, exp, sep)
+        return parse
+
+    def _start_chars(self, rules, skip, memo):
+        start = self.exp._start_chars(rules, skip, memo)
+        return start.optional() if start is not None else None
+
     def _do_parse(self, ctx, exp, sep):
         return ctx._join(exp, sep)
 
@@ -483,6 +936,9 @@ class PositiveJoin(Join):
     def _do_parse(self, ctx, exp, sep):
         return ctx._positive_join(exp, sep)
 
+    def _start_chars(self, rules, skip, memo):
+        return self.exp._start_chars(rules, skip, memo)
+
     def _to_str(self, lean=False):
         return super(PositiveJoin, self)._to_str(lean=lean) + '+'
 
@@ -512,6 +968,9 @@ class PositiveGather(Gather):
     def _do_parse(self, ctx, exp, sep):
         return ctx._positive_gather(exp, sep)
 
+    def _start_chars(self, rules, skip, memo):
+        return self.exp._start_chars(rules, skip, memo)
+
     def _to_str(self, lean=False):
         return super(PositiveGather, self)._to_str(lean=lean) + '+'
 
@@ -520,6 +979,12 @@ class EmptyClosure(Model):
     def parse(self, ctx):
         return ctx._empty_closure()
 
+    def _compile(self, ctx, rules):
+        return ctx._empty_closure
+
+    def _start_chars(self, rules, skip, memo):
+        return NULLABLE
+
     def _to_str(self, lean=False):
         return '{}'
 
@@ -530,6 +995,22 @@ class Optional(Decorator):
         with ctx._optional():
             return self.exp.parse(ctx)
 
+    def _compile(self, ctx, rules):
+        exp = self.exp._compile(ctx, rules)
+
+        guard = self.exp.guard
+
+        def parse():
+            ctx.last_node = None
+            if guard is None or ctx._guard(*guard):
+                with ctx._optional():
+                    return exp()
+        return parse
+
+    def _start_chars(self, rules, skip, memo):
+        start = self.exp._start_chars(rules, skip, memo)
+        return start.optional() if start is not None else None
+
     def _first(self, k, f):
         return {()} | self.exp._first(k, f)
 
@@ -554,6 +1035,11 @@ class Cut(Model):
         ctx._cut()
         return None
 
+    def _compile(self, ctx, rules):
+        def parse():
+            ctx._cut()
+        return parse
+
     def _first(self, k, f):
         return {('~',)}
 
@@ -568,9 +1054,27 @@ class Named(Decorator):
 
     def parse(self, ctx):
         value = self.exp.parse(ctx)
-        ctx.ast[self.name] = value
+        if ctx.handler is not None:
+            ctx.last_node = value
+            ctx.name_last_node(self.name)
+        else:
+            ctx.ast[self.name] = value
         return value
 
+    def _compile(self, ctx, rules):
+        exp = self.exp._compile(ctx, rules)
+        name = self.name
+
+        def parse():
+            value = exp()
+            if ctx.handler is not None:
+                ctx.last_node = value
+                ctx.name_last_node(name)
+            else:
+                ctx.ast[name] = value
+            return value
+        return parse
+
     def defines(self):
         return [(self.name, False)] + super(Named, self).defines()
 
@@ -583,9 +1087,27 @@ class Named(Decorator):
 class NamedList(Named):
     def parse(self, ctx):
         value = self.exp.parse(ctx)
-        ctx.ast.setlist(self.name, value)
+        if ctx.handler is not None:
+            ctx.last_node = value
+            ctx.add_last_node_to_name(self.name)
+        else:
+            ctx.ast.setlist(self.name, value)
         return value
 
+    def _compile(self, ctx, rules):
+        exp = self.exp._compile(ctx, rules)
+        name = self.name
+
+        def parse():
+            value = exp()
+            if ctx.handler is not None:
+                ctx.last_node = value
+                ctx.add_last_node_to_name(name)
+            else:
+                ctx.ast.setlist(name, value)
+            return value
+        return parse
+
     def defines(self):
         return [(self.name, True)] + super(NamedList, self).defines()
 
@@ -632,11 +1154,38 @@ class RuleRef(Model):
         else:
             return rule()
 
+    @property
+    def inlined(self):
+        """ The rule inlined in place of this reference, or None.
+        """
+        return getattr(self, '_inlined', None)
+
+    def _compile(self, ctx, rules):
+        name = self.name
+        if self.inlined is not None:
+            # the rule is compiled once, and its body parsed in place
+            return functools.partial(ctx._inline, name, rules[name].body)
+
+        def parse():
+            try:
+                rule = rules[name]
+            except KeyError:
+                ctx._error(name, etype=FailedRef)
+            else:
+                return rule()
+        return parse
+
     def _missing_rules(self, ruleset):
         if self.name not in ruleset:
             return {self.name}
         return set()
 
+    def _start_chars(self, rules, skip, memo):
+        rule = rules.get(self.name)
+        if rule is None:
+            return None
+        return rule._start_chars(rules, skip, memo)
+
     def _first(self, k, f):
         self._first_set = f.get(self.name, set())
         return self._first_set
@@ -672,6 +1221,7 @@ class Rule(Decorator):
         self._adopt_children([params, kwparams])
 
         self.is_name = 'name' in self.decorators
+        self.no_inline = 'noinline' in self.decorators
         self.base = None
 
     def parse(self, ctx):
@@ -681,15 +1231,46 @@ class Rule(Decorator):
         return result
 
     def _parse_rhs(self, ctx, exp):
-        result = ctx._call(exp.parse, self.name, self.params, self.kwparams)
+        defines = compress_seq(self.defines())
+        keys = [d for d, l in defines if not l]
+        list_keys = [d for d, l in defines if l]
+
+        def rhs(ctx):
+            exp.parse(ctx)
+            _define_rule_value(ctx, keys, list_keys)
+
+        result = ctx._call(rhs, self.name, self.params, self.kwparams)
         if isinstance(result, AST):
-            defines = compress_seq(self.defines())
-            result._define(
-                [d for d, l in defines if not l],
-                [d for d, l in defines if l]
-            )
+            result._define(keys, list_keys)
         return result
 
+    def _compile(self, ctx, rules):
+        return self._compile_rhs(ctx, rules, self.exp, self.is_name)
+
+    def _compile_rhs(self, ctx, rules, exp, is_name=False):
+        exp = exp._compile(ctx, rules)
+        name = self.name
+        params = self.params
+        kwparams = self.kwparams
+
+        defines = compress_seq(self.defines())
+        keys = [d for d, l in defines if not l]
+        list_keys = [d for d, l in defines if l]
+
+        def rhs(ctx):
+            exp()
+            _define_rule_value(ctx, keys, list_keys)
+
+        def parse():
+            result = ctx._call(rhs, name, params, kwparams)
+            if isinstance(result, AST):
+                result._define(keys, list_keys)
+            if is_name:
+                ctx._check_name()
+            return result
+        parse.body = exp
+        return parse
+
     def _first(self, k, f):
         if self._first_set:
             return self._first_set
@@ -698,6 +1279,21 @@ class Rule(Decorator):
     def _follow(self, k, fl, a):
         return self.exp._follow(k, fl, fl[self.name])
 
+    def _start_chars(self, rules, skip, memo):
+        # whitespace is skipped before invoking rules with lowercase names
+        skip = skip or self.name[0].islower()
+        key = (self.name, skip)
+        if key not in memo:
+            memo[key] = None  # unknown while recursing
+            start = self._rhs_start_chars(rules, skip, memo)
+            if start is not None and self.name[0].islower():
+                start = start.skipping()
+            memo[key] = start
+        return memo[key]
+
+    def _rhs_start_chars(self, rules, skip, memo):
+        return self.exp._start_chars(rules, skip, memo)
+
     @staticmethod
     def param_repr(p):
         if isinstance(p, (int, float)):
@@ -742,10 +1338,11 @@ class Rule(Decorator):
             exp=indent(self.exp._to_str(lean=lean)),
             comments=comments,
             is_name='@name\n' if self.is_name else '',
+            no_inline='@noinline\n' if self.no_inline else '',
         )
 
     str_template = '''\
-                {is_name}{comments}{name}{base}{params}
+                {is_name}{no_inline}{comments}{name}{base}{params}
                     =
                 {exp}
                     ;
@@ -770,6 +1367,12 @@ class BasedRule(Rule):
     def parse(self, ctx):
         return self._parse_rhs(ctx, self.rhs)
 
+    def _compile(self, ctx, rules):
+        return self._compile_rhs(ctx, rules, self.rhs)
+
+    def _rhs_start_chars(self, rules, skip, memo):
+        return self.rhs._start_chars(rules, skip, memo)
+
     def defines(self):
         return self.rhs.defines()
 
@@ -835,6 +1438,110 @@ class Grammar(Model):
             raise GrammarError('Unknown rules, no parser generated:' + msg)
 
         self._calc_lookahead_sets()
+        self._calc_guards()
+        self._calc_collapsed()
+        self.inline_threshold = INLINE_THRESHOLD
+
+    @property
+    def inline_threshold(self):
+        """ The largest node count of the rules that are inlined into
+            their callers. Rules decorated with ``@noinline``, and rules
+            that are recursive, have parameters, or define names are never
+            inlined. Use ``0`` to disable inlining.
+        """
+        return self._inline_threshold
+
+    @inline_threshold.setter
+    def inline_threshold(self, value):
+        self._inline_threshold = value
+        self._calc_inlined()
+
+    def _models(self):
+        seen = set()
+        stack = list(reversed(self.rules))
+        while stack:
+            model = stack.pop()
+            if id(model) in seen or not isinstance(model, Model):
+                continue
+            seen.add(id(model))
+            yield model
+            stack.extend(reversed(model.children()))
+
+    def _calc_guards(self):
+        rules = {rule.name: rule for rule in self.rules}
+        memo = {}
+        starts = {}
+        for model in self._models():
+            start = starts[id(model)] = model._start_chars(rules, False, memo)
+            model._guard = start.guard() if start is not None else None
+        for model in self._models():
+            if isinstance(model, Choice) and not model.is_factored:
+                model._prediction = prediction([starts[id(o)] for o in model.options])
+
+    def _calc_inlined(self):
+        rules = {rule.name: rule for rule in self.rules}
+
+        def refs(model):
+            return (m for m in walk(model) if isinstance(m, RuleRef))
+
+        def is_named(rule):
+            # overrides define no names, but replace the AST
+            return any(isinstance(m, Named) for m in walk(rule.exp))
+
+        calls = {rule.name: {r.name for r in refs(rule.exp)} for rule in self.rules}
+
+        def is_recursive(name):
+            seen = set()
+            stack = list(calls[name])
+            while stack:
+                callee = stack.pop()
+                if callee == name:
+                    return True
+                if callee in seen or callee not in calls:
+                    continue
+                seen.add(callee)
+                stack.extend(calls[callee])
+            return False
+
+        inlined = {
+            rule.name for rule in self.rules
+            if type(rule) is Rule and
+            not rule.decorators and
+            not rule.params and
+            not rule.kwparams and
+            not rule.defines() and
+            not is_named(rule) and
+            rule.nodecount() <= self.inline_threshold and
+            not is_recursive(rule.name)
+        }
+        for rule in self.rules:
+            for ref in refs(rule.exp):
+                ref._inlined = rules[ref.name] if ref.name in inlined else None
+
+    def left_factor(self):
+        """ Factor the expressions shared by consecutive options out of
+            every choice in the grammar. Returns the grammar.
+        """
+        for model in list(self._models()):
+            if isinstance(model, Choice):
+                model.left_factor()
+        self._calc_guards()
+        self._calc_collapsed()
+        self._calc_inlined()
+        return self
+
+    def _calc_collapsed(self):
+        for model in self._models():
+            if not isinstance(model, Choice) or model.tokens is not None:
+                continue
+            regex = model._regex()
+            if regex is None:
+                continue
+            try:
+                re.compile(regex, RE_FLAGS)
+            except Exception:
+                continue
+            model._collapsed = regex
 
     def _missing_rules(self, ruleset):
         return set().union(*[rule._missing_rules(ruleset) for rule in self.rules])
@@ -844,31 +1551,128 @@ class Grammar(Model):
         return self._first_sets
 
     def _calc_lookahead_sets(self, k=1):
-        self._calc_first_sets()
-        self._calc_follow_sets()
-
-    def _calc_first_sets(self, k=1):
-        f = defaultdict(set)
-        f1 = None
-        while f1 != f:
-            f1 = copy(f)
-            for rule in self.rules:
-                f[rule.name] |= rule._first(k, f)
+        nodes = {rule.name: list(walk(rule)) for rule in self.rules}
+        refs = {
+            name: {m.name for m in models if isinstance(m, RuleRef)}
+            for name, models in nodes.items()
+        }
+        self._calc_first_sets(k, refs)
+        for models in nodes.values():
+            for model in models:
+                if not isinstance(model, Rule):
+                    model._first_set = model._first(k, self._first_sets)
+        self._calc_follow_sets(k, refs)
+
+    def _calc_first_sets(self, k, refs):
+        rules = {rule.name: rule for rule in self.rules}
+        callers = defaultdict(set)
+        for name, called in refs.items():
+            for ref in called:
+                callers[ref].add(name)
+
+        # the first set of a rule changes only when those of the
+        # rules it references do, so only its callers are revisited.
+        # Grammars are usually written top-down, so the rules are
+        # first visited bottom-up.
+        f = {name: set() for name in rules}
+        pending = deque(reversed([rule.name for rule in self.rules]))
+        queued = set(rules)
+        while pending:
+            name = pending.popleft()
+            queued.discard(name)
+            first = rules[name]._first(k, f)
+            if first <= f[name]:
+                continue
+            f[name] |= first
+            for caller in callers[name] - queued:
+                queued.add(caller)
+                pending.append(caller)
 
         for rule in self.rules:
             rule._first_set = f[rule.name]
+        self._first_sets = f
+
+    def _calc_follow_sets(self, k, refs):
+        rules = {rule.name: rule for rule in self.rules}
 
-    def _calc_follow_sets(self, k=1):
+        # a rule adds to the follow sets of the rules it references,
+        # so those are revisited when their follow sets grow
         fl = defaultdict(set)
-        fl1 = None
-        while fl1 != fl:
-            fl1 = copy(fl)
-            for rule in self.rules:
-                rule._follow(k, fl, set())
+        pending = deque(rules)
+        queued = set(rules)
+        while pending:
+            name = pending.popleft()
+            queued.discard(name)
+            sizes = {ref: len(fl[ref]) for ref in refs[name]}
+            rules[name]._follow(k, fl, set())
+            for ref, size in sizes.items():
+                if len(fl[ref]) > size and ref not in queued and ref in rules:
+                    queued.add(ref)
+                    pending.append(ref)
 
         for rule in self.rules:
             rule._follow_set = fl[rule.name]
 
+    def _parse_options(self,
+                       whitespace=None,
+                       left_recursion=None,
+                       comments_re=None,
+                       eol_comments_re=None,
+                       parseinfo=None):
+        if whitespace is None:
+            whitespace = self.whitespace
+        if whitespace:
+            whitespace = re.compile(whitespace)
+
+        if left_recursion is None:
+            left_recursion = self.left_recursion
+
+        if parseinfo is None:
+            parseinfo = self._use_parseinfo
+
+        if comments_re is None:
+            comments_re = self.comments_re
+
+        if eol_comments_re is None:
+            eol_comments_re = self.eol_comments_re
+
+        return dict(
+            whitespace=whitespace,
+            comments_re=comments_re,
+            eol_comments_re=eol_comments_re,
+            left_recursion=left_recursion,
+            parseinfo=parseinfo,
+        )
+
+    def prepare(self,
+                start=None,
+                semantics=None,
+                trace=False,
+                whitespace=None,
+                left_recursion=None,
+                comments_re=None,
+                eol_comments_re=None,
+                parseinfo=None,
+                **kwargs):
+        """ Return a ModelParser for parsing many inputs with this grammar
+            and the given options, which are resolved only once.
+        """
+        options = self._parse_options(
+            whitespace=whitespace,
+            left_recursion=left_recursion,
+            comments_re=comments_re,
+            eol_comments_re=eol_comments_re,
+            parseinfo=parseinfo,
+        )
+        options.update(kwargs)
+        return ModelParser(
+            self,
+            start=start,
+            semantics=semantics,
+            trace=trace,
+            **options
+        )
+
     def parse(self,
               text,
               rule_name=None,
@@ -892,22 +1696,14 @@ class Grammar(Model):
             keywords=self.keywords,
             **kwargs)
 
-        if whitespace is None:
-            whitespace = self.whitespace
-        if whitespace:
-            whitespace = re.compile(whitespace)
-
-        if left_recursion is None:
-            left_recursion = self.left_recursion
-
-        if parseinfo is None:
-            parseinfo = self._use_parseinfo
-
-        if comments_re is None:
-            comments_re = self.comments_re
-
-        if eol_comments_re is None:
-            eol_comments_re = self.eol_comments_re
+        options = self._parse_options(
+            whitespace=whitespace,
+            left_recursion=left_recursion,
+            comments_re=comments_re,
+            eol_comments_re=eol_comments_re,
+            parseinfo=parseinfo,
+        )
+        options.update(kwargs)
 
         return ctx.parse(
             text,
@@ -915,12 +1711,7 @@ class Grammar(Model):
             filename=filename,
             semantics=semantics,
             trace=trace,
-            whitespace=whitespace,
-            comments_re=comments_re,
-            eol_comments_re=eol_comments_re,
-            left_recursion=left_recursion,
-            parseinfo=parseinfo,
-            **kwargs
+            **options
         )
 
     def nodecount(self):
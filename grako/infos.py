@@ -60,8 +60,50 @@ _ParseInfo = namedtuple(
 
 
 class ParseInfo(_ParseInfo):
+    """ Where a rule matched. Unless they are given, ``line`` and
+        ``endline`` are computed from the buffer when they are accessed,
+        by name, by index, or by unpacking.
+    """
     __slots__ = ()
 
+    def __new__(cls, buffer, rule, pos, endpos, line=None, endline=None):
+        return super(ParseInfo, cls).__new__(cls, buffer, rule, pos, endpos, line, endline)
+
+    @property
+    def line(self):
+        line = tuple.__getitem__(self, 4)
+        if line is None:
+            line = self.buffer.posline(self.pos)
+        return line
+
+    @property
+    def endline(self):
+        endline = tuple.__getitem__(self, 5)
+        if endline is None:
+            endline = self.buffer.posline(self.endpos)
+        return endline
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self)[index]
+        if index in (4, -2):
+            return self.line
+        if index in (5, -1):
+            return self.endline
+        return tuple.__getitem__(self, index)
+
+    def __iter__(self):
+        return iter((self.buffer, self.rule, self.pos, self.endpos, self.line, self.endline))
+
+    def __repr__(self):
+        return '%s(%s)' % (
+            type(self).__name__,
+            ', '.join('%s=%r' % item for item in zip(self._fields, self))
+        )
+
+    def __json__(self):
+        return [None, self.rule, self.pos, self.endpos, self.line, self.endline]
+
     def text_lines(self):
         return self.buffer.get_lines(self.line, self.endline)
 
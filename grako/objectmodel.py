@@ -8,8 +8,9 @@ import collections
 import weakref
 
 from grako.util import asjson, asjsons, Mapping
-from grako.infos import CommentInfo
+from grako.infos import CommentInfo, ParseInfo
 from grako.ast import AST
+from grako.buffering import SourceRef
 # TODO: from grako.exceptions import NoParseInfo
 
 
@@ -97,7 +98,8 @@ class Node(object):
     def text(self):
         if self.parseinfo:
             text = self.parseinfo.buffer.text
-            return text[self.parseinfo.pos:self.parseinfo.endpos]
+            if text is not None:
+                return text[self.parseinfo.pos:self.parseinfo.endpos]
 
     @property
     def comments(self):
@@ -146,13 +148,19 @@ class Node(object):
     def asjson(self):
         return asjson(self)
 
+    def detach(self, store=None, source=None):
+        """ Drop the references to the parse context and buffer.
+            See ``detach()``.
+        """
+        return detach(self, store=store, source=source)
+
     def _adopt_children(self, node, parent=None):
+        # only the direct children are adopted, because the children
+        # of a node were already adopted when the node was constructed
         if parent is None:
             parent = self
         if isinstance(node, Node):
             node._parent = weakref.ref(parent)
-            for c in node.children():
-                node._adopt_children(c, parent=node)
         elif isinstance(node, Mapping):
             for c in node.values():
                 self._adopt_children(c, parent=parent)
@@ -189,3 +197,54 @@ class Node(object):
 
 
 ParseModel = Node
+
+
+def detach(result, store=None, source=None):
+    """ Release the ``ParseContext`` and ``Buffer`` held by the nodes and
+        ``ParseInfo`` in a parse result, so keeping the result doesn't
+        keep the input and the parser state alive.
+
+        ``ParseInfo`` buffers are replaced by a ``SourceRef``. When a
+        ``TextStore`` is given, the text of each buffer is added to it
+        under ``source`` (or the buffer's filename), and line and text
+        information remain available through the store.
+    """
+    refs = {}
+    seen = set()
+
+    def compact(info):
+        if not isinstance(info, ParseInfo) or isinstance(info.buffer, SourceRef):
+            return info
+        buffer = info.buffer
+        ref = refs.get(id(buffer))
+        if ref is None:
+            name = source or buffer.filename or None
+            if store is not None:
+                name = store.add(buffer.text, source=name)
+            ref = refs[id(buffer)] = SourceRef(name, store)
+        return ParseInfo(ref, info.rule, info.pos, info.endpos)
+
+    def walk(node):
+        if id(node) in seen:
+            return
+        seen.add(id(node))
+        if isinstance(node, Node):
+            node._ctx = None
+            node._parseinfo = compact(node._parseinfo)
+            walk(node._ast)
+            for value in node._pubdict().values():
+                walk(value)
+        elif isinstance(node, AST):
+            if node.get('parseinfo') is not None:
+                dict.__setitem__(node, 'parseinfo', compact(node['parseinfo']))
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, Mapping):
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(result)
+    return result
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2017      by Juancarlo Añez
+# Copyright (C) 2012-2016 by Juancarlo Añez and Thomas Bragg
+
+# Declarations for builds with Cython. Generated parsers can declare
+# their parser class as an extension type of Parser with cimport.
+
+from grako.contexts cimport ParseContext
+
+
+cdef class Parser(ParseContext):
+    pass
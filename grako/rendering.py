@@ -4,6 +4,11 @@
 """
 The Renderer class provides the infrastructure for generating template-based
 code. It's used by the .grammars module for parser generation.
+
+Renderers write their output to a LineBuffer, and the output of nested
+renderers goes to the same buffer. Indented fields are indented as their
+lines are written, so the cost of rendering is linear on the size of the
+output, whatever the nesting of the renderers.
 """
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
@@ -31,10 +36,158 @@ def render(item, join='', **fields):
         return ustr(item)
 
 
+def render_into(buffer, item, join='', **fields):
+    """ Render the given item into a LineBuffer
+    """
+    if item is None:
+        return
+    elif isinstance(item, strtype):
+        buffer.write(item)
+    elif isinstance(item, Renderer):
+        item.write(buffer, join=join, **fields)
+    elif isiter(item):
+        first = True
+        for e in item:
+            if e is None:
+                continue
+            if not first:
+                buffer.write(join)
+            render_into(buffer, e, **fields)
+            first = False
+    else:
+        buffer.write(ustr(item))
+
+
+# the characters at which str.splitlines() breaks lines
+LINE_BREAKS = '\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029'
+
+
+class LineBuffer(object):
+    """ Collects rendered text. Text written between push() and pop()
+        is indented in the same way as by util.indent(), but each line
+        is indented once as it's written, instead of once for every
+        block it is nested in.
+    """
+    def __init__(self):
+        self._out = []
+        # [prefix, mark, breaks] for each block, where mark is the place
+        # in the output at which the text of the block on the current line
+        # starts, and breaks is the count of line breaks before the block
+        self._blocks = []
+        self._marked = 0
+        self._breaks = 0
+        # line breaks, as (None, count), and whitespace, as (depth, text),
+        # are kept back until other text follows, because the whitespace
+        # is stripped, and the last line break dropped, at the end of a block
+        self._tail = []
+
+    def push(self, indent=1, multiplier=4):
+        self._blocks.append([' ' * multiplier * indent, None, self._breaks])
+
+    def pop(self):
+        depth = len(self._blocks)
+        _, mark, breaks = self._blocks.pop()
+        tail = self._tail
+        if tail:
+            if tail[-1][0] is None and tail[-1][1] >= breaks:
+                tail.pop()
+            self._tail = [t for t in tail if t[0] is None or t[0] < depth]
+        if self._marked == depth:
+            self._rstrip(mark)
+            self._marked = depth - 1
+
+    def write(self, text):
+        if not text:
+            return
+        elif not self._blocks:
+            if self._tail:
+                self._flush()
+            self._out.append(text)
+            return
+
+        depth = len(self._blocks)
+        for i, line in enumerate(text.splitlines()):
+            if i:
+                self._break()
+            if not line:
+                continue
+            elif line.isspace():
+                self._tail.append((depth, line))
+            else:
+                if self._tail:
+                    self._flush()
+                self._put(line, depth)
+        if text[-1] in LINE_BREAKS:
+            self._break()
+
+    def getvalue(self):
+        if self._tail:
+            self._flush()
+        return ''.join(self._out)
+
+    def _put(self, text, depth):
+        out = self._out
+        for block in self._blocks[self._marked:depth]:
+            block[1] = len(out)
+            if block[0]:
+                out.append(block[0])
+        self._marked = max(self._marked, depth)
+        out.append(text)
+
+    def _break(self):
+        self._tail.append((None, self._breaks))
+        self._breaks += 1
+
+    def _flush(self):
+        for depth, text in self._tail:
+            if depth is not None:
+                self._put(text, depth)
+                continue
+            if self._marked:
+                self._rstrip(self._blocks[0][1])
+                self._marked = 0
+            self._out.append('\n')
+        self._tail = []
+
+    def _rstrip(self, mark):
+        out = self._out
+        while len(out) > mark:
+            text = out[-1].rstrip()
+            if text:
+                out[-1] = text
+                return
+            out.pop()
+
+
+def parse_spec(spec):
+    """ Parse the indent, separator, and format of an indented field.
+    """
+    ind, sep, fmt = spec.split(':')
+    if sep == '\\n':
+        sep = '\n'
+
+    if not ind:
+        ind = 0
+        mult = 0
+    elif '*' in ind:
+        ind, mult = ind.split('*')
+    else:
+        mult = 4
+    ind = int(ind)
+    mult = int(mult)
+
+    if not fmt:
+        fmt = '%s'
+    return ind, mult, sep, fmt
+
+
 class RenderingFormatter(string.Formatter):
     def render(self, item, join='', **fields):
         return render(item, join=join, **fields)
 
+    def render_into(self, buffer, item, join='', **fields):
+        render_into(buffer, item, join=join, **fields)
+
     def format_field(self, value, spec):
         if ':' not in spec:
             return super(RenderingFormatter, self).format_field(
@@ -42,27 +195,50 @@ class RenderingFormatter(string.Formatter):
                 spec
             )
 
-        ind, sep, fmt = spec.split(':')
-        if sep == '\\n':
-            sep = '\n'
-
-        if not ind:
-            ind = 0
-            mult = 0
-        elif '*' in ind:
-            ind, mult = ind.split('*')
+        ind, mult, sep, fmt = parse_spec(spec)
+        if isiter(value):
+            return indent(sep.join(fmt % self.render(v) for v in value), ind, mult)
         else:
-            mult = 4
-        ind = int(ind)
-        mult = int(mult)
+            return indent(fmt % self.render(value), ind, mult)
+
+    def format_into(self, buffer, template, fields):
+        """ Write a template, as parsed by parse(), into the buffer.
+        """
+        for literal, name, spec, conversion in template:
+            if literal:
+                buffer.write(literal)
+            if name is None:
+                continue
 
-        if not fmt:
-            fmt = '%s'
+            value = self.get_field(name, (), fields)[0]
+            if conversion:
+                value = self.convert_field(value, conversion)
+            if not spec:
+                self.render_into(buffer, value)
+            elif ':' not in spec:
+                buffer.write(self.format_field(value, spec))
+            else:
+                self.write_field(buffer, value, spec)
 
+    def write_field(self, buffer, value, spec):
+        ind, mult, sep, fmt = parse_spec(spec)
+        if ind >= 0:
+            buffer.push(ind, mult)
         if isiter(value):
-            return indent(sep.join(fmt % self.render(v) for v in value), ind, mult)
+            for i, v in enumerate(value):
+                if i:
+                    buffer.write(sep)
+                self._write_formatted(buffer, v, fmt)
         else:
-            return indent(fmt % self.render(value), ind, mult)
+            self._write_formatted(buffer, value, fmt)
+        if ind >= 0:
+            buffer.pop()
+
+    def _write_formatted(self, buffer, value, fmt):
+        if fmt == '%s':
+            self.render_into(buffer, value)
+        else:
+            buffer.write(fmt % self.render(value))
 
 
 class Renderer(object):
@@ -77,6 +253,7 @@ class Renderer(object):
     template = '{__class__}'
     _counter = itertools.count()
     _formatter = RenderingFormatter()
+    _parsed_templates = {}
 
     def __init__(self, template=None):
         if template is not None:
@@ -114,7 +291,25 @@ class Renderer(object):
         """
         pass
 
+    def parse_template(self, template):
+        """ Return the trimmed and parsed template, which is computed
+            only once for each template.
+        """
+        parsed = self._parsed_templates.get(template)
+        if parsed is None:
+            parsed = tuple(self._formatter.parse(trim(template)))
+            self._parsed_templates[template] = parsed
+        return parsed
+
     def render(self, template=None, **fields):
+        buffer = LineBuffer()
+        self.render_into(buffer, template=template, **fields)
+        return buffer.getvalue()
+
+    def render_into(self, buffer, template=None, **fields):
+        """ Render into a LineBuffer. Subclasses that customize rendering
+            should override this method instead of render().
+        """
         fields.update(__class__=self.__class__.__name__)
         fields.update({k: v for k, v in vars(self).items() if not k.startswith('_')})
 
@@ -124,16 +319,24 @@ class Renderer(object):
         elif template is None:
             template = self.template
 
+        parsed = self.parse_template(template)
         try:
-            return self._formatter.format(trim(template), **fields)
+            self._formatter.format_into(buffer, parsed, fields)
         except KeyError:
             # find the missing key
-            keys = (p[1] for p in self._formatter.parse(template))
-            for key in keys:
+            for _, key, _, _ in parsed:
                 if key and key not in fields:
                     raise KeyError(key, type(self))
             raise
 
+    def write(self, buffer, **fields):
+        """ Render into buffer, through render() if a subclass overrides it.
+        """
+        if type(self).render == Renderer.render:
+            self.render_into(buffer, **fields)
+        else:
+            buffer.write(ustr(self.render(**fields)))
+
     def __str__(self):
         return self.render()
 
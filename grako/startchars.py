@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2017      by Juancarlo Añez
+# Copyright (C) 2012-2016 by Juancarlo Añez and Thomas Bragg
+"""
+Analysis of the characters grammar expressions may start with.
+
+The results are used to build guards: regular expressions over a single
+character that tell, before an expression is tried, whether the text
+ahead could possibly match it.
+
+Character sets are kept as sets of items, where each item is either a
+single character, or a regular expression fragment that matches a single
+character (a class like ``[a-z]``, or a category like ``\\d``).
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from collections import namedtuple
+
+from grako.util import re, RE_FLAGS
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+
+__all__ = ['StartChars', 'regex_start_chars', 'guard_pattern', 'prediction']
+
+
+class StartChars(namedtuple('_StartCharsBase', ['raw', 'ws', 'nullable', 'skips'])):
+    """ The characters an expression may start with as the text is
+        (``raw``), or after whitespace and comments are skipped (``ws``).
+        ``nullable`` tells if the expression may succeed without
+        consuming any text, and ``skips`` if it may skip whitespace
+        when it does. ``None`` is used instead of a ``StartChars``
+        when nothing is known.
+    """
+    __slots__ = ()
+
+    def __new__(cls, raw, ws, nullable, skips=False):
+        return super(StartChars, cls).__new__(cls, raw, ws, nullable, skips)
+
+    def union(self, other):
+        if other is None:
+            return None
+        return StartChars(
+            self.raw | other.raw,
+            self.ws | other.ws,
+            self.nullable or other.nullable,
+            self.skips or other.skips
+        )
+
+    def then(self, other):
+        if not self.nullable:
+            return self
+        if other is None:
+            return None
+        if self.skips:
+            other = other.skipped()
+        return StartChars(
+            self.raw | other.raw,
+            self.ws | other.ws,
+            other.nullable,
+            self.skips or other.skips
+        )
+
+    def optional(self):
+        return StartChars(self.raw, self.ws, True, self.skips)
+
+    def skipped(self):
+        return StartChars(frozenset(), self.raw | self.ws, self.nullable, self.skips)
+
+    def skipping(self):
+        return StartChars(self.raw, self.ws, self.nullable, True)
+
+    def guard(self):
+        """ The ``(raw, ws)`` patterns that must be matched for the
+            expression to have a chance of succeeding, or ``None``.
+        """
+        if self.nullable:
+            return None
+        return guard_pattern(self.raw), guard_pattern(self.ws)
+
+
+NULLABLE = StartChars(frozenset(), frozenset(), True)
+
+# what may succeed without consuming text, after skipping whitespace
+SKIPPING = StartChars(frozenset(), frozenset(), True, True)
+
+
+def token_start_chars(token):
+    if not token:
+        return SKIPPING
+    return StartChars(frozenset(), frozenset([token[0]]), False)
+
+
+def guard_pattern(items):
+    if not items:
+        return None
+    chars = sorted(c for c in items if len(c) == 1)
+    fragments = sorted(f for f in items if len(f) > 1)
+    if chars:
+        fragments.insert(0, '[%s]' % ''.join(re.escape(c) for c in chars))
+    return '|'.join(fragments)
+
+
+def prediction(starts):
+    """ The table that selects, from the next character, the only one of
+        the options with the given ``StartChars`` that may match, or
+        ``None`` if the options don't start with disjoint characters.
+
+        The table is a ``(chars, ws, default, pattern)`` tuple. ``chars``
+        maps lowercase characters to option indexes, and ``pattern``
+        matches the other characters that select option ``default``.
+        ``ws`` tells if the character is the one after whitespace and
+        comments are skipped.
+    """
+    if len(starts) < 2 or any(s is None or s.nullable for s in starts):
+        return None
+    if not any(s.raw for s in starts):
+        ws = True
+    elif not any(s.ws for s in starts):
+        ws = False
+    else:
+        return None
+
+    chars = {}
+    default = pattern = None
+    for i, start in enumerate(starts):
+        items = start.ws if ws else start.raw
+        fragments = [f for f in items if len(f) > 1]
+        if fragments:
+            if pattern is not None:
+                return None  # two character classes may intersect
+            default, pattern = i, guard_pattern(fragments)
+        for c in items:
+            if len(c) == 1:
+                if chars.setdefault(c.lower(), i) != i:
+                    return None
+    if pattern is not None:
+        regex = re.compile(pattern, RE_FLAGS | re.IGNORECASE)
+        if any(i != default and regex.match(c) for c, i in chars.items()):
+            return None
+    return chars, ws, default, pattern
+
+
+CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT: r'\d',
+    sre_constants.CATEGORY_NOT_DIGIT: r'\D',
+    sre_constants.CATEGORY_SPACE: r'\s',
+    sre_constants.CATEGORY_NOT_SPACE: r'\S',
+    sre_constants.CATEGORY_WORD: r'\w',
+    sre_constants.CATEGORY_NOT_WORD: r'\W',
+}
+
+REPEATS = {
+    getattr(sre_constants, op)
+    for op in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT')
+    if hasattr(sre_constants, op)
+}
+
+ATOMIC_GROUP = getattr(sre_constants, 'ATOMIC_GROUP', None)
+
+
+def _char(c):
+    return '%c' % c
+
+
+def _class_items(items):
+    negate = False
+    chars = set()
+    parts = []
+    for op, av in items:
+        if op == sre_constants.NEGATE:
+            negate = True
+        elif op == sre_constants.LITERAL:
+            chars.add(_char(av))
+            parts.append(re.escape(_char(av)))
+        elif op == sre_constants.RANGE:
+            parts.append('%s-%s' % (re.escape(_char(av[0])), re.escape(_char(av[1]))))
+        elif op == sre_constants.CATEGORY and av in CATEGORIES:
+            parts.append(CATEGORIES[av])
+        else:
+            return None
+    if not negate and len(parts) == len(chars):
+        return chars
+    return {'[%s%s]' % ('^' if negate else '', ''.join(parts))}
+
+
+def _subpattern_start(subpattern):
+    result = set()
+    for op, av in subpattern:
+        if op == sre_constants.LITERAL:
+            result.add(_char(av))
+            return result, False
+        elif op == sre_constants.NOT_LITERAL:
+            result.add('[^%s]' % re.escape(_char(av)))
+            return result, False
+        elif op == sre_constants.IN:
+            items = _class_items(av)
+            if items is None:
+                return None
+            result |= items
+            return result, False
+        elif op == sre_constants.AT:
+            continue
+        elif op == sre_constants.BRANCH:
+            branches = [_subpattern_start(b) for b in av[1]]
+            if any(b is None for b in branches):
+                return None
+            for items, _ in branches:
+                result |= items
+            if not any(nullable for _, nullable in branches):
+                return result, False
+        elif op == sre_constants.SUBPATTERN or op == ATOMIC_GROUP:
+            start = _subpattern_start(av[-1] if op == sre_constants.SUBPATTERN else av)
+            if start is None:
+                return None
+            result |= start[0]
+            if not start[1]:
+                return result, False
+        elif op in REPEATS:
+            lo, _, sub = av
+            start = _subpattern_start(sub)
+            if start is None:
+                return None
+            result |= start[0]
+            if lo > 0 and not start[1]:
+                return result, False
+        else:
+            return None
+    return result, True
+
+
+def regex_start_chars(pattern):
+    """ The ``(items, nullable)`` of the characters a match of ``pattern``
+        may start with, or ``None`` if they can't be determined.
+    """
+    try:
+        start = _subpattern_start(sre_parse.parse(pattern))
+    except Exception:
+        return None  # a syntax that's only known to the regex module
+    if start is None:
+        return None
+    return frozenset(start[0]), start[1]
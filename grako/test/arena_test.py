@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2017      by Juancarlo Añez
+# Copyright (C) 2012-2016 by Juancarlo Añez and Thomas Bragg
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import json
+import unittest
+
+from grako.tool import compile
+from grako.arena import ArenaBuilder
+from grako.util import asjson
+
+
+GRAMMAR = r'''
+    start = {statement}+ $ ;
+
+    statement = assign | call ;
+
+    assign = name:id '=' value:number ';' ;
+
+    call = name:id '(' args:','.{number} ')' ';' ;
+
+    id = /[a-z]+/ ;
+
+    number = /\d+/ ;
+'''
+
+
+class ArenaTests(unittest.TestCase):
+
+    def build(self, text):
+        model = compile(GRAMMAR, 'Test')
+        builder = ArenaBuilder()
+        model.parse(text, handler=builder)
+        return builder.arena
+
+    def test_structure(self):
+        arena = self.build('a = 1; f(2, 3);')
+
+        root = arena.root
+        self.assertEqual('start', root.rule)
+        self.assertEqual((0, 15), (root.pos, root.endpos))
+        self.assertIsNone(root.parent)
+
+        statements = root.children
+        self.assertEqual(['statement', 'statement'], [s.rule for s in statements])
+        self.assertEqual(root, statements[1].parent)
+
+        call = statements[1].children[0]
+        self.assertEqual('call', call.rule)
+        self.assertEqual(
+            ['id', '(', 'number', ',', 'number', ')', ';'],
+            [c.rule or c.token for c in call.children]
+        )
+        self.assertEqual(
+            ['name', None, 'args', None, 'args', None, None],
+            [c.name for c in call.children]
+        )
+
+    def test_select(self):
+        arena = self.build('a = 1; f(2, 3); g(4);')
+
+        numbers = list(arena.select('number'))
+        self.assertEqual(['1', '2', '3', '4'], [n.to_ast() for n in numbers])
+
+        numbers = list(arena.select('number', 7, 15))
+        self.assertEqual([(9, 10), (12, 13)], [(n.pos, n.endpos) for n in numbers])
+
+        self.assertEqual([], list(arena.select('unknown')))
+
+    def test_to_ast(self):
+        text = 'a = 1; f(2, 3); g(4);'
+        model = compile(GRAMMAR, 'Test')
+        ast = model.parse(text, parseinfo=False)
+
+        builder = ArenaBuilder()
+        model.parse(text, handler=builder)
+        self.assertEqual(ast, builder.arena.to_ast())
+
+    def round_trip(self, grammar, text, **kwargs):
+        model = compile(grammar, 'Test')
+        ast = model.parse(text, **kwargs)
+
+        builder = ArenaBuilder()
+        model.parse(text, handler=builder, **kwargs)
+        return ast, builder.arena.to_ast()
+
+    def test_to_ast_closures(self):
+        def check(grammar, text):
+            ast, result = self.round_trip(grammar, text)
+            self.assertEqual(ast, result)
+
+        check("start = {'a' 'b'} $ ;", 'a b a b')
+        check("start = x:{'a' 'b'} y:{'c'} $ ;", 'a b a b c')
+        check("start = {sub}+ $ ; sub = 'a' ('b' 'c') ;", 'a b c a b c')
+        check("start = x:{sub}+ $ ; sub = @:('a' | 'b') {'c'} ;", 'a c b c c')
+        check(r"start = {m+:(m+:sub 'x')} $ ; sub = v:/\d+/ ;", '1 x 2 x')
+
+    def test_to_ast_parseinfo(self):
+        # the buffers of two parses are not equal
+        ast, result = self.round_trip(GRAMMAR, 'a = 1; f(2, 3); g(4);', parseinfo=True)
+        self.assertIsNotNone(result[0].parseinfo)
+        self.assertEqual(json.dumps(asjson(ast)), json.dumps(asjson(result)))
+
+        ast, result = self.round_trip("start = a:'x' [b:'y'] $ ;", 'x', parseinfo=True)
+        self.assertEqual(['a', 'parseinfo', 'b'], list(result.keys()))
+        self.assertEqual(json.dumps(asjson(ast)), json.dumps(asjson(result)))
@@ -8,6 +8,8 @@ import unittest
 
 from grako.codegen import CodeGenerator, ModelRenderer
 from grako.objectmodel import Node
+from grako.rendering import LineBuffer
+from grako.util import indent
 
 
 class Generator(CodeGenerator):
@@ -24,6 +26,19 @@ class Generator(CodeGenerator):
     class Sub(ModelRenderer):
         template = 'and OK too'
 
+    class Block(ModelRenderer):
+        template = '''\
+            block {depth}:
+            {body:1::}
+            end {depth}\
+            '''
+
+    class Leaf(ModelRenderer):
+        template = 'leaf  '
+
+        def render(self, **fields):
+            return super(Generator.Leaf, self).render(**fields).upper()
+
 
 class Sub(Node):
     pass
@@ -35,6 +50,14 @@ class Super(Node):
         self.sub = Sub(self.ctx)
 
 
+class Leaf(Node):
+    pass
+
+
+class Block(Node):
+    pass
+
+
 class TestCodegen(unittest.TestCase):
     def test_basic_codegen(self):
         model = Super(self)
@@ -42,6 +65,49 @@ class TestCodegen(unittest.TestCase):
         result = gen.render(model)
         self.assertEqual('OK and OK too', result)
 
+    def test_nested_indentation(self):
+        model = Leaf(self)
+        for depth in range(3):
+            model = Block(self, depth=depth, body=model)
+        result = Generator().render(model)
+        self.assertEqual(
+            'block 2:\n'
+            '    block 1:\n'
+            '        block 0:\n'
+            '            LEAF\n'
+            '        end 0\n'
+            '    end 1\n'
+            'end 2',
+            result
+        )
+
+    def test_line_buffer(self):
+        buffer = LineBuffer()
+        buffer.write('def f():\n')
+        buffer.push()
+        buffer.write('if x:  \n')
+        buffer.push(2, 2)
+        buffer.write('return 1\n\n')
+        buffer.pop()
+        buffer.write(' \nreturn 2')
+        buffer.push(0)
+        buffer.write('  \n')
+        buffer.pop()
+        buffer.pop()
+        buffer.write('# done')
+
+        expected = (
+            'def f():\n' +
+            indent(
+                'if x:  \n' +
+                indent('return 1\n\n', 2, 2) +
+                ' \nreturn 2' +
+                indent('  \n', 0)
+            ) +
+            '# done'
+        )
+        self.assertEqual(expected, buffer.getvalue())
+
 
 def suite():
     return unittest.TestLoader().loadTestsFromTestCase(TestCodegen)
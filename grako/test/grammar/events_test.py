@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2017      by Juancarlo Añez
+# Copyright (C) 2012-2016 by Juancarlo Añez and Thomas Bragg
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+
+from grako.tool import compile
+from grako.codegen import codegen
+from grako.events import EventHandler, RuleRef
+from grako.exceptions import FailedParse
+
+
+GRAMMAR = r'''
+    @@grammar :: Test
+
+    start = {statement}+ $ ;
+
+    statement = assign | call ;
+
+    assign = name:id '=' value:number ';' ;
+
+    call = name:id '(' args:','.{/\d+/} ')' ';' ;
+
+    id = /[a-z]+/ ;
+
+    number = /\d+/ ;
+'''
+
+
+class Recorder(EventHandler):
+    def __init__(self):
+        self.events = []
+
+    def start_rule(self, name, pos):
+        self.events.append(('start', name, pos))
+
+    def end_rule(self, name, pos, endpos):
+        self.events.append(('end', name, pos, endpos))
+
+    def token(self, token, pos, endpos):
+        self.events.append(('token', token, pos, endpos))
+
+    def name(self, name, value, aslist=False):
+        self.events.append(('name', name, value, aslist))
+
+
+class EventTests(unittest.TestCase):
+
+    def generated_parser(self, grammar):
+        code = codegen(compile(grammar, 'Test'))
+        module = {}
+        exec(code, module)
+        return module['TestParser']()
+
+    def test_no_backtracked_events(self):
+        model = compile(GRAMMAR, 'Test')
+        handler = Recorder()
+        result = model.parse('f(1,2);', handler=handler)
+        self.assertEqual(RuleRef('start', 0, 7), result)
+
+        self.assertEqual(
+            [
+                ('start', 'start', 0),
+                ('start', 'statement', 0),
+                ('start', 'call', 0),
+                ('start', 'id', 0),
+                ('token', 'f', 0, 1),
+                ('end', 'id', 0, 1),
+                ('name', 'name', RuleRef('id', 0, 1), False),
+                ('token', '(', 1, 2),
+                ('token', '1', 2, 3),
+                ('token', ',', 3, 4),
+                ('token', '2', 4, 5),
+                ('name', 'args', ['1', '2'], False),
+                ('token', ')', 5, 6),
+                ('token', ';', 6, 7),
+                ('end', 'call', 0, 7),
+                ('end', 'statement', 0, 7),
+                ('end', 'start', 0, 7),
+            ],
+            handler.events
+        )
+
+    def test_generated_parser_matches_model(self):
+        text = 'a = 1; f(); g(2,3); b = 4;'
+        model = compile(GRAMMAR, 'Test')
+
+        expected = Recorder()
+        model.parse(text, handler=expected)
+
+        handler = Recorder()
+        parser = self.generated_parser(GRAMMAR)
+        parser.parse(text, rule_name='start', handler=handler)
+        self.assertEqual(expected.events, handler.events)
+
+    def test_check_name(self):
+        grammar = r'''
+            @@keyword :: if
+
+            start = {id}+ $ ;
+
+            @name
+            id = word ;
+
+            word = /\w+/ ;
+        '''
+        model = compile(grammar, 'Test')
+        for parse in (model.parse, self.generated_parser(grammar).parse):
+            handler = Recorder()
+            parse('a b', rule_name='start', handler=handler)
+            self.assertIn(('token', 'b', 2, 3), handler.events)
+
+            with self.assertRaises(FailedParse) as failed:
+                parse('a if b', rule_name='start', handler=Recorder())
+            self.assertIn('"if" is a reserved word', str(failed.exception))
+
+    def test_streaming(self):
+        grammar = '''
+            start = {statement ~} $ ;
+            statement = 'a' | 'b' ;
+        '''
+        model = compile(grammar, 'Test')
+
+        handler = Recorder()
+        with self.assertRaises(FailedParse):
+            model.parse('a b a c', handler=handler)
+
+        # each statement was delivered as soon as its cut committed it
+        tokens = [e[1] for e in handler.events if e[0] == 'token']
+        self.assertEqual(['a', 'b', 'a'], tokens)
+        self.assertNotIn('start', [e[1] for e in handler.events if e[0] == 'end'])
+
+    def test_no_tree_is_built(self):
+        model = compile(GRAMMAR, 'Test')
+        ast = model.parse('a = 1;')
+        self.assertEqual('a', ast[0].name)
+
+        handler = Recorder()
+        self.assertEqual(RuleRef('start', 0, 6), model.parse('a = 1;', handler=handler))
+        self.assertIn(('token', '1', 4, 5), handler.events)
@@ -7,6 +7,10 @@ import unittest
 
 from grako.util import trim
 from grako.tool import compile
+from grako.codegen import codegen
+from grako.codegen.vm import assemble
+from grako.exceptions import FailedParse
+from grako.vm import VMParser
 
 
 class PatternTests(unittest.TestCase):
@@ -66,3 +70,42 @@ class PatternTests(unittest.TestCase):
         self.assertEqual(['abc123', 'def456'], ast)
         print(model.pretty())
         self.assertEqual(trim(pretty), model.pretty())
+
+    def test_collapsed_patterns(self):
+        grammar = r'''
+            start = {number} $ ;
+            number = /0x[0-9a-f]+/ | /\d+/ | /\((\d)\)/ ;
+        '''
+        model = compile(grammar, 'test')
+        number = model.rules[1].exp
+        self.assertEqual(r'(?:(?:0x[0-9a-f]+)|(?:\d+)|(?:\((\d)\)))', number.collapsed)
+
+        text = '0x1f 12 (3)'
+        ast = model.parse(text)
+        self.assertEqual(['0x1f', '12', '(3)'], ast)
+
+        module = {}
+        exec(codegen(model), module)
+        parser = module['testParser']()
+        self.assertEqual(ast, parser.parse(text, rule_name='start'))
+
+        # a failure reports the choice, not the combined regex
+        vm = VMParser(assemble(model))
+        for parse in (parser.parse, vm.parse):
+            with self.assertRaises(FailedParse) as failed:
+                parse('q', rule_name='number')
+            self.assertIn(r'expecting one of: 0x[0-9a-f]+ \((\d)\) \d+', str(failed.exception))
+        with self.assertRaises(FailedParse) as failed:
+            model.parse('q', start='number')
+        self.assertIn('no available options', str(failed.exception))
+
+        # lookaheads are parsed by their choice
+        model = compile(r"start = &(/a/ | /b/) /\w+/ ;", 'test')
+        lookahead = model.rules[0].exp.sequence[0]
+        self.assertIsNone(lookahead.collapsed)
+        self.assertIsNotNone(lookahead.exp.exp.collapsed)
+        self.assertEqual('bq', model.parse('bq'))
+
+        # a backreference would be renumbered
+        model = compile(r"start = /(a)\1/ | /b/ ;", 'test')
+        self.assertIsNone(model.rules[0].exp.collapsed)
@@ -36,3 +36,24 @@ class SemanticsTests(unittest.TestCase):
         model = compile(grammar, 'test')
         ast = model.parse(text, semantics=semantics)
         self.assertEqual('5.4.3.2.1', ast)
+
+    def test_semantic_lookups(self):
+        grammar = '''
+            start = {number}+ $ ;
+            number = /\d+/ ;
+        '''
+
+        class Semantics(object):
+            def __init__(self):
+                self.lookups = []
+
+            def __getattr__(self, name):
+                self.lookups.append(name)
+                if name == 'number':
+                    return int
+                raise AttributeError(name)
+
+        semantics = Semantics()
+        model = compile(grammar, 'test')
+        self.assertEqual([5, 4, 3], model.parse('5 4 3', semantics=semantics))
+        self.assertEqual(1, semantics.lookups.count('number'))
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2017      by Juancarlo Añez
+# Copyright (C) 2012-2016 by Juancarlo Añez and Thomas Bragg
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+
+from grako.tool import compile
+from grako.codegen import codegen
+from grako.exceptions import FailedParse
+from grako.grammars import Choice
+from grako.startchars import StartChars, regex_start_chars, guard_pattern, prediction
+from grako.vm import VMParser
+from grako.codegen.vm import assemble
+
+
+GRAMMAR = r'''
+    @@comments :: /\(\*.*?\*\)/
+
+    start = {statement}+ $ ;
+
+    statement = assign | call | block ;
+
+    assign = id '=' [sign] number ';' ;
+
+    call = id '(' ','.{number} ')' ';' ;
+
+    block = '{' {!'}' statement} '}' ;
+
+    sign = '-' | '+' ;
+
+    id = !'if' /[a-z]+/ ;
+
+    number = /\d+/ ;
+'''
+
+
+class StartCharsTests(unittest.TestCase):
+
+    def test_regex_start_chars(self):
+        self.assertEqual((frozenset(['a']), False), regex_start_chars('abc'))
+        self.assertEqual((frozenset(['[a-z]']), False), regex_start_chars('[a-z]+'))
+        self.assertEqual((frozenset(['a', 'b']), False), regex_start_chars('(?:a|b)c'))
+        self.assertEqual((frozenset(['a', 'b']), False), regex_start_chars('a?b'))
+        self.assertEqual((frozenset(['a']), True), regex_start_chars('a*'))
+        self.assertEqual((frozenset([r'[\d]']), False), regex_start_chars(r'^\d'))
+        self.assertIsNone(regex_start_chars('.'))
+
+        self.assertEqual(r'[\(a]|\d', guard_pattern({'a', '(', r'\d'}))
+        self.assertIsNone(guard_pattern(set()))
+
+    def test_guards(self):
+        model = compile(GRAMMAR, 'Test')
+        rules = {rule.name: rule for rule in model.rules}
+
+        options = rules['statement'].exp.options
+        self.assertEqual(
+            [(None, '[a-z]'), (None, '[a-z]'), (None, r'[\{]')],
+            [o.guard for o in options]
+        )
+        self.assertEqual(('[a-z]', None), rules['id'].exp.guard)
+        self.assertEqual((None, r'[\{]|[a-z]'), rules['block'].exp.sequence[1].exp.guard)
+
+    def test_skipped_guards(self):
+        # constants skip whitespace, so what follows them is guarded
+        # after the whitespace, and not before
+        grammar = r'''
+            @@ignorecase :: True
+
+            start = r0 $ ;
+            %s
+            r0 = {`k` /x\d*/}+ ;
+        '''
+        for decorator in ('', '@noinline'):
+            model = compile(grammar % decorator, 'Test')
+            self.assertEqual((None, '[x]'), model.rules[1].exp.exp.guard)
+            expected = [['k', 'x'], ['k', 'x1']]
+            for left_factor in (False, True):
+                if left_factor:
+                    model.left_factor()
+                for flat in (False, True):
+                    module = {}
+                    exec(codegen(model, flat=flat), module)
+                    parser = module['TestParser']()
+                    self.assertEqual(expected, parser.parse('x x1', rule_name='start'))
+                vm = VMParser(assemble(model))
+                self.assertEqual(expected, vm.parse('x x1', rule_name='start'))
+
+    def test_prediction(self):
+        def start(*items, **kwargs):
+            return StartChars(frozenset(), frozenset(items), kwargs.get('nullable', False))
+
+        self.assertEqual(
+            ({'{': 0, '[': 1, '-': 2}, True, 2, r'\d'),
+            prediction([start('{'), start('['), start('-', r'\d')])
+        )
+        self.assertIsNone(prediction([start('a'), start('A')]))
+        self.assertIsNone(prediction([start('a'), start('[a-z]')]))
+        self.assertIsNone(prediction([start('[0-9]'), start('[a-z]')]))
+        self.assertIsNone(prediction([start('a'), start('b', nullable=True)]))
+        self.assertIsNone(prediction([start('a'), StartChars(frozenset(['b']), frozenset(), False)]))
+        self.assertIsNone(prediction([start('a'), None]))
+
+    def test_predicted_parse(self):
+        grammar = r'''
+            start = value $ ;
+            value = object | array | string | number | 'true' ~ | 'null' ~ ;
+            object = '{' ~ ','.{member} '}' ;
+            member = key:string ':' ~ value:value ;
+            array = '[' ~ ','.{value} ']' ;
+            string = /"[^"]*"/ ;
+            number = /-?\d+/ ;
+        '''
+        model = compile(grammar, 'Test')
+        rules = {rule.name: rule for rule in model.rules}
+        self.assertIsNotNone(rules['value'].exp.prediction)
+        self.assertIsNone(compile(GRAMMAR).rules[1].exp.prediction)
+
+        def parsers(model):
+            yield model.parse
+            for flat in (False, True):
+                module = {}
+                exec(codegen(model, flat=flat), module)
+                yield module['TestParser']().parse
+
+        self.assertIn('self._predict(PREDICT_0)', codegen(model))
+        predicted = list(parsers(model))
+        for choice in model._models():
+            if isinstance(choice, Choice):
+                choice._prediction = None
+        self.assertNotIn('self._predict(', codegen(model))
+        unpredicted = list(parsers(model))
+
+        text = '{"a": [1, -2, {"b": null}], "c": true}'
+        expected = model.parse(text, parseinfo=False)
+        for parse in predicted:
+            self.assertEqual(expected, parse(text, rule_name='start', parseinfo=False))
+
+        for text in ['{"a": tru}', '[1, }', '{"a" 1}', '[1, -]', 'x']:
+            for parse, backtracking in zip(predicted, unpredicted):
+                with self.assertRaises(FailedParse) as expected:
+                    backtracking(text, rule_name='start')
+                with self.assertRaises(FailedParse) as failed:
+                    parse(text, rule_name='start')
+                self.assertEqual(str(expected.exception), str(failed.exception))
+
+    def test_guarded_parse(self):
+        text = 'a = 1; (* comment *) f(1, 2); { b = -3; { } g(); }'
+        model = compile(GRAMMAR, 'Test')
+        ast = model.parse(text, parseinfo=False)
+        self.assertEqual(['b', '=', '-', '3', ';'], ast[2][1][0])
+
+        code = codegen(model)
+        self.assertIn('self._guard(', code)
+        module = {}
+        exec(code, module)
+        parser = module['TestParser']()
+        self.assertEqual(ast, parser.parse(text, rule_name='start'))
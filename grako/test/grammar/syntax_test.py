@@ -8,7 +8,7 @@ import unittest
 
 from grako.exceptions import FailedParse
 from grako.tool import compile
-from grako.util import trim, ustr
+from grako.util import trim, ustr, asjson
 from grako.codegen import codegen
 from grako.grammars import EBNFBuffer
 
@@ -103,6 +103,12 @@ class SyntaxTests(unittest.TestCase):
         ast = model.parse("xyyzz", nameguard=False)
         self.assertEqual(['x', ['y', 'y'], 'z', 'z'], ast.foo)
 
+    def test_nested_named_list(self):
+        grammar = "start = m+:(m+:('+' '-')) $ ;"
+        model = compile(grammar, "test")
+        ast = model.parse('+-')
+        self.assertEqual({'m': [['+', '-'], ['+', '-']]}, asjson(ast))
+
     def test_optional_sequence(self):
         grammar = '''
             start = '1' ['2' '3'] '4' $ ;
@@ -301,6 +307,21 @@ class SyntaxTests(unittest.TestCase):
         self.assertIsNotNone(ast.tail)
         self.assertIsNotNone(ast.parseinfo)
 
+        model = compile("start = x:{'x'}+ 'y' ;", "test")
+        ast = model.parse("x\nx\n  xy\n", nameguard=False, parseinfo=True)
+        info = ast.parseinfo
+        self.assertEqual(('start', 0, 8), (info.rule, info.pos, info.endpos))
+        self.assertEqual((0, 2), (info.line, info.endline))
+        self.assertEqual([None, 'start', 0, 8, 0, 2], asjson(info))
+
+        # the tuple layout is that of previous versions
+        self.assertEqual(6, len(info))
+        self.assertEqual((0, 2), (info[4], info[5]))
+        self.assertEqual(('start', 0, 8, 0, 2), info[1:])
+        _, rule, pos, endpos, line, endline = info
+        self.assertEqual(('start', 0, 8, 0, 2), (rule, pos, endpos, line, endline))
+        self.assertEqual(2, info._asdict()['endline'])
+
     def test_raw_string(self):
         grammar = r'''
             start = r'am\nraw' ;
@@ -314,3 +335,83 @@ class SyntaxTests(unittest.TestCase):
         model = compile(grammar, "start")
         print(model.pretty())
         self.assertEqual(trim(pretty), model.pretty())
+
+    def test_token_choice(self):
+        grammar = '''
+            start = {op}+ $ ;
+            op = '<' | '<=' | 'in' | 'int' | '=' ;
+        '''
+        model = compile(grammar, "test")
+        self.assertEqual(('<', '<=', 'in', 'int', '='), model.rules[1].exp.tokens)
+
+        # options are tried in order, and names are not split
+        text = '<= int in'
+        ast = model.parse(text)
+        self.assertEqual(['<', '=', 'int', 'in'], ast)
+
+        code = codegen(model)
+        self.assertIn('_token_choice', code)
+        module = {}
+        exec(code, module)
+        parser = module['testParser']()
+        self.assertEqual(ast, parser.parse(text, rule_name='start'))
+
+        # without the nameguard 'in' is taken from 'int'
+        self.assertEqual(['<', 'int'], model.parse('<int'))
+        with self.assertRaises(FailedParse):
+            model.parse('<int', nameguard=False)
+        with self.assertRaises(FailedParse):
+            parser.parse('<int', rule_name='start', nameguard=False)
+
+    def test_left_factor(self):
+        grammar = '''
+            start = {stmt}+ $ ;
+            stmt
+                =
+                | x:id '=' id ';'
+                | x:id '=' id '+' id ';'
+                | x:id '(' ')' ';'
+                | x:id ';'
+                | 'go' ~ id ';'
+                | 'go' '!' ';'
+                ;
+            id = /[a-z]+/ ;
+        '''
+        text = 'a = b + c; f(); a = b; g; go x;'
+        model = compile(grammar, 'test')
+        expected = model.parse(text)
+
+        model = compile(grammar, 'test', left_factor=True)
+        self.assertEqual(compile(grammar, 'test').pretty(), model.pretty())
+        options = model.rules[1].exp.options
+        self.assertEqual(['Factored', 'Factored'], [type(o).__name__ for o in options])
+        self.assertEqual(1, len(options[0].prefix))
+        self.assertEqual(3, len(options[0].suffixes))
+        self.assertEqual(expected, model.parse(text))
+
+        def generated(model):
+            module = {}
+            exec(codegen(model), module)
+            parser = module['testParser']()
+            return parser.parse(text, rule_name='start', parseinfo=False)
+
+        self.assertIn('self._factored_option()', codegen(model))
+        self.assertEqual(generated(compile(grammar, 'test')), generated(model))
+
+        # the cut after 'go' still applies to the options that follow
+        with self.assertRaises(FailedParse):
+            model.parse('go !;')
+
+    def test_first_sets(self):
+        grammar = '''
+            start = a $ ;
+            a = b 'x' | 'y' ;
+            b = c | 'z' ;
+            c = d ;
+            d = a | 'w' ;
+        '''
+        model = compile(grammar, 'test')
+        expected = {('w',), ('y',), ('z',)}
+        self.assertEqual(expected, model.first_sets['a'])
+        self.assertEqual(expected, model.first_sets['d'])
+        self.assertEqual(expected, model.rules[2].exp.firstset)
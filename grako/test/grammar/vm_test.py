@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2017      by Juancarlo Añez
+# Copyright (C) 2012-2016 by Juancarlo Añez and Thomas Bragg
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import sys
+import unittest
+
+from grako.tool import compile, parse_args
+from grako.codegen import codegen
+from grako.codegen.vm import assemble
+from grako.exceptions import FailedParse
+from grako.util import asjson, StringIO
+from grako.vm import VMParser
+
+
+GRAMMAR = r'''
+    @@comments :: /\(\*.*?\*\)/
+
+    start = {statement}+ $ ;
+
+    statement = assignment | &id call ';' | block ;
+
+    assignment = 'let' ~ name:id '=' value:expr ';' ;
+
+    call = fn:id '(' args:','.{expr} ')' ;
+
+    block = '{' @:{!'}' statement} '}' ;
+
+    expr = signed | term | nested ;
+
+    signed = sign:('-' | '+') term ;
+
+    nested = '(' @:expr ')' ;
+
+    term = !'let' (id | /\d+/ | `nil` 'nil') ;
+
+    id = /[a-z]+/ ;
+'''
+
+
+def parsers(grammar):
+    model = compile(grammar, 'Test')
+    model.inline_threshold = 0
+    module = {}
+    exec(codegen(model), module)
+    return module['TestParser'](), VMParser(assemble(model))
+
+
+class VMTests(unittest.TestCase):
+
+    def test_equivalence(self):
+        python, vm = parsers(GRAMMAR)
+        for text in [
+            'let a = 1; f(a, -2, (b)); { g(); let c = +x; } (* done *)',
+            'let b = ((-1)); { { } nil(nil, (+c)); }',
+        ]:
+            expected = python.parse(text, rule_name='start', parseinfo=False)
+            self.assertEqual(
+                asjson(expected),
+                asjson(vm.parse(text, rule_name='start', parseinfo=False))
+            )
+
+        for text in ['let = 1;', 'f(let);', 'let;', '{ f((x); }']:
+            with self.assertRaises(FailedParse) as expected:
+                python.parse(text, rule_name='start')
+            with self.assertRaises(FailedParse) as failed:
+                vm.parse(text, rule_name='start')
+            self.assertEqual(str(expected.exception), str(failed.exception))
+
+    def test_semantics(self):
+        class Semantics(object):
+            def call(self, ast):
+                return (ast.fn, len(ast.args))
+
+            def id(self, ast):
+                return ast.upper()
+
+        python, vm = parsers(GRAMMAR)
+        text = 'f(a, b); let x = 2;'
+        ast = vm.parse(text, rule_name='start', semantics=Semantics(), parseinfo=False)
+        self.assertEqual([('F', 2), ';'], ast[0])
+        self.assertEqual('X', ast[1].name)
+        self.assertEqual(
+            python.parse(text, rule_name='start', semantics=Semantics(), parseinfo=False),
+            ast
+        )
+
+    def test_deep_nesting(self):
+        python, vm = parsers(GRAMMAR)
+        depth = sys.getrecursionlimit()
+        text = 'let a = %sx%s;' % ('(' * depth, ')' * depth)
+
+        with self.assertRaises(RuntimeError):
+            python.parse(text, rule_name='start')
+        ast = vm.parse(text, rule_name='start', parseinfo=False)
+        self.assertEqual('x', ast[0].value)
+
+    def test_left_recursion(self):
+        grammar = r'''
+            @@left_recursion :: True
+
+            start = (lr | r0) $ ;
+
+            r0 = /a+/ ;
+
+            lr = lr '+' r0 | lr '-' /\d+/ | r0 ;
+        '''
+        python, vm = parsers(grammar)
+        for text in ['a+a', 'a-1+aa', 'a']:
+            self.assertEqual(
+                asjson(python.parse(text, rule_name='start', parseinfo=False)),
+                asjson(vm.parse(text, rule_name='start', parseinfo=False))
+            )
+
+        grammar = r'''
+            @@left_recursion :: True
+
+            start = e $ ;
+
+            e = e '+' t | e '-' t | t ;
+
+            t = t '*' f | f ;
+
+            f = '(' e ')' | /\d+/ ;
+        '''
+        python, vm = parsers(grammar)
+        text = '1 + 2 * 3 * (5) - 6'
+        expected = python.parse(text, rule_name='start', parseinfo=False)
+        self.assertEqual(
+            ['1', '+', ['2', '*', '3', '*', ['(', '5', ')']], '-', '6'],
+            asjson(expected)
+        )
+        self.assertEqual(asjson(expected), asjson(vm.parse(text, rule_name='start', parseinfo=False)))
+
+        for text in ['1 +', '(1 * 2', '1 + (2 - 3)']:
+            with self.assertRaises(FailedParse) as expected:
+                python.parse(text, rule_name='start')
+            with self.assertRaises(FailedParse) as failed:
+                vm.parse(text, rule_name='start')
+            self.assertEqual(str(expected.exception), str(failed.exception))
+
+    def test_generated_module(self):
+        model = compile(GRAMMAR, 'Test')
+        code = codegen(model, target='vm')
+        self.assertIn('class TestParser(VMParser):', code)
+
+        module = {}
+        exec(code, module)
+        parser = module['TestParser']()
+        self.assertEqual(
+            len(assemble(model).ops),
+            len(parser.program.ops)
+        )
+        self.assertIn('CALL', parser.program.listing())
+        self.assertEqual(
+            model.parse('f(x);', parseinfo=False),
+            parser.parse('f(x);', rule_name='start', parseinfo=False)
+        )
+
+    def test_tool_options(self):
+        def error(argv, **kwargs):
+            stderr = sys.stderr
+            sys.argv = ['grako', 'grammar.ebnf'] + argv
+            sys.stderr = StringIO()
+            try:
+                with self.assertRaises(SystemExit):
+                    parse_args(**kwargs)
+                return sys.stderr.getvalue()
+            finally:
+                sys.stderr = stderr
+
+        argv = sys.argv
+        try:
+            self.assertIn('--vm cannot be used with --cache', error(['--vm', '--cache', 'cache.json']))
+            self.assertIn('--vm cannot be used with --flat', error(['--vm', '--flat']))
+            self.assertIn('--vm cannot be used with --left-factor', error(['--vm', '--left-factor']))
+            self.assertIn(
+                '--vm cannot be used with a custom code generator',
+                error(['--vm'], codegen=lambda model: '')
+            )
+
+            sys.argv = ['grako', 'grammar.ebnf', '--vm']
+            self.assertTrue(parse_args().vm)
+        finally:
+            sys.argv = argv
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(VMTests)
+
+
+def main():
+    unittest.TextTestRunner(verbosity=2).run(suite())
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,11 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 import unittest
 
+from grako.tool import compile
+from grako.buffering import Buffer, SourceRef, TextStore
+from grako.contexts import ParseContext
 from grako.objectmodel import Node
+from grako.semantics import ModelBuilderSemantics
 
 
 class ModelTests(unittest.TestCase):
@@ -25,3 +29,54 @@ class ModelTests(unittest.TestCase):
         atom = Atom(symbol='foo')
         self.assertIsNotNone(atom.symbol)
         self.assertEqual(atom.symbol, 'foo')
+
+    def test_parents(self):
+        leaf = Node(ast={'value': 1})
+        middle = Node(ast={'items': [leaf], 'other': {'x': Node()}})
+        root = Node(ast={'child': middle})
+        self.assertIsNone(root.parent)
+        self.assertIs(root, middle.parent)
+        self.assertIs(middle, leaf.parent)
+        self.assertIs(middle, middle.other['x'].parent)
+
+        # building a deep tree doesn't revisit the subtrees
+        node = leaf
+        for _ in range(2000):
+            node = Node(ast={'child': node})
+        self.assertIs(node, node.child.parent)
+
+    def test_detach(self):
+        grammar = r'''
+            start::Seq = elements:{item}+ $ ;
+            item::Item = name:/\w+/ ;
+        '''
+        text = 'ab\ncd ef'
+        model = compile(grammar, 'Test')
+        semantics = ModelBuilderSemantics(context=ParseContext())
+        seq = model.parse(text, semantics=semantics, parseinfo=True)
+        self.assertIsNotNone(seq.ctx)
+        self.assertIsInstance(seq.parseinfo.buffer, Buffer)
+
+        seq.detach()
+        self.assertIsNone(seq.ctx)
+        self.assertIsInstance(seq.parseinfo.buffer, SourceRef)
+        self.assertEqual((0, 8), (seq.parseinfo.pos, seq.parseinfo.endpos))
+        self.assertIsNone(seq.text)
+        self.assertIsNone(seq.line)
+
+        store = TextStore()
+        seq = model.parse(
+            text,
+            semantics=semantics,
+            parseinfo=True,
+            filename='test.txt',
+            text_store=store,
+        )
+        self.assertIn('test.txt', store)
+        self.assertEqual([None, None, None], [v.ctx for v in seq.elements])
+        item = seq.elements[2]
+        self.assertEqual('ef', item.text)
+        self.assertEqual(1, item.line)
+        self.assertEqual(3, item.col)
+        self.assertEqual(['cd ef'], item.text_lines())
+        self.assertIs(seq.parseinfo.buffer, item.parseinfo.buffer)
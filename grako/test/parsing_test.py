@@ -7,7 +7,11 @@ import unittest
 
 import grako
 from grako.util import trim, eval_escapes
-from grako.grammars import EBNFBuffer
+from grako.codegen import codegen, pxd
+from grako.codegen.python import PythonCodeGenerator
+from grako.grammars import EBNFBuffer, ModelContext
+from grako.exceptions import FailedParse
+from grako._unicode_characters import C_FAILURE
 
 
 class MockIncludeBuffer(EBNFBuffer):
@@ -59,6 +63,341 @@ class ParsingTests(unittest.TestCase):
         ast = grako.parse(grammar, "test", rule_name='start')
         self.assertEqual(ast, "test")
 
+    def test_sharing(self):
+        grammar = r'''
+            start = {pair}+ $ ;
+            pair = word '=' word ';' ;
+            word = /\w+/ ;
+        '''
+
+        class Semantics(object):
+            def pair(self, ast):
+                return (ast[0], ast[2])
+
+        text = 'abc = xyz; abc = xyz; abc = uvw;'
+        model = grako.compile(grammar)
+
+        ctx = ModelContext(model.rules, intern_tokens=True, share_subtrees=True)
+        ast = model.parse(text, context=ctx, semantics=Semantics())
+        self.assertEqual([('abc', 'xyz'), ('abc', 'xyz'), ('abc', 'uvw')], ast)
+        self.assertIs(ast[0][0], ast[2][0])
+        self.assertIs(ast[0], ast[1])
+
+        stats = ctx.sharing_stats
+        self.assertEqual(3, stats.tokens)
+        self.assertEqual(3, stats.token_hits)
+        self.assertEqual(5, stats.subtrees)
+        self.assertEqual(1, stats.subtree_hits)
+        self.assertTrue(stats.saved_bytes > 0)
+
+        ast = model.parse(text, semantics=Semantics())
+        self.assertIsNot(ast[0], ast[1])
+
+    def test_compiled_rules(self):
+        grammar = '''
+            start = {item}+ $ ;
+            item = 'a' | other ;
+            other = 'b' ;
+            unused = 'c' ;
+        '''
+        model = grako.compile(grammar)
+        ctx = ModelContext(model.rules)
+        self.assertEqual(['a', 'b', 'a'], model.parse('a b a', context=ctx))
+        self.assertEqual({'start', 'item', 'other'}, set(ctx.compiled_rules))
+        self.assertIs(ctx._find_rule('item'), ctx._find_rule('item'))
+
+    def test_inlining(self):
+        grammar = '''
+            start = {item}+ $ ;
+            item = sign number | number ;
+            sign = '+' | '-' ;
+            @noinline
+            number = /\\d+/ ;
+            list = '(' {list} ')' ;
+        '''
+        model = grako.compile(grammar, 'Test')
+        self.assertIn('@noinline', model.pretty())
+        refs = {r.name: r for r in model.rules[1].exp.options[0].sequence}
+        self.assertIsNotNone(refs['sign'].inlined)
+        self.assertIsNone(refs['number'].inlined)
+        self.assertIsNone(model.rules[-1].exp.sequence[1].exp.inlined)
+
+        text = '+1 2 -3'
+        ast = model.parse(text)
+        self.assertEqual([['+', '1'], '2', ['-', '3']], ast)
+
+        class Semantics(object):
+            def sign(self, ast):
+                return 'minus' if ast == '-' else 'plus'
+
+        self.assertEqual('minus', model.parse(text, semantics=Semantics())[2][0])
+
+        code = codegen(model)
+        self.assertIn("self._inline('sign', ", code)
+        module = {}
+        exec(code, module)
+        parser = module['TestParser']()
+        self.assertEqual(ast, parser.parse(text, rule_name='start'))
+
+        model.inline_threshold = 0
+        self.assertIsNone(refs['sign'].inlined)
+        self.assertEqual(ast, model.parse(text))
+
+    def test_inlined_failures(self):
+        grammar = '''
+            start = {stmt}+ $ ;
+            stmt = a | b ;
+            a = 'x' 'y' ;
+            b = 'x' 'z' 'w' ;
+        '''
+        model = grako.compile(grammar, 'Test')
+        self.assertIsNotNone(model.rules[1].exp.options[0].inlined)
+        module = {}
+        exec(codegen(model), module)
+        parser = module['TestParser']()
+
+        def parse(text):
+            with self.assertRaises(FailedParse) as failed:
+                parser.parse(text, rule_name='start')
+            with self.assertRaises(FailedParse) as expected:
+                model.parse(text)
+            self.assertEqual(str(expected.exception), str(failed.exception))
+            return failed.exception
+
+        # the furthest failure is reported, as when the rules are called
+        e = parse('x y x q')
+        self.assertEqual(6, e.pos)
+        self.assertEqual(['a', 'stmt', 'start'], e.stack)
+
+        model.inline_threshold = 0
+        self.assertEqual(str(e), str(parse('x y x q')))
+
+    def test_hoisted_blocks(self):
+        grammar = r'''
+            start = {item}+ $ ;
+            @noinline
+            item = '(' ','.{pair} ')' ;
+            @noinline
+            pair = num [':' num] ;
+            num = /\d+/ ;
+        '''
+        code = codegen(grako.compile(grammar, 'Test'))
+        self.assertNotIn('    def block', code)
+        self.assertIn('self._positive_closure(self._start_block0', code)
+        self.assertIn('self._gather(self._item_block0, self._item_sep0)', code)
+        self.assertIn('def _item_sep0(self):', code)
+
+        module = {}
+        exec(code, module)
+        parser = module['TestParser']()
+        self.assertNotIn('item_block0', parser.rule_list())
+        ast = parser.parse('(1:2, 3) ()', rule_name='start')
+        self.assertEqual([['(', [['1', ':', '2'], '3'], ')'], ['(', [], ')']], ast)
+
+    def test_flat_codegen(self):
+        grammar = r'''
+            start = {statement}+ $ ;
+            statement = 'let' ~ id '=' expr ';' | &id call ';' | (expr) ';' ;
+            call = id '(' [expr {',' expr}] ')' ;
+            expr = [/./ &'-'] ('-' | '+') term | term ;
+            term = !'let' (id | /\d+/) ;
+            @noinline
+            id = /[a-z]+/ ;
+        '''
+        model = grako.compile(grammar, 'Test')
+
+        def parser(flat):
+            code = codegen(model, flat=flat)
+            module = {}
+            exec(code, module)
+            return code, module['TestParser']()
+
+        code, nested = parser(False)
+        self.assertIn('with self._choice():', code)
+        code, flat = parser(True)
+        self.assertNotIn('with self.', code)
+        self.assertIn('self._enter_option()', code)
+
+        for text in ['let a = 1; f(a, -2); 3;', 'f(); +-1;', 'x -1;']:
+            self.assertEqual(
+                nested.parse(text, rule_name='start', parseinfo=False),
+                flat.parse(text, rule_name='start', parseinfo=False)
+            )
+        for text in ['let = 1;', 'f(let);', 'let;']:
+            with self.assertRaises(FailedParse) as expected:
+                nested.parse(text, rule_name='start')
+            with self.assertRaises(FailedParse) as failed:
+                flat.parse(text, rule_name='start')
+            self.assertEqual(str(expected.exception), str(failed.exception))
+
+    def test_pxd_codegen(self):
+        model = grako.compile('start = id $ ; id = /[a-z]+/ ;', 'Test')
+        code = pxd.codegen(model)
+        self.assertIn('from grako.parsing cimport Parser', code)
+        self.assertIn('cdef class TestBuffer(Buffer):', code)
+        self.assertIn('cdef class TestParser(Parser):', code)
+
+        module = {}
+        exec(codegen(model), module)
+        self.assertIn('TestBuffer', module)
+        self.assertIn('TestParser', module)
+
+    def test_cached_codegen(self):
+        grammar = r'''
+            @@ignorecase :: True
+
+            start = {statement}+ $ ;
+            statement = 'let' name '=' value ';' ;
+            @noinline
+            name = /[a-z]+/ ;
+            @noinline
+            value = number | name ;
+            @noinline
+            number = /\d+/ ;
+        '''
+
+        def generate(grammar, cache=None):
+            generator = PythonCodeGenerator(cache=cache)
+            code = generator.render(grako.compile(grammar, 'Test'))
+            code = '\n'.join(line for line in code.splitlines() if 'version =' not in line)
+            return code, generator.rendered_rules
+
+        cache = {}
+        code, rendered = generate(grammar, cache)
+        self.assertEqual(5, rendered)
+        self.assertEqual(5, len(cache))
+        self.assertEqual(generate(grammar)[0], code)
+        self.assertEqual((code, 0), generate(grammar, cache))
+
+        # the new terminals come first, and the FIRST set of value
+        # changes for statement, which is inlined into start
+        changed = grammar.replace(r'/\d+/', r"'-' /\d+/ | /\d+/")
+        code, rendered = generate(changed, cache)
+        self.assertEqual(4, rendered)
+        self.assertEqual(5, len(cache))
+        self.assertEqual(generate(changed)[0], code)
+
+        module = {}
+        exec(code, module)
+        ast = module['TestParser']().parse('let a = -1; let b = a;', rule_name='start')
+        self.assertEqual([['let', 'a', '=', ['-', '1'], ';'], ['let', 'b', '=', 'a', ';']], ast)
+
+    def test_inlined_terminals(self):
+        grammar = r'''
+            @@ignorecase :: True
+
+            start = {statement}+ $ ;
+            statement = 'let' name '=' number ';' ;
+            name = /[a-z]+/ ;
+            number = /\d+/ ;
+        '''
+        code = codegen(grako.compile(grammar, 'Test'))
+        self.assertIn("self._token_re('let', RE_", code)
+        self.assertIn("self._pattern_re(RE_", code)
+        self.assertIn("terminal_options = (True, True, '')", code)
+        self.assertIn('RE_FLAGS | re.IGNORECASE', code)
+
+        module = {}
+        exec(code, module)
+        parser = module['TestParser']()
+        ast = parser.parse('LET a = 1; let B = 2;', rule_name='start')
+        self.assertTrue(parser._terminals_ok)
+        self.assertEqual([['let', 'a', '=', '1', ';'], ['let', 'B', '=', '2', ';']], ast)
+        with self.assertRaises(FailedParse):
+            parser.parse('leta = 1;', rule_name='start')
+
+        # other options fall back to matching at parse time
+        parser = module['TestParser'](nameguard=False)
+        self.assertEqual(
+            [['let', 'a', '=', '1', ';']],
+            parser.parse('leta = 1;', rule_name='start')
+        )
+        self.assertFalse(parser._terminals_ok)
+
+    def test_trace(self):
+        grammar = r'''
+            start = {number}+ $ ;
+            number = /\d+/ ;
+        '''
+        module = {}
+        exec(codegen(grako.compile(grammar, 'Test')), module)
+        parser = module['TestParser']()
+        traced = []
+        parser._trace = lambda msg, *params: traced.append(msg % params)
+
+        parser.parse('1 2', rule_name='start')
+        self.assertEqual([], traced)
+
+        parser.parse('1 2', rule_name='start', trace=True, colorize=False)
+        self.assertTrue(any('number' in t for t in traced))
+        self.assertTrue(any("'2'" in t for t in traced))
+
+    def test_trace_token_choice(self):
+        grammar = r'''
+            start = {number}+ [sign] '+' $ ;
+            sign = '++' | '+-' ;
+            number = /\d+/ ;
+        '''
+        code = codegen(grako.compile(grammar, 'Test'))
+        self.assertIn('_token_choice', code)
+        module = {}
+        exec(code, module)
+        parser = module['TestParser']()
+        traced = []
+        parser._trace = lambda msg, *params: traced.append(msg % params)
+
+        parser.parse('1 2 +', rule_name='start', trace=True, colorize=False)
+        failed = [t for t in traced if t.startswith(C_FAILURE)]
+        self.assertTrue(any("'++'" in t for t in failed))
+        self.assertTrue(any("'+-'" in t for t in failed))
+
+    def test_prepare(self):
+        grammar = r'''
+            @@whitespace :: /[\t ]+/
+            @@left_recursion :: False
+
+            start = expr $ ;
+            expr = term {'+' term} ;
+            term = /\d+/ ;
+        '''
+        model = grako.compile(grammar)
+        parser = model.prepare()
+        self.assertEqual('start', parser.start)
+        self.assertFalse(parser.left_recursion)
+
+        for text in ['1 + 2', '3', '4+5 + 6']:
+            self.assertEqual(model.parse(text), parser.parse(text))
+        self.assertEqual('7', parser.parse('7', rule_name='term'))
+
+        with self.assertRaises(FailedParse):
+            parser.parse('1 +\n2')
+
+        parser = model.prepare(start='term', parseinfo=True)
+        self.assertEqual('8', parser.parse('8'))
+
+    def test_lazy_tokens(self):
+        grammar = r'''
+            start = {pair}+ $ ;
+            pair = key:word '=' value:(number | word) ';' ;
+            word = /\w+/ ;
+            number = /\d+/ !/\w/ ;
+        '''
+        text = 'abc = 1; de = 23x; f = g;'
+        model = grako.compile(grammar)
+
+        ast = model.parse(text, lazy_tokens=True)
+        self.assertEqual(model.parse(text), ast)
+        self.assertIs(type(ast[0].key), type(''))
+        self.assertIs(type(ast[1].value), type(''))
+
+        class Semantics(object):
+            def word(self, ast):
+                assert isinstance(ast, type(''))
+                return ast.upper()
+
+        ast = model.parse(text, lazy_tokens=True, semantics=Semantics())
+        self.assertEqual(['ABC', 'DE', 'F'], [p.key for p in ast])
+
 
 def suite():
     return unittest.TestLoader().loadTestsFromTestCase(ParsingTests)
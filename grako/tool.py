@@ -8,6 +8,7 @@ the described language.
 from __future__ import absolute_import, division, print_function, unicode_literals
 import codecs
 import argparse
+import json
 import os
 import sys
 
@@ -18,7 +19,7 @@ from grako.parser import GrammarGenerator
 
 # we hook the tool to the Python code generator as the default
 from grako.codegen.python import codegen as pythoncg
-from grako.codegen import objectmodel
+from grako.codegen import objectmodel, pxd, vm
 
 DESCRIPTION = (
     'Grako (for "grammar compiler") takes a grammar'
@@ -27,7 +28,7 @@ DESCRIPTION = (
 )
 
 
-def parse_args():
+def parse_args(codegen=pythoncg):
     argparser = argparse.ArgumentParser(prog='grako',
                                         description=DESCRIPTION,
                                         add_help=False)
@@ -83,6 +84,21 @@ def parse_args():
         dest="left_recursion",
         action='store_false'
     )
+    generation_opts.add_argument(
+        '--left-factor',
+        help='factor the prefixes shared by options out of choices',
+        action='store_true'
+    )
+    generation_opts.add_argument(
+        '--flat',
+        help='generate try/except code instead of context managers',
+        action='store_true'
+    )
+    generation_opts.add_argument(
+        '--vm',
+        help='generate bytecode for the table-driven parser in grako.vm',
+        action='store_true'
+    )
     generation_opts.add_argument(
         '--name', '-m',
         metavar='NAME',
@@ -105,6 +121,16 @@ def parse_args():
         metavar='FILE',
         help='generate object model and save to FILE',
     )
+    generation_opts.add_argument(
+        '--pxd-outfile',
+        metavar='FILE',
+        help='generate Cython declarations for the parser and save to FILE',
+    )
+    generation_opts.add_argument(
+        '--cache',
+        metavar='FILE',
+        help='keep the code generated for each rule in FILE, and regenerate only the rules that changed',
+    )
     generation_opts.add_argument(
         '--whitespace', '-w',
         metavar='CHARACTERS',
@@ -128,12 +154,21 @@ def parse_args():
 
     if args.draw and not args.outfile:
         argparser.error('--draw requires --outfile')
+    if args.vm:
+        for option in ('cache', 'flat', 'left_factor'):
+            if getattr(args, option):
+                argparser.error('--vm cannot be used with --%s' % option.replace('_', '-'))
+        if codegen is not pythoncg:
+            argparser.error('--vm cannot be used with a custom code generator')
 
     return args
 
 
-def compile(grammar, name=None, **kwargs):
-    return GrammarGenerator(name, **kwargs).parse(grammar, **kwargs)
+def compile(grammar, name=None, left_factor=False, **kwargs):
+    model = GrammarGenerator(name, **kwargs).parse(grammar, **kwargs)
+    if left_factor:
+        model.left_factor()
+    return model
 
 
 __compiled_grammar_cache = {}
@@ -179,8 +214,21 @@ def save(filename, content):
         f.write(content)
 
 
+def load_cache(filename):
+    """ The rule cache saved in ``filename``, or an empty one if there
+        is none. See ``codegen.python.rule_key()``.
+    """
+    if not os.path.isfile(filename):
+        return {}
+    with codecs.open(filename, 'r', encoding='utf-8') as f:
+        try:
+            return json.load(f)
+        except ValueError:
+            return {}
+
+
 def main(codegen=pythoncg):
-    args = parse_args()
+    args = parse_args(codegen)
 
     if args.whitespace:
         args.whitespace = eval_escapes(args.whitespace)
@@ -188,11 +236,23 @@ def main(codegen=pythoncg):
     outfile = args.outfile
     prepare_for_output(outfile)
     prepare_for_output(args.object_model_outfile)
+    prepare_for_output(args.pxd_outfile)
 
     grammar = codecs.open(args.filename, 'r', encoding='utf-8').read()
 
+    cgopts = {}
+    if args.cache:
+        cgopts.update(cache=load_cache(args.cache))
+
     try:
-        model = compile(grammar, args.name, trace=args.trace, filename=args.filename, colorize=args.color)
+        model = compile(
+            grammar,
+            args.name,
+            trace=args.trace,
+            filename=args.filename,
+            colorize=args.color,
+            left_factor=args.left_factor
+        )
         model.whitespace = args.whitespace
         model.nameguard = args.nameguard
         model.left_recursion = args.left_recursion
@@ -207,17 +267,25 @@ def main(codegen=pythoncg):
                 result = model.pretty_lean()
             elif args.object_model:
                 result = objectmodel.codegen(model)
+            elif args.flat:
+                result = codegen(model, flat=True, **cgopts)
+            elif args.vm:
+                result = vm.codegen(model)
             else:
-                result = codegen(model)
+                result = codegen(model, **cgopts)
 
             if outfile:
                 save(outfile, result)
             else:
                 print(result)
+            if args.cache:
+                save(args.cache, json.dumps(cgopts['cache']))
 
         # if requested, always save it
         if args.object_model_outfile:
             save(args.object_model_outfile, objectmodel.codegen(model))
+        if args.pxd_outfile:
+            save(args.pxd_outfile, pxd.codegen(model))
 
         print('-' * 72, file=sys.stderr)
         print('{:12,d}  lines in grammar'.format(len(grammar.split())), file=sys.stderr)
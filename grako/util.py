@@ -287,6 +287,21 @@ def safe_name(name):
     return name
 
 
+def token_regex(token, nameguard=False, namechars=''):
+    """ A regex that matches ``token`` the way ``Buffer.match()`` does,
+        including the test for a name character after an alphanumeric
+        token when ``nameguard`` is set.
+    """
+    regex = re.escape(token)
+    if nameguard and token.isalnum() and token[0].isalpha():
+        namechars = ''.join(re.escape(c) for c in namechars or '')
+        if namechars:
+            regex += r'(?![^\W_]|[%s])' % namechars
+        else:
+            regex += r'(?![^\W_])'
+    return regex
+
+
 def chunks(iterable, size, fillvalue=None):
     return zip_longest(*[iter(iterable)] * size, fillvalue=fillvalue)
 
@@ -0,0 +1,625 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2017      by Juancarlo Añez
+# Copyright (C) 2012-2016 by Juancarlo Añez and Thomas Bragg
+"""
+A parser that runs grammars compiled to bytecode by ``grako.codegen.vm``.
+
+Rule calls, choices, and repetitions are executed by a loop over an
+explicit stack, so the nesting of the input is not limited by the Python
+recursion limit. The parse state is kept by the same ``ParseContext``
+methods generated parsers call, so the results are the same.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import functools
+from array import array
+
+from grako.contexts import ParseContext, Closure
+from grako.exceptions import (
+    FailedCut,
+    FailedLeftRecursion,
+    FailedParse,
+    FailedPattern,
+    FailedRef,
+    FailedSemantics,
+    ParseException,
+)
+from grako.util import re, RE_FLAGS, ustr, left_assoc, right_assoc, prune_dict
+
+
+OPCODES = (
+    'CALL',
+    'RETURN',
+    'JUMP',
+    'GUARD',
+    'TOKEN',
+    'TOKENS',
+    'PATTERN',
+    'PATTERNS',
+    'CONSTANT',
+    'EOF',
+    'VOID',
+    'FAIL',
+    'CUT',
+    'NAME',
+    'ADD_NAME',
+    'CHECK_NAME',
+    'DEFINE',
+    'CHOICE',
+    'OPTION',
+    'COMMIT',
+    'FAIL_CHOICE',
+    'END_CHOICE',
+    'GROUP',
+    'END_GROUP',
+    'IF',
+    'END_IF',
+    'IFNOT',
+    'END_IFNOT',
+    'OPEN_CLOSURE',
+    'TRY',
+    'END_TRY',
+    'WRAP',
+    'REPEAT',
+    'ISOLATE',
+    'END_ISOLATE',
+    'NEXT',
+    'CLOSE_CLOSURE',
+    'EMPTY_CLOSURE',
+    'ASSOC',
+)
+
+(
+    CALL,
+    RETURN,
+    JUMP,
+    GUARD,
+    TOKEN,
+    TOKENS,
+    PATTERN,
+    PATTERNS,
+    CONSTANT,
+    EOF,
+    VOID,
+    FAIL,
+    CUT,
+    NAME,
+    ADD_NAME,
+    CHECK_NAME,
+    DEFINE,
+    CHOICE,
+    OPTION,
+    COMMIT,
+    FAIL_CHOICE,
+    END_CHOICE,
+    GROUP,
+    END_GROUP,
+    IF,
+    END_IF,
+    IFNOT,
+    END_IFNOT,
+    OPEN_CLOSURE,
+    TRY,
+    END_TRY,
+    WRAP,
+    REPEAT,
+    ISOLATE,
+    END_ISOLATE,
+    NEXT,
+    CLOSE_CLOSURE,
+    EMPTY_CLOSURE,
+    ASSOC,
+) = range(len(OPCODES))
+
+# flags for END_ISOLATE
+ISOLATE_CUT = 1
+ISOLATE_ADD = 2
+
+# the kinds of the entries in the control stack
+(
+    K_CALL,
+    K_CHOICE,
+    K_OPTION,
+    K_GROUP,
+    K_IF,
+    K_IFNOT,
+    K_CLOSURE,
+    K_TRY,
+    K_REPEAT,
+    K_ISOLATE,
+    K_GROW,
+) = range(11)
+
+
+class RecursionGuard(object):
+    """ The memo of a rule that is being parsed at a position. ``depth``
+        is the size of the rule stack when the rule was entered.
+    """
+    __slots__ = ('depth',)
+
+    def __init__(self, depth):
+        self.depth = depth
+
+
+class Program(object):
+    """ The bytecode for the rules of a grammar.
+
+        ``ops`` and ``args`` hold one instruction per index. Depending on
+        the opcode, the argument is a jump address, a rule index, a flag,
+        or an index into ``constants`` or ``patterns``. ``rules`` holds
+        the ``(name, address, params, kwparams)`` of each rule, and
+        ``options`` the default parser options of the grammar.
+    """
+    def __init__(self,
+                 name,
+                 rules,
+                 ops,
+                 args,
+                 constants=(),
+                 patterns=(),
+                 options=None,
+                 terminal_options=None):
+        self.name = name
+        self.rules = tuple(tuple(r) for r in rules)
+        self.ops = array(str('B'), ops)
+        self.args = array(str('i'), args)
+        self.constants = tuple(constants)
+        self.patterns = tuple(patterns)
+        self.options = dict(options or {})
+        self.terminal_options = terminal_options
+        self.rule_index = {r[0]: i for i, r in enumerate(self.rules)}
+
+        ignorecase = terminal_options is not None and terminal_options[0]
+        flags = RE_FLAGS | (re.IGNORECASE if ignorecase else 0)
+        self.regexes = tuple(re.compile(p, flags) for p in self.patterns)
+
+    def __len__(self):
+        return len(self.ops)
+
+    def listing(self):
+        """ The instructions of the program, one per line.
+        """
+        starts = {r[1]: r[0] for r in self.rules}
+        lines = []
+        for pc, (op, arg) in enumerate(zip(self.ops, self.args)):
+            if pc in starts:
+                lines.append('%s:' % starts[pc])
+            lines.append('%6d  %-14s%d' % (pc, OPCODES[op], arg))
+        return '\n'.join(lines)
+
+
+class VMParser(ParseContext):
+    """ A parser that executes a ``Program``. The options of the program
+        are the defaults for the keyword arguments.
+    """
+    program = None
+
+    def __init__(self, program=None, **kwargs):
+        if program is not None:
+            self.program = program
+        options = dict(self.program.options)
+        options.update(kwargs)
+        super(VMParser, self).__init__(**options)
+        self.terminal_options = self.program.terminal_options
+        self._vm_stack = []
+        self._vm_result = None
+
+    def rule_list(self):
+        return [r[0] for r in self.program.rules]
+
+    def _find_rule(self, name):
+        index = self.program.rule_index.get(name)
+        if index is None:
+            self._error(name, etype=FailedRef)
+        return functools.partial(self._run, index)
+
+    def _run(self, index):
+        if self.handler is not None:
+            raise ParseException('VM parsers do not deliver parse events')
+        program = self.program
+        ops = program.ops
+        args = program.args
+        handlers = self._handlers
+
+        self._vm_stack = []
+        pc = self._enter_rule(index, -1)
+        while True:
+            try:
+                while pc >= 0:
+                    pc = handlers[ops[pc]](self, args[pc], pc)
+                return self._vm_result
+            except FailedParse as e:
+                pc = self._unwind(e)
+
+    def _unwind(self, e):
+        """ Undo the frames entered since the innermost entry that can
+            handle ``e``, and return the address to continue at.
+        """
+        stack = self._vm_stack
+        while stack:
+            entry = stack.pop()
+            kind = entry[0]
+            if kind == K_CALL:
+                growth = entry[6]
+                if growth is not None:
+                    # a failed attempt to grow a left-recursive result
+                    self._set_furthest_exception(e)
+                    if self._memoization():
+                        self._memoization_cache[entry[4]] = e
+                    self._pop_ast()
+                    return self._grow(growth)
+                e = self._fail_rule(entry, e)
+            elif kind == K_OPTION:
+                try:
+                    self._undo_option(e)
+                except FailedParse as x:
+                    e = x
+                else:
+                    return entry[1]
+            elif kind == K_CHOICE:
+                self._undo_choice()
+            elif kind == K_TRY:
+                self._undo_frame()
+            elif kind == K_ISOLATE:
+                self._undo_frame()
+                self._pop_cst()
+            elif kind == K_REPEAT:
+                cut = self._is_cut_set()
+                self._pop_cut()
+                if isinstance(e, FailedCut):
+                    pass
+                elif cut:
+                    e = FailedCut(e)
+                else:
+                    return entry[1]
+            elif kind == K_CLOSURE:
+                self._pop_cst()
+            elif kind == K_GROUP:
+                self._undo_group()
+            elif kind == K_IF:
+                self._leave_if()
+            elif kind == K_IFNOT:
+                self._leave_ifnot(e)
+                return entry[1]
+        raise e
+
+    def _enter_rule(self, index, resume):
+        self._rule_stack.append(self.program.rules[index][0])
+        callpos = self._pos
+        if self.trace:
+            self._trace_entry()
+        self._last_node = None
+        return self._invoke(index, resume, callpos, None)
+
+    def _invoke(self, index, resume, callpos, growth):
+        """ Start parsing rule ``index``. With ``growth``, the rule is
+            parsed again to grow a left-recursive result, and the outcome
+            goes back to ``_grow()``.
+        """
+        name, address = self.program.rules[index][:2]
+        if name[0].islower():
+            self._next_token()
+
+        pos = self._pos
+        key = (pos, index, self._state)
+        cache = self._memoization_cache
+        memo = cache.get(key)
+        if isinstance(memo, RecursionGuard):
+            memo = FailedLeftRecursion(
+                self._buffer,
+                list(reversed(self._rule_stack[:memo.depth])),
+                name
+            )
+        if isinstance(memo, FailedLeftRecursion):
+            memo = self._left_recursion_check(name, key, memo)
+        if memo is not None:
+            if growth is not None:
+                if not isinstance(memo, Exception):
+                    growth[2] = memo
+                return self._grow(growth)
+            elif isinstance(memo, Exception):
+                raise self._rule_failed(name, callpos, memo)
+            return self._leave_rule(name, memo, resume)
+
+        if self._memoization():
+            cache[key] = RecursionGuard(len(self._rule_stack))
+        self._push_ast()
+        self._vm_stack.append((K_CALL, resume, index, callpos, key, pos, growth))
+        return address
+
+    def _return(self, entry, result):
+        _, resume, index, _, key, _, growth = entry
+        if self._memoization() and not self._in_recursive_loop():
+            self._memoization_cache[key] = result
+        self._vm_stack.pop()
+        self._pop_ast()
+        if growth is not None:
+            growth[2] = result
+            return self._grow(growth)
+        return self._leave_rule(self.program.rules[index][0], result, resume)
+
+    def _grow(self, growth):
+        """ A step of the loop in ``ParseContext._left_recurse()``: parse
+            the rule again while that consumes more input.
+        """
+        _, entry, result, _, last_pos = growth
+        pos = entry[5]
+        if self._pos > last_pos:
+            growth[3] = result
+            growth[4] = self._pos
+            self._goto(pos)
+            prune_dict(
+                self._memoization_cache,
+                lambda _, v: isinstance(v, (FailedParse, RecursionGuard))
+            )
+            return self._invoke(entry[2], -1, pos, growth)
+
+        self._recursive_results = dict()
+        self._recursive_head.pop()
+        self._recursive_eval.pop()
+        self._vm_stack.pop()
+        return self._return(entry, growth[3])
+
+    def _leave_rule(self, name, result, resume):
+        node, newpos, newstate = result
+        self._goto(newpos)
+        self._state = newstate
+        self._add_cst_node(node)
+        self._last_node = node
+        if self.trace:
+            self._trace_success()
+        self._rule_stack.pop()
+        if resume < 0:
+            self._vm_result = node
+        return resume
+
+    def _fail_rule(self, entry, e):
+        _, _, index, callpos, key, _, _ = entry
+        self._set_furthest_exception(e)
+        if self._memoization():
+            self._memoization_cache[key] = e
+        self._pop_ast()
+        return self._rule_failed(self.program.rules[index][0], callpos, e)
+
+    def _rule_failed(self, name, callpos, e):
+        if isinstance(e, FailedPattern):
+            e = FailedParse(
+                self._buffer,
+                list(reversed(self._rule_stack[:])),
+                'Expecting <%s>' % name
+            )
+        else:
+            self._goto(callpos)
+            self._set_furthest_exception(e)
+            if self.trace:
+                if isinstance(e, FailedLeftRecursion):
+                    self._trace_recursion()
+                else:
+                    self._trace_failure()
+        self._rule_stack.pop()
+        return e
+
+    def _op_call(self, index, pc):
+        return self._enter_rule(index, pc + 1)
+
+    def _op_return(self, arg, pc):
+        entry = self._vm_stack[-1]
+        _, _, index, _, key, pos, _ = entry
+        name, _, params, kwparams = self.program.rules[index]
+
+        node = self.ast
+        if not node:
+            node = self.cst
+        elif '@' in node:
+            node = node['@']  # override the AST
+        elif self.parseinfo:
+            node.set_parseinfo(self._get_parseinfo(name, pos))
+        try:
+            node = self._invoke_semantic_rule(name, node, params, kwparams)
+        except FailedSemantics as e:
+            self._error(ustr(e), FailedParse)
+        if self.share_subtrees:
+            node = self._share(node)
+
+        result = (node, self._pos, self._state)
+        if self._memoization():
+            self._recursive_results[key] = result
+
+        head = self._recursive_head[-1:]
+        if head == [name] and head != self._recursive_eval[-1:]:
+            # the head of a left recursion: grow the seed
+            self._recursive_eval.append(name)
+            growth = [K_GROW, entry, result, result, pos]
+            self._vm_stack.append(growth)
+            return self._grow(growth)
+        return self._return(entry, result)
+
+    def _op_jump(self, address, pc):
+        return address
+
+    def _op_guard(self, arg, pc):
+        # the next instruction jumps over the guarded expression
+        raw, ws = self.program.constants[arg]
+        return pc + 2 if self._guard(raw, ws) else pc + 1
+
+    def _op_token(self, arg, pc):
+        token, regex = self.program.constants[arg]
+        self._token_re(token, self.program.regexes[regex])
+        return pc + 1
+
+    def _op_tokens(self, arg, pc):
+        tokens, message = self.program.constants[arg]
+        self._token_choice(tokens, message)
+        return pc + 1
+
+    def _op_pattern(self, regex, pc):
+        self._pattern_re(self.program.regexes[regex])
+        return pc + 1
+
+    def _op_patterns(self, arg, pc):
+        regex, message = self.program.constants[arg]
+        self._pattern_choice_re(self.program.regexes[regex], message)
+        return pc + 1
+
+    def _op_constant(self, arg, pc):
+        self._constant(self.program.constants[arg])
+        return pc + 1
+
+    def _op_eof(self, arg, pc):
+        self._check_eof()
+        return pc + 1
+
+    def _op_void(self, arg, pc):
+        self._void()
+        return pc + 1
+
+    def _op_fail(self, arg, pc):
+        self._fail()
+
+    def _op_cut(self, arg, pc):
+        self._cut()
+        return pc + 1
+
+    def _op_name(self, arg, pc):
+        self.name_last_node(self.program.constants[arg])
+        return pc + 1
+
+    def _op_add_name(self, arg, pc):
+        self.add_last_node_to_name(self.program.constants[arg])
+        return pc + 1
+
+    def _op_check_name(self, arg, pc):
+        try:
+            self._check_name()
+        except FailedSemantics as e:
+            self._error(ustr(e), FailedParse)
+        return pc + 1
+
+    def _op_define(self, arg, pc):
+        keys, list_keys = self.program.constants[arg]
+        self.ast._define(list(keys), list(list_keys))
+        return pc + 1
+
+    def _op_choice(self, arg, pc):
+        self._enter_choice()
+        self._vm_stack.append((K_CHOICE,))
+        return pc + 1
+
+    def _op_option(self, address, pc):
+        self._enter_option()
+        self._vm_stack.append((K_OPTION, address))
+        return pc + 1
+
+    def _op_commit(self, address, pc):
+        self._vm_stack.pop()
+        self._commit_option()
+        return address
+
+    def _op_fail_choice(self, arg, pc):
+        self._error(self.program.constants[arg])
+
+    def _op_end_choice(self, arg, pc):
+        self._vm_stack.pop()
+        self._commit_choice()
+        return pc + 1
+
+    def _op_group(self, arg, pc):
+        self._enter_group()
+        self._vm_stack.append((K_GROUP,))
+        return pc + 1
+
+    def _op_end_group(self, arg, pc):
+        self._vm_stack.pop()
+        self._commit_group()
+        return pc + 1
+
+    def _op_if(self, arg, pc):
+        self._enter_if()
+        self._vm_stack.append((K_IF,))
+        return pc + 1
+
+    def _op_end_if(self, arg, pc):
+        self._vm_stack.pop()
+        self._leave_if()
+        return pc + 1
+
+    def _op_ifnot(self, address, pc):
+        self._enter_if()
+        self._vm_stack.append((K_IFNOT, address))
+        return pc + 1
+
+    def _op_end_ifnot(self, arg, pc):
+        self._vm_stack.pop()
+        self._leave_ifnot()
+
+    def _op_open_closure(self, positive, pc):
+        self._push_cst()
+        self.cst = None if positive else []
+        self._vm_stack.append((K_CLOSURE,))
+        return pc + 1
+
+    def _op_try(self, arg, pc):
+        self._enter_frame()
+        self._vm_stack.append((K_TRY,))
+        return pc + 1
+
+    def _op_end_try(self, arg, pc):
+        self._vm_stack.pop()
+        self._commit_frame()
+        return pc + 1
+
+    def _op_wrap(self, arg, pc):
+        self.cst = [self.cst]
+        return pc + 1
+
+    def _op_repeat(self, address, pc):
+        self._push_cut()
+        self._vm_stack.append((K_REPEAT, address, self._pos))
+        return pc + 1
+
+    def _op_isolate(self, arg, pc):
+        self._push_cst()
+        self._enter_frame()
+        self._vm_stack.append((K_ISOLATE,))
+        return pc + 1
+
+    def _op_end_isolate(self, flags, pc):
+        self._vm_stack.pop()
+        cst = self.cst
+        self._commit_frame()
+        self._pop_cst()
+        if flags & ISOLATE_CUT:
+            self._cut()
+        if flags & ISOLATE_ADD:
+            self._add_cst_node(cst)
+        return pc + 1
+
+    def _op_next(self, address, pc):
+        if self._pos == self._vm_stack[-1][2]:
+            self._error('empty closure')
+        self._vm_stack.pop()
+        self._pop_cut()
+        return address
+
+    def _op_close_closure(self, arg, pc):
+        self._vm_stack.pop()
+        cst = Closure(self.cst)
+        self._pop_cst()
+        self._add_cst_node(cst)
+        self.last_node = cst
+        return pc + 1
+
+    def _op_empty_closure(self, arg, pc):
+        self._empty_closure()
+        return pc + 1
+
+    def _op_assoc(self, right, pc):
+        assoc = right_assoc if right else left_assoc
+        self.cst = assoc(self.last_node)
+        self.last_node = self.cst
+        return pc + 1
+
+
+VMParser._handlers = tuple(
+    getattr(VMParser, '_op_' + name.lower()) for name in OPCODES
+)
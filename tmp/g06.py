@@ -0,0 +1,1580 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# CAVEAT UTILITOR
+#
+# This file was automatically generated by Grako.
+#
+#    https://pypi.python.org/pypi/grako/
+#
+# Any changes you make to it will be overwritten the next time
+# the file is generated.
+
+
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from grako.buffering import Buffer
+from grako.parsing import graken, Parser
+from grako.util import re, RE_FLAGS, generic_main  # noqa
+
+
+KEYWORDS = {}
+
+RE_0 = re.compile('@@', RE_FLAGS)
+RE_1 = re.compile('keyword(?![^\\W_])', RE_FLAGS)
+RE_2 = re.compile('::', RE_FLAGS)
+RE_3 = re.compile('grammar(?![^\\W_])', RE_FLAGS)
+RE_4 = re.compile(r'(?!\d)\w+', RE_FLAGS)
+RE_5 = re.compile('namechars(?![^\\W_])', RE_FLAGS)
+RE_6 = re.compile('@@keyword', RE_FLAGS)
+RE_7 = re.compile(r'0[xX](\d|[a-fA-F])+', RE_FLAGS)
+RE_8 = re.compile(r'[-+]?(?:\d+\.\d*|\d*\.\d+)(?:[Ee][-+]?\d+)?', RE_FLAGS)
+RE_9 = re.compile(r'[-+]?\d+', RE_FLAGS)
+RE_10 = re.compile('\\(', RE_FLAGS)
+RE_11 = re.compile(',', RE_FLAGS)
+RE_12 = re.compile('\\)', RE_FLAGS)
+RE_13 = re.compile('<', RE_FLAGS)
+RE_14 = re.compile('=', RE_FLAGS)
+RE_15 = re.compile(';', RE_FLAGS)
+RE_16 = re.compile('@', RE_FLAGS)
+RE_17 = re.compile(r'(?!\d)\w+(::(?!\d)\w+)+', RE_FLAGS)
+RE_18 = re.compile('\\|', RE_FLAGS)
+RE_19 = re.compile('>', RE_FLAGS)
+RE_20 = re.compile('\\+:', RE_FLAGS)
+RE_21 = re.compile(':', RE_FLAGS)
+RE_22 = re.compile('@\\+:', RE_FLAGS)
+RE_23 = re.compile('@:', RE_FLAGS)
+RE_24 = re.compile('\\.\\{', RE_FLAGS)
+RE_25 = re.compile('\\}', RE_FLAGS)
+RE_26 = re.compile('\\*', RE_FLAGS)
+RE_27 = re.compile('%\\{', RE_FLAGS)
+RE_28 = re.compile('<\\{', RE_FLAGS)
+RE_29 = re.compile('>\\{', RE_FLAGS)
+RE_30 = re.compile('\\{', RE_FLAGS)
+RE_31 = re.compile('\\[', RE_FLAGS)
+RE_32 = re.compile('\\]', RE_FLAGS)
+RE_33 = re.compile('\\?\\(', RE_FLAGS)
+RE_34 = re.compile(r'.*?(?!\)\?)', RE_FLAGS)
+RE_35 = re.compile('\\)\\?', RE_FLAGS)
+RE_36 = re.compile('\\&', RE_FLAGS)
+RE_37 = re.compile('!', RE_FLAGS)
+RE_38 = re.compile('\\(\\)', RE_FLAGS)
+RE_39 = re.compile('\\~', RE_FLAGS)
+RE_40 = re.compile('>>', RE_FLAGS)
+RE_41 = re.compile(r'`', RE_FLAGS)
+RE_42 = re.compile('r(?![^\\W_])', RE_FLAGS)
+RE_43 = re.compile('"', RE_FLAGS)
+RE_44 = re.compile(r'([^"\n]|\\"|\\\\)*', RE_FLAGS)
+RE_45 = re.compile("'", RE_FLAGS)
+RE_46 = re.compile(r"([^'\n]|\\'|\\\\)*", RE_FLAGS)
+RE_47 = re.compile('\\+', RE_FLAGS)
+RE_48 = re.compile('/', RE_FLAGS)
+RE_49 = re.compile(r'([^/\\]|\\/|\\.)+', RE_FLAGS)
+RE_50 = re.compile('\\?/', RE_FLAGS)
+RE_51 = re.compile(r'(.|\n)+?(?=/\?)', RE_FLAGS)
+RE_52 = re.compile(r'/\?+', RE_FLAGS)
+RE_53 = re.compile('\\?', RE_FLAGS)
+RE_54 = re.compile('\\$', RE_FLAGS)
+
+PREDICT_0 = ({'(': 1, ':': 0}, True, None, None)
+PREDICT_1 = ({'"': 1, "'": 1, '(': 0, '/': 3, '?': 3, '`': 2, 'r': 1}, True, None, None)
+PREDICT_2 = ({'"': 0, "'": 0, 'r': 1}, True, None, None)
+PREDICT_3 = ({'"': 0, "'": 1}, True, None, None)
+
+
+class EBNFBootstrapBuffer(Buffer):
+    def __init__(
+        self,
+        text,
+        whitespace=None,
+        nameguard=None,
+        comments_re='\\(\\*((?:.|\\n)*?)\\*\\)',
+        eol_comments_re='#([^\\n]*?)$',
+        ignorecase=None,
+        namechars='',
+        **kwargs
+    ):
+        super(EBNFBootstrapBuffer, self).__init__(
+            text,
+            whitespace=whitespace,
+            nameguard=nameguard,
+            comments_re=comments_re,
+            eol_comments_re=eol_comments_re,
+            ignorecase=ignorecase,
+            namechars=namechars,
+            **kwargs
+        )
+
+
+class EBNFBootstrapParser(Parser):
+    terminal_options = (False, True, '')
+
+    def __init__(
+        self,
+        whitespace=None,
+        nameguard=None,
+        comments_re='\\(\\*((?:.|\\n)*?)\\*\\)',
+        eol_comments_re='#([^\\n]*?)$',
+        ignorecase=None,
+        left_recursion=False,
+        parseinfo=True,
+        keywords=None,
+        namechars='',
+        buffer_class=EBNFBootstrapBuffer,
+        **kwargs
+    ):
+        if keywords is None:
+            keywords = KEYWORDS
+        super(EBNFBootstrapParser, self).__init__(
+            whitespace=whitespace,
+            nameguard=nameguard,
+            comments_re=comments_re,
+            eol_comments_re=eol_comments_re,
+            ignorecase=ignorecase,
+            left_recursion=left_recursion,
+            parseinfo=parseinfo,
+            keywords=keywords,
+            namechars=namechars,
+            buffer_class=buffer_class,
+            **kwargs
+        )
+
+    @graken()
+    def _start_(self):
+        self._grammar_()
+
+    @graken('Grammar')
+    def _grammar_(self):
+        self._constant('GRAKO')
+        self.name_last_node('title')
+        self._closure(self._grammar_block2, guard=(None, '[@]'))
+        self.name_last_node('directives')
+        self._keywords_()
+        self.name_last_node('keywords')
+        self._positive_closure(self._grammar_block5)
+        self.name_last_node('rules')
+        self._check_eof()
+        self.ast._define(
+            ['directives', 'keywords', 'rules', 'title'],
+            []
+        )
+
+    def _grammar_block2(self):
+        self._directive_()
+
+    def _grammar_block5(self):
+        self._rule_()
+
+    @graken()
+    def _directive_(self):
+        self._token_re('@@', RE_0)
+        if self._guard(None, '[k]'):
+            with self._ifnot():
+                self._token_re('keyword', RE_1)
+        self._cut()
+        with self._group():
+            with self._choice():
+                if self._guard(None, '[cew]'):
+                    with self._option():
+                        with self._group():
+                            self._token_choice(('comments', 'eol_comments', 'whitespace',), 'expecting one of: comments eol_comments whitespace')
+                        self.name_last_node('name')
+                        self._cut()
+                        self._cut()
+                        self._token_re('::', RE_2)
+                        self._cut()
+                        self._regex_()
+                        self.name_last_node('value')
+                if self._guard(None, '[ilnp]'):
+                    with self._option():
+                        with self._group():
+                            self._token_choice(('nameguard', 'ignorecase', 'left_recursion', 'parseinfo',), 'expecting one of: ignorecase left_recursion nameguard parseinfo')
+                        self.name_last_node('name')
+                        self._cut()
+                        with self._group():
+                            with self._choice():
+                                if self._guard(None, '[:]'):
+                                    with self._option():
+                                        self._token_re('::', RE_2)
+                                        self._cut()
+                                        self._inline('boolean', self._directive_inline4)
+                                        self.name_last_node('value')
+                                with self._option():
+                                    self._constant('True')
+                                    self.name_last_node('value')
+                                self._error('expecting one of: ::')
+                if self._guard(None, '[g]'):
+                    with self._option():
+                        with self._group():
+                            self._token_re('grammar', RE_3)
+                        self.name_last_node('name')
+                        self._cut()
+                        self._token_re('::', RE_2)
+                        self._cut()
+                        self._inline('word', self._directive_inline8)
+                        self.name_last_node('value')
+                if self._guard(None, '[n]'):
+                    with self._option():
+                        with self._group():
+                            self._token_re('namechars', RE_5)
+                        self.name_last_node('name')
+                        self._cut()
+                        self._token_re('::', RE_2)
+                        self._cut()
+                        self._inline('string', self._directive_inline11)
+                        self.name_last_node('value')
+                self._error('expecting one of: comments eol_comments grammar ignorecase left_recursion namechars nameguard parseinfo whitespace')
+        self.ast._define(
+            ['name', 'value'],
+            []
+        )
+
+    def _directive_inline4(self):
+        self._token_choice(('True', 'False',), 'expecting one of: False True')
+
+    def _directive_inline8(self):
+        self._pattern_re(RE_4)
+
+    def _directive_inline11(self):
+        self._STRING_()
+
+    @graken()
+    def _keywords_(self):
+        self._closure(self._keywords_block0, guard=(None, '[@]'))
+
+    def _keywords_block0(self):
+        self._token_re('@@keyword', RE_6)
+        self._cut()
+        self._token_re('::', RE_2)
+        self._cut()
+        self._closure(self._keywords_block1)
+
+    def _keywords_block1(self):
+        self._inline('literal', self._keywords_inline3)
+        self.add_last_node_to_name('@')
+        if self._guard(None, '[:=]'):
+            with self._ifnot():
+                with self._group():
+                    self._token_choice((':', '=',), 'expecting one of: : =')
+
+    def _keywords_inline3(self):
+        with self._choice():
+            if self._guard(None, '["\']'):
+                with self._option():
+                    self._inline('string', self._keywords_inline4)
+            if self._guard(None, '[r]'):
+                with self._option():
+                    self._raw_string_()
+            with self._option():
+                self._inline('word', self._keywords_inline5)
+            if self._guard(None, '[0]'):
+                with self._option():
+                    self._inline('hex', self._keywords_inline6)
+            if self._guard(None, '[\\+\\-\\.]|[\\d]'):
+                with self._option():
+                    self._inline('float', self._keywords_inline7)
+            if self._guard(None, '[\\+\\-]|[\\d]'):
+                with self._option():
+                    self._inline('int', self._keywords_inline8)
+            self._error('expecting one of: " \' (?!\\d)\\w+ 0[xX](\\d|[a-fA-F])+ [-+]?(?:\\d+\\.\\d*|\\d*\\.\\d+)(?:[Ee][-+]?\\d+)? [-+]?\\d+ r')
+
+    def _keywords_inline4(self):
+        self._STRING_()
+
+    def _keywords_inline5(self):
+        self._pattern_re(RE_4)
+
+    def _keywords_inline6(self):
+        self._pattern_re(RE_7)
+
+    def _keywords_inline7(self):
+        self._pattern_re(RE_8)
+
+    def _keywords_inline8(self):
+        self._pattern_re(RE_9)
+
+    @graken()
+    def _paramdef_(self):
+        with self._choice():
+            option = self._predict(PREDICT_0)
+            if option == 0:
+                with self._predicted_option('expecting one of: ( ::'):
+                    self._token_re('::', RE_2)
+                    self._cut()
+                    self._params_()
+                    self.name_last_node('params')
+            elif option == 1:
+                with self._predicted_option('expecting one of: ( ::'):
+                    self._token_re('(', RE_10)
+                    self._cut()
+                    with self._group():
+                        with self._choice():
+                            with self._option():
+                                self._inline('kwparams', self._paramdef_inline2)
+                                self.name_last_node('kwparams')
+                            with self._option():
+                                self._params_()
+                                self.name_last_node('params')
+                                self._token_re(',', RE_11)
+                                self._cut()
+                                self._inline('kwparams', self._paramdef_inline6)
+                                self.name_last_node('kwparams')
+                            with self._option():
+                                self._params_()
+                                self.name_last_node('params')
+                            self._error('expecting one of: " \' (?!\\d)\\w+ (?!\\d)\\w+(::(?!\\d)\\w+)+ 0[xX](\\d|[a-fA-F])+ [-+]?(?:\\d+\\.\\d*|\\d*\\.\\d+)(?:[Ee][-+]?\\d+)? [-+]?\\d+ r')
+                    self._token_re(')', RE_12)
+            else:
+                self._error('expecting one of: ( ::')
+        self.ast._define(
+            ['kwparams', 'params'],
+            []
+        )
+
+    def _paramdef_inline2(self):
+        self._positive_gather(self._paramdef_block3, self._paramdef_sep3)
+
+    def _paramdef_sep3(self):
+        self._token_re(',', RE_11)
+
+    def _paramdef_block3(self):
+        self._pair_()
+
+    def _paramdef_inline6(self):
+        self._positive_gather(self._paramdef_block7, self._paramdef_sep7)
+
+    def _paramdef_sep7(self):
+        self._token_re(',', RE_11)
+
+    def _paramdef_block7(self):
+        self._pair_()
+
+    @graken('Rule')
+    def _rule_(self):
+        self._closure(self._rule_block1, guard=(None, '[@]'))
+        self.name_last_node('decorators')
+        self._inline('name', self._rule_inline3)
+        self.name_last_node('name')
+        self._cut()
+        if self._guard(None, '[\\(:]'):
+            with self._optional():
+                with self._choice():
+                    option = self._predict(PREDICT_0)
+                    if option == 0:
+                        with self._predicted_option('expecting one of: ( ::'):
+                            self._token_re('::', RE_2)
+                            self._cut()
+                            self._params_()
+                            self.name_last_node('params')
+                    elif option == 1:
+                        with self._predicted_option('expecting one of: ( ::'):
+                            self._token_re('(', RE_10)
+                            self._cut()
+                            with self._group():
+                                with self._choice():
+                                    with self._option():
+                                        self._inline('kwparams', self._rule_inline7)
+                                        self.name_last_node('kwparams')
+                                    with self._option():
+                                        self._params_()
+                                        self.name_last_node('params')
+                                        self._token_re(',', RE_11)
+                                        self._cut()
+                                        self._inline('kwparams', self._rule_inline11)
+                                        self.name_last_node('kwparams')
+                                    with self._option():
+                                        self._params_()
+                                        self.name_last_node('params')
+                                    self._error('expecting one of: " \' (?!\\d)\\w+ (?!\\d)\\w+(::(?!\\d)\\w+)+ 0[xX](\\d|[a-fA-F])+ [-+]?(?:\\d+\\.\\d*|\\d*\\.\\d+)(?:[Ee][-+]?\\d+)? [-+]?\\d+ r')
+                            self._token_re(')', RE_12)
+                    else:
+                        self._error('expecting one of: ( ::')
+        else:
+            self._void()
+        if self._guard(None, '[<]'):
+            with self._optional():
+                self._token_re('<', RE_13)
+                self._cut()
+                self._inline('known_name', self._rule_inline15)
+                self.name_last_node('base')
+        else:
+            self._void()
+        self._token_re('=', RE_14)
+        self._cut()
+        self._expre_()
+        self.name_last_node('exp')
+        self._token_re(';', RE_15)
+        self._cut()
+        self.ast._define(
+            ['base', 'decorators', 'exp', 'kwparams', 'name', 'params'],
+            []
+        )
+
+    def _rule_block1(self):
+        self._decorator_()
+
+    def _rule_inline3(self):
+        self._inline('word', self._rule_inline4)
+
+    def _rule_inline4(self):
+        self._pattern_re(RE_4)
+
+    def _rule_inline7(self):
+        self._positive_gather(self._rule_block8, self._rule_sep8)
+
+    def _rule_sep8(self):
+        self._token_re(',', RE_11)
+
+    def _rule_block8(self):
+        self._pair_()
+
+    def _rule_inline11(self):
+        self._positive_gather(self._rule_block12, self._rule_sep12)
+
+    def _rule_sep12(self):
+        self._token_re(',', RE_11)
+
+    def _rule_block12(self):
+        self._pair_()
+
+    def _rule_inline15(self):
+        self._inline('name', self._rule_inline16)
+        self._cut()
+
+    def _rule_inline16(self):
+        self._inline('word', self._rule_inline17)
+
+    def _rule_inline17(self):
+        self._pattern_re(RE_4)
+
+    @graken()
+    def _decorator_(self):
+        self._token_re('@', RE_16)
+        self._cut()
+        with self._group():
+            self._token_choice(('override', 'name', 'noinline',), 'expecting one of: name noinline override')
+        self.name_last_node('@')
+
+    @graken()
+    def _params_(self):
+        self._inline('first_param', self._params_inline1)
+        self.add_last_node_to_name('@')
+        self._closure(self._params_block9, guard=(None, '[,]'))
+
+    def _params_inline1(self):
+        with self._choice():
+            with self._option():
+                self._inline('path', self._params_inline2)
+            with self._option():
+                self._inline('literal', self._params_inline3)
+            self._error('expecting one of: " \' (?!\\d)\\w+ (?!\\d)\\w+(::(?!\\d)\\w+)+ 0[xX](\\d|[a-fA-F])+ [-+]?(?:\\d+\\.\\d*|\\d*\\.\\d+)(?:[Ee][-+]?\\d+)? [-+]?\\d+ r')
+
+    def _params_inline2(self):
+        self._pattern_re(RE_17)
+
+    def _params_inline3(self):
+        with self._choice():
+            if self._guard(None, '["\']'):
+                with self._option():
+                    self._inline('string', self._params_inline4)
+            if self._guard(None, '[r]'):
+                with self._option():
+                    self._raw_string_()
+            with self._option():
+                self._inline('word', self._params_inline5)
+            if self._guard(None, '[0]'):
+                with self._option():
+                    self._inline('hex', self._params_inline6)
+            if self._guard(None, '[\\+\\-\\.]|[\\d]'):
+                with self._option():
+                    self._inline('float', self._params_inline7)
+            if self._guard(None, '[\\+\\-]|[\\d]'):
+                with self._option():
+                    self._inline('int', self._params_inline8)
+            self._error('expecting one of: " \' (?!\\d)\\w+ 0[xX](\\d|[a-fA-F])+ [-+]?(?:\\d+\\.\\d*|\\d*\\.\\d+)(?:[Ee][-+]?\\d+)? [-+]?\\d+ r')
+
+    def _params_inline4(self):
+        self._STRING_()
+
+    def _params_inline5(self):
+        self._pattern_re(RE_4)
+
+    def _params_inline6(self):
+        self._pattern_re(RE_7)
+
+    def _params_inline7(self):
+        self._pattern_re(RE_8)
+
+    def _params_inline8(self):
+        self._pattern_re(RE_9)
+
+    def _params_block9(self):
+        self._token_re(',', RE_11)
+        self._inline('literal', self._params_inline11)
+        self.add_last_node_to_name('@')
+        if self._guard(None, '[=]'):
+            with self._ifnot():
+                self._token_re('=', RE_14)
+        self._cut()
+
+    def _params_inline11(self):
+        with self._choice():
+            if self._guard(None, '["\']'):
+                with self._option():
+                    self._inline('string', self._params_inline12)
+            if self._guard(None, '[r]'):
+                with self._option():
+                    self._raw_string_()
+            with self._option():
+                self._inline('word', self._params_inline13)
+            if self._guard(None, '[0]'):
+                with self._option():
+                    self._inline('hex', self._params_inline14)
+            if self._guard(None, '[\\+\\-\\.]|[\\d]'):
+                with self._option():
+                    self._inline('float', self._params_inline15)
+            if self._guard(None, '[\\+\\-]|[\\d]'):
+                with self._option():
+                    self._inline('int', self._params_inline16)
+            self._error('expecting one of: " \' (?!\\d)\\w+ 0[xX](\\d|[a-fA-F])+ [-+]?(?:\\d+\\.\\d*|\\d*\\.\\d+)(?:[Ee][-+]?\\d+)? [-+]?\\d+ r')
+
+    def _params_inline12(self):
+        self._STRING_()
+
+    def _params_inline13(self):
+        self._pattern_re(RE_4)
+
+    def _params_inline14(self):
+        self._pattern_re(RE_7)
+
+    def _params_inline15(self):
+        self._pattern_re(RE_8)
+
+    def _params_inline16(self):
+        self._pattern_re(RE_9)
+
+    @graken()
+    def _first_param_(self):
+        with self._choice():
+            with self._option():
+                self._inline('path', self._first_param_inline0)
+            with self._option():
+                self._inline('literal', self._first_param_inline1)
+            self._error('expecting one of: " \' (?!\\d)\\w+ (?!\\d)\\w+(::(?!\\d)\\w+)+ 0[xX](\\d|[a-fA-F])+ [-+]?(?:\\d+\\.\\d*|\\d*\\.\\d+)(?:[Ee][-+]?\\d+)? [-+]?\\d+ r')
+
+    def _first_param_inline0(self):
+        self._pattern_re(RE_17)
+
+    def _first_param_inline1(self):
+        with self._choice():
+            if self._guard(None, '["\']'):
+                with self._option():
+                    self._inline('string', self._first_param_inline2)
+            if self._guard(None, '[r]'):
+                with self._option():
+                    self._raw_string_()
+            with self._option():
+                self._inline('word', self._first_param_inline3)
+            if self._guard(None, '[0]'):
+                with self._option():
+                    self._inline('hex', self._first_param_inline4)
+            if self._guard(None, '[\\+\\-\\.]|[\\d]'):
+                with self._option():
+                    self._inline('float', self._first_param_inline5)
+            if self._guard(None, '[\\+\\-]|[\\d]'):
+                with self._option():
+                    self._inline('int', self._first_param_inline6)
+            self._error('expecting one of: " \' (?!\\d)\\w+ 0[xX](\\d|[a-fA-F])+ [-+]?(?:\\d+\\.\\d*|\\d*\\.\\d+)(?:[Ee][-+]?\\d+)? [-+]?\\d+ r')
+
+    def _first_param_inline2(self):
+        self._STRING_()
+
+    def _first_param_inline3(self):
+        self._pattern_re(RE_4)
+
+    def _first_param_inline4(self):
+        self._pattern_re(RE_7)
+
+    def _first_param_inline5(self):
+        self._pattern_re(RE_8)
+
+    def _first_param_inline6(self):
+        self._pattern_re(RE_9)
+
+    @graken()
+    def _kwparams_(self):
+        self._positive_gather(self._kwparams_block0, self._kwparams_sep0)
+
+    def _kwparams_sep0(self):
+        self._token_re(',', RE_11)
+
+    def _kwparams_block0(self):
+        self._pair_()
+
+    @graken()
+    def _pair_(self):
+        self._inline('word', self._pair_inline1)
+        self.add_last_node_to_name('@')
+        self._token_re('=', RE_14)
+        self._cut()
+        self._inline('literal', self._pair_inline3)
+        self.add_last_node_to_name('@')
+
+    def _pair_inline1(self):
+        self._pattern_re(RE_4)
+
+    def _pair_inline3(self):
+        with self._choice():
+            if self._guard(None, '["\']'):
+                with self._option():
+                    self._inline('string', self._pair_inline4)
+            if self._guard(None, '[r]'):
+                with self._option():
+                    self._raw_string_()
+            with self._option():
+                self._inline('word', self._pair_inline5)
+            if self._guard(None, '[0]'):
+                with self._option():
+                    self._inline('hex', self._pair_inline6)
+            if self._guard(None, '[\\+\\-\\.]|[\\d]'):
+                with self._option():
+                    self._inline('float', self._pair_inline7)
+            if self._guard(None, '[\\+\\-]|[\\d]'):
+                with self._option():
+                    self._inline('int', self._pair_inline8)
+            self._error('expecting one of: " \' (?!\\d)\\w+ 0[xX](\\d|[a-fA-F])+ [-+]?(?:\\d+\\.\\d*|\\d*\\.\\d+)(?:[Ee][-+]?\\d+)? [-+]?\\d+ r')
+
+    def _pair_inline4(self):
+        self._STRING_()
+
+    def _pair_inline5(self):
+        self._pattern_re(RE_4)
+
+    def _pair_inline6(self):
+        self._pattern_re(RE_7)
+
+    def _pair_inline7(self):
+        self._pattern_re(RE_8)
+
+    def _pair_inline8(self):
+        self._pattern_re(RE_9)
+
+    @graken()
+    def _expre_(self):
+        with self._choice():
+            with self._option():
+                self._choice_()
+            with self._option():
+                self._sequence_()
+            self._error('expecting one of: ! " $ & \' ( () (?!\\d)\\w+ / > >> ? ?( ?/ @ @+: @: [ ` r { | ~')
+
+    @graken('Choice')
+    def _choice_(self):
+        if self._guard(None, '[\\|]'):
+            with self._optional():
+                self._token_re('|', RE_18)
+                self._cut()
+        else:
+            self._void()
+        self._sequence_()
+        self.add_last_node_to_name('@')
+        self._positive_closure(self._choice_block1, guard=(None, '[\\|]'))
+
+    def _choice_block1(self):
+        self._token_re('|', RE_18)
+        self._cut()
+        self._sequence_()
+        self.add_last_node_to_name('@')
+
+    @graken('Sequence')
+    def _sequence_(self):
+        self._positive_closure(self._sequence_block1)
+        self.name_last_node('sequence')
+        self.ast._define(
+            ['sequence'],
+            []
+        )
+
+    def _sequence_block1(self):
+        self._element_()
+
+    @graken()
+    def _element_(self):
+        with self._choice():
+            if self._guard(None, '[>]'):
+                with self._option():
+                    self._rule_include_()
+            with self._option():
+                self._named_()
+            if self._guard(None, '[@]'):
+                with self._option():
+                    self._override_()
+            with self._option():
+                self._term_()
+            self._error('expecting one of: ! " $ & \' ( () (?!\\d)\\w+ / > >> ? ?( ?/ @ @+: @: [ ` r { ~')
+
+    @graken('RuleInclude')
+    def _rule_include_(self):
+        self._token_re('>', RE_19)
+        self._cut()
+        self._inline('known_name', self._rule_include_inline1)
+        self.name_last_node('@')
+
+    def _rule_include_inline1(self):
+        self._inline('name', self._rule_include_inline2)
+        self._cut()
+
+    def _rule_include_inline2(self):
+        self._inline('word', self._rule_include_inline3)
+
+    def _rule_include_inline3(self):
+        self._pattern_re(RE_4)
+
+    @graken()
+    def _named_(self):
+        with self._choice():
+            with self._option():
+                self._named_list_()
+            with self._option():
+                self._named_single_()
+            self._error('expecting one of: (?!\\d)\\w+')
+
+    @graken('NamedList')
+    def _named_list_(self):
+        self._inline('name', self._named_list_inline1)
+        self.name_last_node('name')
+        self._token_re('+:', RE_20)
+        self._cut()
+        self._term_()
+        self.name_last_node('exp')
+        self.ast._define(
+            ['exp', 'name'],
+            []
+        )
+
+    def _named_list_inline1(self):
+        self._inline('word', self._named_list_inline2)
+
+    def _named_list_inline2(self):
+        self._pattern_re(RE_4)
+
+    @graken('Named')
+    def _named_single_(self):
+        self._inline('name', self._named_single_inline1)
+        self.name_last_node('name')
+        self._token_re(':', RE_21)
+        self._cut()
+        self._term_()
+        self.name_last_node('exp')
+        self.ast._define(
+            ['exp', 'name'],
+            []
+        )
+
+    def _named_single_inline1(self):
+        self._inline('word', self._named_single_inline2)
+
+    def _named_single_inline2(self):
+        self._pattern_re(RE_4)
+
+    @graken()
+    def _override_(self):
+        with self._choice():
+            if self._guard(None, '[@]'):
+                with self._option():
+                    self._override_list_()
+            if self._guard(None, '[@]'):
+                with self._option():
+                    self._override_single_()
+            if self._guard(None, '[@]'):
+                with self._option():
+                    self._override_single_deprecated_()
+            self._error('expecting one of: @ @+: @:')
+
+    @graken('OverrideList')
+    def _override_list_(self):
+        self._token_re('@+:', RE_22)
+        self._cut()
+        self._term_()
+        self.name_last_node('@')
+
+    @graken('Override')
+    def _override_single_(self):
+        self._token_re('@:', RE_23)
+        self._cut()
+        self._term_()
+        self.name_last_node('@')
+
+    @graken('Override')
+    def _override_single_deprecated_(self):
+        self._token_re('@', RE_16)
+        self._cut()
+        self._term_()
+        self.name_last_node('@')
+
+    @graken()
+    def _term_(self):
+        with self._choice():
+            if self._guard(None, '[\\(]'):
+                with self._option():
+                    self._void_()
+            with self._option():
+                self._gather_()
+            with self._option():
+                self._join_()
+            if self._guard(None, '["\'\\(/\\?`r]'):
+                with self._option():
+                    self._left_join_()
+            if self._guard(None, '["\'\\(/\\?`r]'):
+                with self._option():
+                    self._right_join_()
+            if self._guard(None, '[\\(]'):
+                with self._option():
+                    self._group_()
+            if self._guard(None, '[\\{]'):
+                with self._option():
+                    self._empty_closure_()
+            if self._guard(None, '[\\{]'):
+                with self._option():
+                    self._positive_closure_()
+            if self._guard(None, '[\\{]'):
+                with self._option():
+                    self._closure_()
+            if self._guard(None, '[\\[]'):
+                with self._option():
+                    self._optional_()
+            if self._guard(None, '[\\?]'):
+                with self._option():
+                    self._special_()
+            if self._guard(None, '[\\&]'):
+                with self._option():
+                    self._kif_()
+            if self._guard(None, '[!]'):
+                with self._option():
+                    self._knot_()
+            with self._option():
+                self._atom_()
+            self._error('expecting one of: ! " $ & \' ( () (?!\\d)\\w+ / >> ? ?( ?/ [ ` r { ~')
+
+    @graken('Group')
+    def _group_(self):
+        self._token_re('(', RE_10)
+        self._cut()
+        self._expre_()
+        self.name_last_node('exp')
+        self._token_re(')', RE_12)
+        self._cut()
+        self.ast._define(
+            ['exp'],
+            []
+        )
+
+    @graken()
+    def _gather_(self):
+        with self._if():
+            with self._group():
+                self._separator_()
+                self._token_re('.{', RE_24)
+        self._cut()
+        with self._group():
+            with self._choice():
+                if self._guard(None, '["\'\\(/\\?`r]'):
+                    with self._option():
+                        self._positive_gather_()
+                if self._guard(None, '["\'\\(/\\?`r]'):
+                    with self._option():
+                        self._normal_gather_()
+                self._error('expecting one of: " \' ( / ? ?/ ` r')
+
+    @graken('PositiveGather')
+    def _positive_gather_(self):
+        self._separator_()
+        self.name_last_node('sep')
+        self._token_re('.{', RE_24)
+        self._expre_()
+        self.name_last_node('exp')
+        self._token_re('}', RE_25)
+        with self._group():
+            self._token_choice(('+', '-',), 'expecting one of: + -')
+        self._cut()
+        self.ast._define(
+            ['exp', 'sep'],
+            []
+        )
+
+    @graken('Gather')
+    def _normal_gather_(self):
+        self._separator_()
+        self.name_last_node('sep')
+        self._token_re('.{', RE_24)
+        self._cut()
+        self._expre_()
+        self.name_last_node('exp')
+        self._token_re('}', RE_25)
+        if self._guard(None, '[\\*]'):
+            with self._optional():
+                self._token_re('*', RE_26)
+                self._cut()
+        else:
+            self._void()
+        self._cut()
+        self.ast._define(
+            ['exp', 'sep'],
+            []
+        )
+
+    @graken()
+    def _join_(self):
+        with self._if():
+            with self._group():
+                self._separator_()
+                self._token_re('%{', RE_27)
+        self._cut()
+        with self._group():
+            with self._choice():
+                if self._guard(None, '["\'\\(/\\?`r]'):
+                    with self._option():
+                        self._positive_join_()
+                if self._guard(None, '["\'\\(/\\?`r]'):
+                    with self._option():
+                        self._normal_join_()
+                self._error('expecting one of: " \' ( / ? ?/ ` r')
+
+    @graken('PositiveJoin')
+    def _positive_join_(self):
+        self._separator_()
+        self.name_last_node('sep')
+        self._token_re('%{', RE_27)
+        self._expre_()
+        self.name_last_node('exp')
+        self._token_re('}', RE_25)
+        with self._group():
+            self._token_choice(('+', '-',), 'expecting one of: + -')
+        self._cut()
+        self.ast._define(
+            ['exp', 'sep'],
+            []
+        )
+
+    @graken('Join')
+    def _normal_join_(self):
+        self._separator_()
+        self.name_last_node('sep')
+        self._token_re('%{', RE_27)
+        self._cut()
+        self._expre_()
+        self.name_last_node('exp')
+        self._token_re('}', RE_25)
+        if self._guard(None, '[\\*]'):
+            with self._optional():
+                self._token_re('*', RE_26)
+                self._cut()
+        else:
+            self._void()
+        self._cut()
+        self.ast._define(
+            ['exp', 'sep'],
+            []
+        )
+
+    @graken('LeftJoin')
+    def _left_join_(self):
+        self._separator_()
+        self.name_last_node('sep')
+        self._token_re('<{', RE_28)
+        self._cut()
+        self._expre_()
+        self.name_last_node('exp')
+        self._token_re('}', RE_25)
+        with self._group():
+            self._token_choice(('+', '-',), 'expecting one of: + -')
+        self._cut()
+        self.ast._define(
+            ['exp', 'sep'],
+            []
+        )
+
+    @graken('RightJoin')
+    def _right_join_(self):
+        self._separator_()
+        self.name_last_node('sep')
+        self._token_re('>{', RE_29)
+        self._cut()
+        self._expre_()
+        self.name_last_node('exp')
+        self._token_re('}', RE_25)
+        with self._group():
+            self._token_choice(('+', '-',), 'expecting one of: + -')
+        self._cut()
+        self.ast._define(
+            ['exp', 'sep'],
+            []
+        )
+
+    @graken()
+    def _separator_(self):
+        with self._choice():
+            option = self._predict(PREDICT_1)
+            if option == 0:
+                with self._predicted_option('expecting one of: " \' ( / ? ?/ ` r'):
+                    self._group_()
+            elif option == 1:
+                with self._predicted_option('expecting one of: " \' ( / ? ?/ ` r'):
+                    self._token_()
+            elif option == 2:
+                with self._predicted_option('expecting one of: " \' ( / ? ?/ ` r'):
+                    self._constant_()
+            elif option == 3:
+                with self._predicted_option('expecting one of: " \' ( / ? ?/ ` r'):
+                    self._pattern_()
+            else:
+                self._error('expecting one of: " \' ( / ? ?/ ` r')
+
+    @graken('PositiveClosure')
+    def _positive_closure_(self):
+        self._token_re('{', RE_30)
+        self._expre_()
+        self.name_last_node('@')
+        self._token_re('}', RE_25)
+        with self._group():
+            self._token_choice(('-', '+',), 'expecting one of: + -')
+        self._cut()
+
+    @graken('Closure')
+    def _closure_(self):
+        self._token_re('{', RE_30)
+        self._expre_()
+        self.name_last_node('@')
+        self._token_re('}', RE_25)
+        if self._guard(None, '[\\*]'):
+            with self._optional():
+                self._token_re('*', RE_26)
+        else:
+            self._void()
+        self._cut()
+
+    @graken('EmptyClosure')
+    def _empty_closure_(self):
+        self._token_re('{', RE_30)
+        self._void()
+        self.name_last_node('@')
+        self._token_re('}', RE_25)
+
+    @graken('Optional')
+    def _optional_(self):
+        self._token_re('[', RE_31)
+        self._cut()
+        self._expre_()
+        self.name_last_node('@')
+        self._token_re(']', RE_32)
+        self._cut()
+
+    @graken('Special')
+    def _special_(self):
+        self._token_re('?(', RE_33)
+        self._cut()
+        self._pattern_re(RE_34)
+        self.name_last_node('@')
+        self._token_re(')?', RE_35)
+        self._cut()
+
+    @graken('Lookahead')
+    def _kif_(self):
+        self._token_re('&', RE_36)
+        self._cut()
+        self._term_()
+        self.name_last_node('@')
+
+    @graken('NegativeLookahead')
+    def _knot_(self):
+        self._token_re('!', RE_37)
+        self._cut()
+        self._term_()
+        self.name_last_node('@')
+
+    @graken()
+    def _atom_(self):
+        with self._choice():
+            if self._guard(None, '[\\~]'):
+                with self._option():
+                    self._cut_()
+            if self._guard(None, '[>]'):
+                with self._option():
+                    self._cut_deprecated_()
+            if self._guard(None, '["\'r]'):
+                with self._option():
+                    self._token_()
+            if self._guard(None, '[`]'):
+                with self._option():
+                    self._constant_()
+            with self._option():
+                self._call_()
+            if self._guard(None, '[/\\?]'):
+                with self._option():
+                    self._pattern_()
+            if self._guard(None, '[\\$]'):
+                with self._option():
+                    self._eof_()
+            self._error('expecting one of: " $ \' (?!\\d)\\w+ / >> ? ?/ ` r ~')
+
+    @graken('RuleRef')
+    def _call_(self):
+        self._inline('word', self._call_inline0)
+
+    def _call_inline0(self):
+        self._pattern_re(RE_4)
+
+    @graken('Void')
+    def _void_(self):
+        self._token_re('()', RE_38)
+        self._cut()
+
+    @graken('Cut')
+    def _cut_(self):
+        self._token_re('~', RE_39)
+        self._cut()
+
+    @graken('Cut')
+    def _cut_deprecated_(self):
+        self._token_re('>>', RE_40)
+        self._cut()
+
+    @graken()
+    def _known_name_(self):
+        self._inline('name', self._known_name_inline0)
+        self._cut()
+
+    def _known_name_inline0(self):
+        self._inline('word', self._known_name_inline1)
+
+    def _known_name_inline1(self):
+        self._pattern_re(RE_4)
+
+    @graken()
+    def _name_(self):
+        self._inline('word', self._name_inline0)
+
+    def _name_inline0(self):
+        self._pattern_re(RE_4)
+
+    @graken('Constant')
+    def _constant_(self):
+        self._pattern_re(RE_41)
+        self._cut()
+        self._inline('literal', self._constant_inline1)
+        self.name_last_node('@')
+        self._pattern_re(RE_41)
+
+    def _constant_inline1(self):
+        with self._choice():
+            if self._guard(None, '["\']'):
+                with self._option():
+                    self._inline('string', self._constant_inline2)
+            if self._guard(None, '[r]'):
+                with self._option():
+                    self._raw_string_()
+            with self._option():
+                self._inline('word', self._constant_inline3)
+            if self._guard(None, '[0]'):
+                with self._option():
+                    self._inline('hex', self._constant_inline4)
+            if self._guard(None, '[\\+\\-\\.]|[\\d]'):
+                with self._option():
+                    self._inline('float', self._constant_inline5)
+            if self._guard(None, '[\\+\\-]|[\\d]'):
+                with self._option():
+                    self._inline('int', self._constant_inline6)
+            self._error('expecting one of: " \' (?!\\d)\\w+ 0[xX](\\d|[a-fA-F])+ [-+]?(?:\\d+\\.\\d*|\\d*\\.\\d+)(?:[Ee][-+]?\\d+)? [-+]?\\d+ r')
+
+    def _constant_inline2(self):
+        self._STRING_()
+
+    def _constant_inline3(self):
+        self._pattern_re(RE_4)
+
+    def _constant_inline4(self):
+        self._pattern_re(RE_7)
+
+    def _constant_inline5(self):
+        self._pattern_re(RE_8)
+
+    def _constant_inline6(self):
+        self._pattern_re(RE_9)
+
+    @graken('Token')
+    def _token_(self):
+        with self._choice():
+            option = self._predict(PREDICT_2)
+            if option == 0:
+                with self._predicted_option('expecting one of: " \' r'):
+                    self._inline('string', self._token_inline0)
+            elif option == 1:
+                with self._predicted_option('expecting one of: " \' r'):
+                    self._raw_string_()
+            else:
+                self._error('expecting one of: " \' r')
+
+    def _token_inline0(self):
+        self._STRING_()
+
+    @graken()
+    def _literal_(self):
+        with self._choice():
+            if self._guard(None, '["\']'):
+                with self._option():
+                    self._inline('string', self._literal_inline0)
+            if self._guard(None, '[r]'):
+                with self._option():
+                    self._raw_string_()
+            with self._option():
+                self._inline('word', self._literal_inline1)
+            if self._guard(None, '[0]'):
+                with self._option():
+                    self._inline('hex', self._literal_inline2)
+            if self._guard(None, '[\\+\\-\\.]|[\\d]'):
+                with self._option():
+                    self._inline('float', self._literal_inline3)
+            if self._guard(None, '[\\+\\-]|[\\d]'):
+                with self._option():
+                    self._inline('int', self._literal_inline4)
+            self._error('expecting one of: " \' (?!\\d)\\w+ 0[xX](\\d|[a-fA-F])+ [-+]?(?:\\d+\\.\\d*|\\d*\\.\\d+)(?:[Ee][-+]?\\d+)? [-+]?\\d+ r')
+
+    def _literal_inline0(self):
+        self._STRING_()
+
+    def _literal_inline1(self):
+        self._pattern_re(RE_4)
+
+    def _literal_inline2(self):
+        self._pattern_re(RE_7)
+
+    def _literal_inline3(self):
+        self._pattern_re(RE_8)
+
+    def _literal_inline4(self):
+        self._pattern_re(RE_9)
+
+    @graken()
+    def _string_(self):
+        self._STRING_()
+
+    @graken()
+    def _raw_string_(self):
+        self._token_re('r', RE_42)
+        self._STRING_()
+        self.name_last_node('@')
+
+    @graken()
+    def _STRING_(self):
+        with self._choice():
+            option = self._predict(PREDICT_3)
+            if option == 0:
+                with self._predicted_option('expecting one of: " \''):
+                    self._token_re('"', RE_43)
+                    self._cut()
+                    self._pattern_re(RE_44)
+                    self.name_last_node('@')
+                    self._token_re('"', RE_43)
+                    self._cut()
+            elif option == 1:
+                with self._predicted_option('expecting one of: " \''):
+                    self._token_re("'", RE_45)
+                    self._cut()
+                    self._pattern_re(RE_46)
+                    self.name_last_node('@')
+                    self._token_re("'", RE_45)
+                    self._cut()
+            else:
+                self._error('expecting one of: " \'')
+
+    @graken()
+    def _hex_(self):
+        self._pattern_re(RE_7)
+
+    @graken()
+    def _float_(self):
+        self._pattern_re(RE_8)
+
+    @graken()
+    def _int_(self):
+        self._pattern_re(RE_9)
+
+    @graken()
+    def _path_(self):
+        self._pattern_re(RE_17)
+
+    @graken()
+    def _word_(self):
+        self._pattern_re(RE_4)
+
+    @graken('Pattern')
+    def _pattern_(self):
+        self._inline('regexes', self._pattern_inline0)
+
+    def _pattern_inline0(self):
+        self._positive_gather(self._pattern_block1, self._pattern_sep1)
+
+    def _pattern_sep1(self):
+        self._token_re('+', RE_47)
+
+    def _pattern_block1(self):
+        self._regex_()
+
+    @graken()
+    def _regexes_(self):
+        self._positive_gather(self._regexes_block0, self._regexes_sep0)
+
+    def _regexes_sep0(self):
+        self._token_re('+', RE_47)
+
+    def _regexes_block0(self):
+        self._regex_()
+
+    @graken()
+    def _regex_(self):
+        with self._choice():
+            if self._guard(None, '[/]'):
+                with self._option():
+                    self._token_re('/', RE_48)
+                    self._cut()
+                    self._pattern_re(RE_49)
+                    self.name_last_node('@')
+                    self._token_re('/', RE_48)
+                    self._cut()
+            if self._guard(None, '[\\?]'):
+                with self._option():
+                    self._token_re('?/', RE_50)
+                    self._cut()
+                    self._pattern_re(RE_51)
+                    self.name_last_node('@')
+                    self._pattern_re(RE_52)
+                    self._cut()
+            if self._guard(None, '[\\?]'):
+                with self._option():
+                    self._token_re('?', RE_53)
+                    self._STRING_()
+                    self.name_last_node('@')
+            self._error('expecting one of: / ? ?/')
+
+    @graken()
+    def _boolean_(self):
+        self._token_choice(('True', 'False',), 'expecting one of: False True')
+
+    @graken('EOF')
+    def _eof_(self):
+        self._token_re('$', RE_54)
+        self._cut()
+
+
+class EBNFBootstrapSemantics(object):
+    def start(self, ast):
+        return ast
+
+    def grammar(self, ast):
+        return ast
+
+    def directive(self, ast):
+        return ast
+
+    def keywords(self, ast):
+        return ast
+
+    def paramdef(self, ast):
+        return ast
+
+    def rule(self, ast):
+        return ast
+
+    def decorator(self, ast):
+        return ast
+
+    def params(self, ast):
+        return ast
+
+    def first_param(self, ast):
+        return ast
+
+    def kwparams(self, ast):
+        return ast
+
+    def pair(self, ast):
+        return ast
+
+    def expre(self, ast):
+        return ast
+
+    def choice(self, ast):
+        return ast
+
+    def sequence(self, ast):
+        return ast
+
+    def element(self, ast):
+        return ast
+
+    def rule_include(self, ast):
+        return ast
+
+    def named(self, ast):
+        return ast
+
+    def named_list(self, ast):
+        return ast
+
+    def named_single(self, ast):
+        return ast
+
+    def override(self, ast):
+        return ast
+
+    def override_list(self, ast):
+        return ast
+
+    def override_single(self, ast):
+        return ast
+
+    def override_single_deprecated(self, ast):
+        return ast
+
+    def term(self, ast):
+        return ast
+
+    def group(self, ast):
+        return ast
+
+    def gather(self, ast):
+        return ast
+
+    def positive_gather(self, ast):
+        return ast
+
+    def normal_gather(self, ast):
+        return ast
+
+    def join(self, ast):
+        return ast
+
+    def positive_join(self, ast):
+        return ast
+
+    def normal_join(self, ast):
+        return ast
+
+    def left_join(self, ast):
+        return ast
+
+    def right_join(self, ast):
+        return ast
+
+    def separator(self, ast):
+        return ast
+
+    def positive_closure(self, ast):
+        return ast
+
+    def closure(self, ast):
+        return ast
+
+    def empty_closure(self, ast):
+        return ast
+
+    def optional(self, ast):
+        return ast
+
+    def special(self, ast):
+        return ast
+
+    def kif(self, ast):
+        return ast
+
+    def knot(self, ast):
+        return ast
+
+    def atom(self, ast):
+        return ast
+
+    def call(self, ast):
+        return ast
+
+    def void(self, ast):
+        return ast
+
+    def cut(self, ast):
+        return ast
+
+    def cut_deprecated(self, ast):
+        return ast
+
+    def known_name(self, ast):
+        return ast
+
+    def name(self, ast):
+        return ast
+
+    def constant(self, ast):
+        return ast
+
+    def token(self, ast):
+        return ast
+
+    def literal(self, ast):
+        return ast
+
+    def string(self, ast):
+        return ast
+
+    def raw_string(self, ast):
+        return ast
+
+    def STRING(self, ast):
+        return ast
+
+    def hex(self, ast):
+        return ast
+
+    def float(self, ast):
+        return ast
+
+    def int(self, ast):
+        return ast
+
+    def path(self, ast):
+        return ast
+
+    def word(self, ast):
+        return ast
+
+    def pattern(self, ast):
+        return ast
+
+    def regexes(self, ast):
+        return ast
+
+    def regex(self, ast):
+        return ast
+
+    def boolean(self, ast):
+        return ast
+
+    def eof(self, ast):
+        return ast
+
+
+def main(filename, startrule, **kwargs):
+    with open(filename) as f:
+        text = f.read()
+    parser = EBNFBootstrapParser()
+    return parser.parse(text, startrule, filename=filename, **kwargs)
+
+
+if __name__ == '__main__':
+    import json
+    from grako.util import asjson
+
+    ast = generic_main(main, EBNFBootstrapParser, name='EBNFBootstrap')
+    print('AST:')
+    print(ast)
+    print()
+    print('JSON:')
+    print(json.dumps(asjson(ast), indent=2))
+    print()